@@ -1,77 +1,48 @@
 import os
 
-def populate():
-    python_cat = add_cat('Python', visits=128, likes=64)
-
-    add_page(cat=python_cat,
-             title="Official Python Tutorial",
-             url="http://docs.python.org/2/tutorial/",
-             views=12
-    )
-
-    add_page(cat=python_cat,
-             title="How to Think like a Computer Scientist",
-             url="http://www.greenteapress.com/thinkpython/",
-             views=50
-    )
-
-    add_page(cat=python_cat,
-             title="Learn Python in 10 Minutes",
-             url="http://www.korokithakis.net/tutorials/python/",
-             views=200
-    )
-
-    django_cat = add_cat("Django", visits=32, likes=13)
-
-    add_page(cat=django_cat,
-        title="Official Django Tutorial",
-        url="https://docs.djangoproject.com/en/1.5/intro/tutorial01/",
-        views=60
-    )
-
-    add_page(cat=django_cat,
-        title="Django Rocks",
-        url="http://www.djangorocks.com/",
-        views=3400
-    )
+# The sample categories and pages, in the rows rango.loader understands
+SAMPLE_ROWS = [
+    {'category': 'Python', 'visits': 128, 'likes': 64,
+     'title': "Official Python Tutorial",
+     'url': "http://docs.python.org/2/tutorial/", 'views': 12},
+    {'category': 'Python',
+     'title': "How to Think like a Computer Scientist",
+     'url': "http://www.greenteapress.com/thinkpython/", 'views': 50},
+    {'category': 'Python',
+     'title': "Learn Python in 10 Minutes",
+     'url': "http://www.korokithakis.net/tutorials/python/", 'views': 200},
+
+    {'category': 'Django', 'visits': 32, 'likes': 13,
+     'title': "Official Django Tutorial",
+     'url': "https://docs.djangoproject.com/en/1.5/intro/tutorial01/", 'views': 60},
+    {'category': 'Django',
+     'title': "Django Rocks",
+     'url': "http://www.djangorocks.com/", 'views': 3400},
+    {'category': 'Django',
+     'title': "How to Tango with Django",
+     'url': "http://www.tangowithdjango.com/", 'views': 3},
+
+    {'category': 'Other Frameworks', 'visits': 102, 'likes': 345,
+     'title': "Bottle",
+     'url': "http://bottlepy.org/docs/dev/", 'views': 40},
+    {'category': 'Other Frameworks',
+     'title': "Flask",
+     'url': "http://flask.pocoo.org", 'views': 5},
+]
 
-    add_page(cat=django_cat,
-        title="How to Tango with Django",
-        url="http://www.tangowithdjango.com/",
-        views=3
-    )
-
-    frame_cat = add_cat("Other Frameworks", visits=102, likes=345)
-
-    add_page(cat=frame_cat,
-        title="Bottle",
-        url="http://bottlepy.org/docs/dev/",
-        views=40
-    )
-
-    add_page(cat=frame_cat,
-        title="Flask",
-        url="http://flask.pocoo.org",
-        views=5
-    )
+def populate():
+    # Existing categories are reused and pages already saved are skipped,
+    # so it's safe to run this more than once.
+    # For bigger datasets use "manage.py load_pages" instead.
+    pages = PageLoader().load(SAMPLE_ROWS)
 
     # Print out what we have added to the user
-    for c in Category.objects.all():
-        for p in Page.objects.filter(category=c):
-            print "- {0} - {1}".format(str(c), str(p))
-
-def add_page(cat, title, url, views=0):
-    p = Page.objects.get_or_create(category=cat, title=title, url=url, views=views)[0]
-    return p
-
-def add_cat(name, visits=0, likes=0):
-    c = Category.objects.get_or_create(name=name, visits=visits, likes=likes)[0]
-    return c
+    print "Added {0} pages and {1} categories ({2} pages were already there).".format(
+        pages.inserted, pages.categories_created, pages.skipped)
 
 # Start execution here!
 if __name__ == '__main__':
     print "Starting Rango population script..."
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tango_with_django_project.settings')
-    from rango.models import Category, Page    
+    from rango.loader import PageLoader
     populate()
-
@@ -0,0 +1,215 @@
+"""
+Bundled, fingerprinted and precompressed static files.
+
+RANGO_ASSET_BUNDLES names the files base.html needs as a few bundles,
+one stylesheet and one script, each made of source files under static/.
+"manage.py collectstatic" (with STATICFILES_STORAGE set to AssetStorage)
+then:
+
+1. concatenates each bundle from its sources, minifying the ones that
+   aren't minified already (see minify_css() and minify_js()),
+2. copies every file to STATIC_ROOT under a name holding a hash of its
+   content, e.g. css/rango.3f2a1c0e9b7d.css, rewriting the url()s in
+   stylesheets to the hashed names as well,
+3. writes a .gz (and, if the brotli module is installed, a .br) copy
+   next to every hashed text file, for servers that send precompressed
+   files, and
+4. records the hashed names in STATIC_ROOT/assets.json.
+
+{% asset_bundle %} (rango/templatetags/rango_assets.py) links to a
+bundle's hashed name, or with RANGO_ASSETS_BUNDLED off (the default with
+DEBUG on) to each of its sources, as runserver serves them. A hashed
+name changes with the content, so it can be cached forever: serve
+STATIC_ROOT with "Cache-Control: public, max-age=31536000, immutable",
+from the web server, or from serve() below with RANGO_SERVE_STATIC on.
+
+Sources of a stylesheet bundle must live in the bundle's directory, so
+that their relative url()s still point at the right files.
+"""
+
+import gzip
+import json
+import mimetypes
+import os
+import re
+from StringIO import StringIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (CachedStaticFilesStorage, StaticFilesStorage,
+                                                 staticfiles_storage)
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.base import ContentFile
+from django.http import Http404
+from django.utils._os import safe_join
+
+from rango import file_serving
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'assets.json'
+# Files worth compressing, the rest (images) are compressed already
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.html', '.json')
+# A year, the longest Cache-Control max-age caches are asked to honour
+FOREVER = 60 * 60 * 24 * 365
+
+
+def bundles():
+    return getattr(settings, 'RANGO_ASSET_BUNDLES', {})
+
+
+def bundled():
+    return getattr(settings, 'RANGO_ASSETS_BUNDLED', not settings.DEBUG)
+
+
+def minify_css(text):
+    """Drop comments (but /*! licenses) and the whitespace CSS doesn't need"""
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """
+    Minify with rjsmin if it's installed. JavaScript can't be minified
+    safely with a few regular expressions, so without it the file is
+    only concatenated.
+    """
+    try:
+        import rjsmin
+    except ImportError:
+        return text
+    return rjsmin.jsmin(text, keep_bang_comments=True)
+
+
+def build(name, read):
+    """The content of bundle name, read(source) giving a source's content"""
+    css = name.endswith('.css')
+    parts = []
+    for source in bundles()[name]:
+        text = read(source).decode('utf-8')
+        if '.min.' not in source:
+            text = minify_css(text) if css else minify_js(text)
+        parts.append(text.strip())
+    # A script not ending in ; must not run into the next one
+    return ('\n' if css else ';\n').join(parts).encode('utf-8') + '\n'
+
+
+def compress(storage, name):
+    """Write the .gz (and .br) copies of a stored file"""
+    with storage.open(name) as f:
+        content = f.read()
+    out = StringIO()
+    # mtime=0 keeps the output the same for the same input
+    with gzip.GzipFile(filename='', mode='wb', fileobj=out, compresslevel=9, mtime=0) as f:
+        f.write(content)
+    copies = [('.gz', out.getvalue())]
+    if brotli is not None:
+        copies.append(('.br', brotli.compress(content)))
+    for suffix, compressed in copies:
+        if len(compressed) < len(content):
+            if storage.exists(name + suffix):
+                storage.delete(name + suffix)
+            storage._save(name + suffix, ContentFile(compressed))
+
+
+class AssetStorage(CachedStaticFilesStorage):
+    "Static files storage that bundles, hashes and compresses, see above"
+
+    def __init__(self, *args, **kwargs):
+        super(AssetStorage, self).__init__(*args, **kwargs)
+        self._manifest = None
+
+    def manifest(self):
+        """The hashed name of each file, from the last collectstatic"""
+        if self._manifest is None:
+            try:
+                with self.open(MANIFEST) as f:
+                    self._manifest = json.loads(f.read())
+            except (IOError, OSError, ValueError):
+                self._manifest = {}
+        return self._manifest
+
+    def url(self, name, force=False):
+        if force or settings.DEBUG:
+            return super(AssetStorage, self).url(name, force)
+        # Files collectstatic hasn't seen (yet) keep their plain name
+        return StaticFilesStorage.url(self, self.manifest().get(name, name))
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name in bundles():
+            def read(source):
+                storage, path = paths[source]
+                with storage.open(path) as f:
+                    return f.read()
+            if self.exists(name):
+                self.delete(name)
+            self._save(name, ContentFile(build(name, read)))
+            paths[name] = (self, name)
+
+        manifest = {}
+        processed_files = super(AssetStorage, self).post_process(paths, dry_run, **options)
+        for name, hashed_name, processed in processed_files:
+            if hashed_name and not isinstance(processed, Exception):
+                manifest[name.replace('\\', '/')] = hashed_name
+                if hashed_name.endswith(COMPRESSIBLE):
+                    compress(self, hashed_name)
+            yield name, hashed_name, processed
+
+        if self.exists(MANIFEST):
+            self.delete(MANIFEST)
+        self._save(MANIFEST, ContentFile(json.dumps(manifest, indent=1, sort_keys=True)))
+        self._manifest = manifest
+
+
+def _accepts(header, coding):
+    # "gzip;q=0" means not gzip
+    for part in header.split(','):
+        params = [param.strip() for param in part.split(';')]
+        if params[0] == coding:
+            return 'q=0' not in params and 'q=0.0' not in params
+    return False
+
+
+def serve(req, path):
+    """
+    Serve a file from STATIC_ROOT, precompressed if the client takes it,
+    and cached forever if its name is hashed. For deployments without a
+    web server in front of Django.
+    """
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except (SuspiciousOperation, ValueError):
+        raise Http404
+    if file_serving.index.get(full_path) is None:
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    accepted = req.META.get('HTTP_ACCEPT_ENCODING', '')
+    encoding = None
+    for suffix, coding in (('.br', 'br'), ('.gz', 'gzip')):
+        if _accepts(accepted, coding) and file_serving.index.get(full_path + suffix):
+            full_path, encoding = full_path + suffix, coding
+            break
+
+    response = file_serving.serve_file(req, full_path, content_type=content_type,
+                                       content_encoding=encoding)
+    response['Vary'] = 'Accept-Encoding'
+    if is_hashed(path):
+        response['Cache-Control'] = 'public, max-age={0}, immutable'.format(FOREVER)
+    else:
+        # A plain name may get new content at the next deploy
+        response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+def is_hashed(path):
+    """Whether collectstatic wrote path as some file's hashed name"""
+    manifest = getattr(staticfiles_storage, 'manifest', None)
+    return bool(manifest) and path in manifest().values()
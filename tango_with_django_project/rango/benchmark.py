@@ -0,0 +1,241 @@
+"""
+Query count and latency benchmark for every rango URL.
+
+load_dataset() fills the database with synthetic categories, pages and
+users, then run_benchmark() drives each route in rango/urls.py through
+the Django test client (anonymous, logged in and AJAX requests alike)
+and records, per route, the SQL query count and time, p50/p95 wall time
+and template render time. check_budget() compares the query counts with
+the budget checked in at rango/query_budget.json, and check_routes()
+makes sure no named URL in rango/urls.py is left out of either.
+
+Use it through "manage.py benchmark", which runs against a throwaway
+test database, or from a TestCase as rango/tests.py does.
+"""
+
+import json
+import os
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.urlresolvers import resolve
+from django.db import connection, transaction
+from django.template import Template
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+
+from rango import bing_search
+from rango import canonical
+from rango import click_buffer
+from rango import urls
+from rango.models import Category, Page, UserProfile
+
+BUDGET_PATH = os.path.join(os.path.dirname(__file__), 'query_budget.json')
+
+PASSWORD = 'benchmark'
+SEARCH_QUERY = 'python tutorial'
+
+
+def load_dataset(categories=20, pages=50, users=10):
+    """Create categories x pages synthetic links and users, returns the first user"""
+    with transaction.atomic():
+        # save() works out the slug, so categories go in one by one
+        cats = [Category.objects.create(name='Category {0}'.format(i),
+                                        likes=i, visits=i)
+                for i in range(categories)]
+        for cat in cats:
+            urls = ['http://example.com/{0}/{1}/'.format(cat.slug, i) for i in range(pages)]
+            Page.objects.bulk_create([
+                Page(category=cat,
+                     title='{0} page {1}'.format(cat.name, i),
+                     url=url,
+                     url_hash=canonical.url_hash(url),
+                     views=i)
+                for i, url in enumerate(urls)])
+
+        # Hashing a password is slow on purpose, do it once for everybody
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(username='user{0}'.format(i), email='user{0}@example.com'.format(i),
+                 password=password)
+            for i in range(users)])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, website='http://example.com/')
+            for user in User.objects.filter(username__startswith='user')])
+
+    return User.objects.get(username='user0')
+
+
+def routes(category, page):
+    """
+    Every route worth measuring, as (name, method, path, data, login)
+    tuples. data may be a function of the iteration number.
+    """
+    slug = category.slug
+    return [
+        ('index', 'get', '/rango/', {}, False),
+        ('index_logged_in', 'get', '/rango/', {}, True),
+        ('myass', 'get', '/rango/myass/', {}, False),
+        ('about', 'get', '/rango/about/', {}, False),
+        ('add_category', 'get', '/rango/add_category/', {}, True),
+        ('add_category_post', 'post', '/rango/add_category/',
+         lambda i: {'name': 'Benchmark {0}'.format(i), 'visits': 0, 'likes': 0}, True),
+        ('category', 'get', '/rango/category/{0}/'.format(slug), {}, False),
+        ('category_logged_in', 'get', '/rango/category/{0}/'.format(slug), {}, True),
+        ('category_search', 'post', '/rango/category/{0}/'.format(slug),
+         {'query': SEARCH_QUERY}, False),
+        ('add_page', 'get', '/rango/category/{0}/add_page/'.format(slug), {}, True),
+        ('register', 'get', '/rango/register/', {}, False),
+        ('login', 'get', '/rango/login/', {}, False),
+        ('restricted', 'get', '/rango/restricted/', {}, True),
+        ('profile', 'get', '/rango/profile/', {}, True),
+        ('track_url', 'get', '/rango/goto/', {'page_id': page.id}, False),
+        ('like_category', 'get', '/rango/like_category/',
+         {'category_id': category.id}, True),
+        ('more_pages', 'get', '/rango/more_pages/',
+         {'category_id': category.id, 'after': '1000000-0'}, False),
+        ('suggest_category', 'get', '/rango/suggest_category/',
+         {'suggestion': 'cat'}, False),
+        ('search', 'get', '/rango/search/', {}, False),
+        ('search_local', 'post', '/rango/search/',
+         {'query': SEARCH_QUERY, 'source': 'rango'}, False),
+        ('search_web', 'post', '/rango/search/', {'query': SEARCH_QUERY}, False),
+        ('auto_add_page', 'get', '/rango/auto_add_page/',
+         lambda i: {'category_id': category.id, 'title': 'Added {0}'.format(i),
+                    'url': 'http://example.com/added/{0}/'.format(i)}, True),
+        ('metrics', 'get', '/rango/metrics/', {}, False),
+        ('logout', 'get', '/rango/logout/', {}, True),
+    ]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+
+class RenderTimer(object):
+    "Adds up the time spent rendering templates, counting nested ones once"
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._depth = 0
+
+    def __enter__(self):
+        self._render = Template._render
+        timer = self
+
+        def timed_render(template, context):
+            timer._depth += 1
+            start = time.time()
+            try:
+                return timer._render(template, context)
+            finally:
+                timer._depth -= 1
+                if timer._depth == 0:
+                    timer.elapsed += time.time() - start
+
+        Template._render = timed_render
+        return self
+
+    def __exit__(self, *exc_info):
+        Template._render = self._render
+
+
+def run_benchmark(user, iterations=20):
+    """Request every route iterations times, returns a report dict"""
+    category = Category.objects.order_by('-likes')[0]
+    page = Page.objects.filter(category=category)[0]
+
+    # The web search would go out to Bing, answer it from the cache instead
+    bing_search.search_cache.put((bing_search.normalize_query(SEARCH_QUERY), 0, 10),
+                                 [{'title': 'Python', 'link': 'http://python.org/',
+                                   'summary': 'Benchmark result'}])
+
+    anonymous = Client()
+    logged_in = Client()
+    logged_in.login(username=user.username, password=PASSWORD)
+
+    report = {}
+    for name, method, path, data, login in routes(category, page):
+        client = logged_in if login else anonymous
+        timings, render_times, query_counts, query_times = [], [], [], []
+
+        # One request first to warm up caches, then the measured ones
+        for i in range(iterations + 1):
+            if name == 'logout':
+                client = Client()
+                client.login(username=user.username, password=PASSWORD)
+            params = data(i) if callable(data) else data
+            with CaptureQueriesContext(connection) as queries:
+                with RenderTimer() as render:
+                    start = time.time()
+                    response = getattr(client, method)(path, params)
+                    elapsed = time.time() - start
+            if response.status_code >= 400:
+                raise AssertionError("{0} returned HTTP {1}".format(
+                    name, response.status_code))
+            if i == 0:
+                continue
+            timings.append(elapsed)
+            render_times.append(render.elapsed)
+            query_counts.append(len(queries))
+            query_times.append(sum(float(q['time']) for q in queries))
+
+        report[name] = {
+            'path': path,
+            'method': method.upper(),
+            'queries': max(query_counts),
+            'query_time_ms': round(1000 * sum(query_times) / len(query_times), 3),
+            'p50_ms': round(1000 * percentile(timings, 0.5), 3),
+            'p95_ms': round(1000 * percentile(timings, 0.95), 3),
+            'render_ms': round(1000 * sum(render_times) / len(render_times), 3),
+        }
+
+    # Write out the clicks track_url buffered while the database is still here
+    click_buffer.flush()
+    return report
+
+
+def load_budget(path=BUDGET_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_budget(report, budget):
+    """Return a message for every route that ran more queries than budgeted"""
+    failures = []
+    for name, result in sorted(report.items()):
+        allowed = budget.get(name)
+        if allowed is None:
+            failures.append("{0} has no query budget".format(name))
+        elif result['queries'] > allowed:
+            failures.append("{0} ran {1} queries, the budget is {2}".format(
+                name, result['queries'], allowed))
+    return failures
+
+
+def check_routes(category, page, budget):
+    """
+    Return a message for every named URL in rango/urls.py that no route
+    requests, and for every route missing from the budget or vice versa
+    """
+    failures = []
+    measured = routes(category, page)
+    names = set(name for name, method, path, data, login in measured)
+    covered = set(resolve(path).url_name for name, method, path, data, login in measured)
+    for url_name in sorted(set(pattern.name for pattern in urls.urlpatterns
+                               if pattern.name)):
+        if url_name not in covered:
+            failures.append("The {0!r} URL has no benchmark route".format(url_name))
+    for name in sorted(names - set(budget)):
+        failures.append("{0} has no query budget".format(name))
+    for name in sorted(set(budget) - names):
+        failures.append("{0} is budgeted but is not a route".format(name))
+    return failures
+
+
+def write_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
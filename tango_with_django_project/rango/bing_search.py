@@ -1,68 +1,346 @@
+import base64
+import httplib
 import json
-import urllib, urllib2
-
-def run_query(search_terms):
-    # Specify the base
-    root_url = 'https://api.datamarket.azure.com/Bing/Search/'
-    source = 'Web'
-
-    # Specify how many results we wish to be returned per page.
-    # Offset specifies where in the results list to start from.
-    # With results_per_page = 10 and offset = 11, this would start from page 2.
-    results_per_page = 10
-    offset = 0
-
-    # Wrap quotes around our query terms as required by the Bing API.
-    # The query we will then use is stored within variable query.
-    query = "'{0}'".format(search_terms)
-    query = urllib.quote(query)
-
-    # Construct the latter part of our request's URL.
-    # SEts the format of the response to JSON and sets other properties
-    search_url = "{0}{1}?$format=json&$top={2}&$skip={3}&Query={4}".format(
-        root_url,
-        source,
-        results_per_page,
-        offset,
-        query)
-
-    # Setup authentication with the Bing servers.
-    # The username MUST be a blank string, and put in API key
-    username = ''
-    bing_api_key = 'ZWQ3rOTmRRv+Ynl0WZ+tdWQ5dXlBqn3tgN64ev1wLME'
-
-    # Create a 'password manager' which handles authentication for us.
-    password_mgr = urllib2.HTTPPasswordMgrWithDefaultRealm()
-    password_mgr.add_password(None, search_url, username, bing_api_key)
-
-    # Create our results list which we'll populate
-    results = []
+import Queue
+import socket
+import threading
+import time
+import urllib
+import urlparse
+from collections import OrderedDict
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from rango import metrics
+
+
+def _setting(name, default):
+    # This module can also be run on its own, without Django settings
     try:
-        # Prepare for connecting to Bing's servers.
-        handler = urllib2.HTTPBasicAuthHandler(password_mgr)
-        opener = urllib2.build_opener(handler)
-        urllib2.install_opener(opener)
-
-        # Connect to the server and read the response generated.
-        response = urllib2.urlopen(search_url).read()
-        
-        # Convert the string response to a Python dictionary object.
-        json_response = json.loads(response)
-
-        # Loop through each page returned, populating out results list.
-        for result in json_response['d']['results']:
-            results.append({
-                    'title': result['Title'],
-                    'link': result['Url'],
-                    'summary': result['Description']})
-
-    # Catch a URLError Exception - something went wrong when connecting!
-    except urllib2.URLError, e:
-        print "Error when querying the Bing API: ", e
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
+
+
+def cooperative():
+    """Whether gevent has patched sockets, see gevent_wsgi.py"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def max_in_flight():
+    # A search waiting under gevent holds a greenlet, not a worker thread,
+    # so only a real overload should make it shed searches
+    if cooperative():
+        return _setting('RANGO_BING_GEVENT_MAX_IN_FLIGHT', 500)
+    return _setting('RANGO_BING_MAX_IN_FLIGHT', 8)
+
+
+def normalize_query(search_terms):
+    """Lower case the query and collapse its whitespace"""
+    return ' '.join(search_terms.lower().split())
+
+
+class SearchCache(object):
+    """
+    A thread safe LRU cache of search results with a time to live.
+    Entries older than ttl but younger than ttl + stale are still served,
+    while a background thread fetches a fresh copy. Concurrent misses on
+    the same key wait for a single fetch rather than each making their own.
+    """
+
+    def __init__(self, max_size=256, ttl=60 * 60, stale=60 * 60 * 24):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale = stale
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        # key -> [Event, value, error] of the fetches in progress
+        self._fetching = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """Return the cached value for key, calling fetch() to (re)fill it"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                value, fetched_at = entry
+                age = now - fetched_at
+                if age < self.ttl + self.stale:
+                    # Re-insert to mark it as the most recently used
+                    self._entries[key] = entry
+                    if age < self.ttl:
+                        self.hits += 1
+                        return value
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        thread = threading.Thread(target=self._refresh, args=(key, fetch))
+                        thread.daemon = True
+                        thread.start()
+                    return value
+            self.misses += 1
+            waiting = self._fetching.get(key)
+            if waiting is None:
+                self._fetching[key] = [threading.Event(), None, None]
+
+        if waiting is not None:
+            # Someone is already asking upstream, share their answer
+            waiting[0].wait()
+            if waiting[2] is not None:
+                raise waiting[2]
+            return waiting[1]
+
+        value, error = [], None
+        try:
+            value = fetch()
+            self.put(key, value)
+        except SearchBusy as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                fetching = self._fetching.pop(key)
+            fetching[1], fetching[2] = value, error
+            fetching[0].set()
+        return value
+
+    def put(self, key, value):
+        # Empty results are usually errors, don't hold on to them
+        if not value:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key, fetch):
+        try:
+            self.put(key, fetch())
+        except SearchBusy:
+            # The stale copy will do until the next try
+            pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.stale_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries),
+                    'hits': self.hits,
+                    'stale_hits': self.stale_hits,
+                    'misses': self.misses}
+
+
+# Results shared by every search made in this process
+search_cache = SearchCache(
+    max_size=_setting('RANGO_SEARCH_CACHE_SIZE', 256),
+    ttl=_setting('RANGO_SEARCH_CACHE_TTL', 60 * 60),
+    stale=_setting('RANGO_SEARCH_CACHE_STALE', 60 * 60 * 24))
+
+
+def run_query(search_terms, offset=0, results_per_page=10):
+    """Search Bing, answering repeated queries from search_cache"""
+    query = normalize_query(search_terms)
+    key = (query, offset, results_per_page)
+    with metrics.timer('search'):
+        return search_cache.get(
+            key, lambda: fetch_query(query, offset, results_per_page))
+
+
+class SearchError(Exception):
+    "Raised when the search backend can't be reached or answers badly"
+    pass
 
-    # Return the list of results to the calling function.
-    return results
+
+class SearchBusy(SearchError):
+    "Raised instead of waiting when max_in_flight searches are waiting already"
+    pass
+
+
+class SearchClient(object):
+    """
+    A reusable, thread safe client for the Bing Search API.
+
+    Connections are kept alive in a small pool and handed to one thread
+    at a time, so nothing process-global (like urllib2.install_opener)
+    is touched per request. Connecting and reading each have their own
+    timeout, so a slow upstream can't hold a worker forever, and at most
+    max_in_flight searches wait on it at once: the ones after that fail
+    straight away instead of tying up every worker of the process.
+    """
+
+    def __init__(self, root_url='https://api.datamarket.azure.com/Bing/Search/',
+                 api_key='', pool_size=4, connect_timeout=3, read_timeout=10,
+                 max_in_flight=None):
+        parts = urlparse.urlsplit(root_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # The username MUST be a blank string, and put in API key
+        self.auth = 'Basic ' + base64.b64encode(':' + api_key)
+        self._pool = Queue.LifoQueue(pool_size)
+        self._in_flight = (threading.BoundedSemaphore(max_in_flight)
+                           if max_in_flight else None)
+
+    def _connect(self):
+        if self.scheme == 'https':
+            conn = httplib.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout)
+        else:
+            conn = httplib.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # From now on the timeout applies to every read
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except Queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close every pooled connection"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Queue.Empty:
+                break
+
+    def get(self, path):
+        """GET path on the search host and return the response body"""
+        if self._in_flight is None:
+            return self._get(path)
+        if not self._in_flight.acquire(False):
+            raise SearchBusy("Too many searches in flight")
+        try:
+            return self._get(path)
+        finally:
+            self._in_flight.release()
+
+    def _get(self, path):
+        try:
+            conn, reused = self._pool.get_nowait(), True
+        except Queue.Empty:
+            conn, reused = None, False
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            try:
+                conn.request('GET', path, headers={'Authorization': self.auth})
+                response = conn.getresponse()
+                body = response.read()
+            except socket.timeout:
+                conn.close()
+                raise
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if not reused:
+                    raise
+                # The server may have dropped an idle keep-alive connection
+                conn = self._connect()
+                conn.request('GET', path, headers={'Authorization': self.auth})
+                response = conn.getresponse()
+                body = response.read()
+        except (httplib.HTTPException, socket.error), e:
+            raise SearchError(e)
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        if response.status != 200:
+            raise SearchError("HTTP {0} from the search API".format(response.status))
+        return body
+
+    def search(self, search_terms, offset=0, results_per_page=10, source='Web'):
+        """Return one page of results as a list of title/link/summary dicts"""
+        # Wrap quotes around our query terms as required by the Bing API.
+        query = urllib.quote("'{0}'".format(search_terms))
+
+        # Sets the format of the response to JSON and sets other properties
+        path = "{0}{1}?$format=json&$top={2}&$skip={3}&Query={4}".format(
+            self.path,
+            source,
+            results_per_page,
+            offset,
+            query)
+
+        try:
+            json_response = json.loads(self.get(path))
+            return [{'title': result['Title'],
+                     'link': result['Url'],
+                     'summary': result['Description']}
+                    for result in json_response['d']['results']]
+        except (ValueError, KeyError, TypeError), e:
+            raise SearchError("Malformed response from the search API: {0}".format(e))
+
+    def search_pages(self, search_terms, pages=2, results_per_page=10):
+        """Fetch several pages of results at once, returned in order"""
+        results = [None] * pages
+        errors = []
+
+        def fetch(page):
+            try:
+                results[page] = self.search(search_terms,
+                                            offset=page * results_per_page,
+                                            results_per_page=results_per_page)
+            except SearchError, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fetch, args=(page,)) for page in range(pages)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return [result for page in results for result in page]
+
+
+# The client shared by every search made in this process
+search_client = SearchClient(
+    root_url=_setting('RANGO_BING_ROOT_URL', 'https://api.datamarket.azure.com/Bing/Search/'),
+    api_key=_setting('RANGO_BING_API_KEY', 'ZWQ3rOTmRRv+Ynl0WZ+tdWQ5dXlBqn3tgN64ev1wLME'),
+    pool_size=_setting('RANGO_BING_POOL_SIZE', 4),
+    connect_timeout=_setting('RANGO_BING_CONNECT_TIMEOUT', 3),
+    read_timeout=_setting('RANGO_BING_READ_TIMEOUT', 10),
+    max_in_flight=max_in_flight())
+
+
+def fetch_query(search_terms, offset=0, results_per_page=10):
+    """
+    Search Bing without the cache, returns [] if anything goes wrong but
+    raises SearchBusy when the search was shed, so the views can say so
+    """
+    try:
+        return search_client.search(search_terms, offset, results_per_page)
+    except SearchBusy:
+        raise
+    # Something went wrong when connecting or reading!
+    except SearchError, e:
+        print "Error when querying the Bing API: ", e
+        return []
 
 if __name__ == '__main__':
   term = raw_input("Enter your search term: ")
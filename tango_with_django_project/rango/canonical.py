@@ -0,0 +1,50 @@
+"""
+Canonical forms of page urls, for spotting the same link saved twice.
+
+canonical_url() rewrites a url so that spellings of the same address
+compare equal: the scheme and host are lower-cased, default ports,
+fragments and trailing slashes dropped and query parameters sorted.
+url_hash() hashes that form without its scheme, since http:// and
+https:// links to a page are the same page for Rango. Page stores the
+hash, and (category, url_hash) is unique, so checking for a duplicate is
+one index lookup.
+"""
+
+import hashlib
+import urllib
+import urlparse
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def with_scheme(url):
+    """Add http:// to a url typed without a scheme"""
+    url = url.strip()
+    if url and '://' not in url:
+        url = 'http://' + url
+    return url
+
+
+def canonical_url(url):
+    """The canonical spelling of a url"""
+    parts = urlparse.urlsplit(with_scheme(url))
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    try:
+        port = parts.port
+    except ValueError:
+        # Not a port at all (":abc"), keep it as given rather than fail
+        host, port = parts.netloc.rpartition('@')[2].lower(), None
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = '{0}:{1}'.format(host, port)
+    path = parts.path.rstrip('/') or '/'
+    query = urllib.urlencode(sorted(urlparse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urlparse.urlunsplit((scheme, host, path, query, ''))
+
+
+def url_hash(url):
+    """Hex digest of the canonical url, the same for http and https"""
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    key = canonical_url(url).split('://', 1)[-1]
+    return hashlib.sha1(key).hexdigest()
@@ -0,0 +1,98 @@
+"""
+A shared, versioned snapshot of the category sidebar.
+
+Every page renders rango/category_list.html in base.html, so instead of
+querying every Category row for each request we keep a lightweight list
+of dicts (id, name, slug, likes) in the cache framework. The snapshot is
+stored under a key that contains a version number, and the version is
+bumped whenever a Category is saved, deleted or liked. Old snapshots are
+simply never read again and fall out of the cache on their own.
+
+Anything that keeps its own copy of the snapshot (like suggest_index)
+can listen to snapshot_changed, which carries the version each save or
+delete moved on to.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from rango.models import Category
+
+VERSION_KEY = 'rango:category_list:version'
+SNAPSHOT_KEY = 'rango:category_list:v{0}'
+
+# How long (in seconds) a snapshot may live in the cache
+SNAPSHOT_TIMEOUT = getattr(settings, 'RANGO_CATEGORY_LIST_TIMEOUT', 60 * 60)
+
+# Sent after a Category save or delete has bumped the version
+snapshot_changed = Signal(providing_args=['instance', 'deleted', 'version'])
+
+
+def new_version():
+    """
+    A version above any used before: starting again at 1 after the key
+    was evicted would bring back old snapshots still in the cache
+    """
+    return int(time.time() * 1000000)
+
+
+def get_version():
+    """Return the current snapshot version, creating it if needed"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # add() will not clobber a version another process just set
+        version = new_version()
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_version():
+    """Invalidate the current snapshot by moving on to a new version"""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # The key is missing (first run or evicted), start above every old one
+        version = new_version()
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+
+def make_entry(cat_id, name, slug, likes):
+    """The dict kept for each category in the snapshot"""
+    return {'id': cat_id,
+            'name': name,
+            'slug': slug,
+            'likes': likes}
+
+
+def build_snapshot():
+    """Query the database for the sidebar data, ordered by likes"""
+    # From the primary, a lagging read replica must not end up in the cache
+    rows = (Category.objects.using(DEFAULT_DB_ALIAS).order_by('-likes')
+            .values_list('id', 'name', 'slug', 'likes'))
+    return [make_entry(cat_id, name, slug, likes) for cat_id, name, slug, likes in rows]
+
+
+def get_snapshot():
+    """Return the cached sidebar snapshot, building it on a cache miss"""
+    key = SNAPSHOT_KEY.format(get_version())
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot()
+        cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """Any change to a Category makes the snapshot stale"""
+    version = bump_version()
+    snapshot_changed.send(sender=sender, instance=instance,
+                          deleted=kwargs['signal'] is post_delete, version=version)
@@ -0,0 +1,94 @@
+"""
+Denormalized page statistics per category.
+
+Each Category has one CategoryStats row holding its page_count,
+total_views and when a page was last added to it, so pages that list
+categories with these figures read one row per category (or join it in
+with select_related('stats')) instead of counting and summing pages.
+
+The row is adjusted with a single UPDATE ... SET x = x + n in the same
+transaction as the change: Page.save() and deletes through the signals
+below, track_url clicks by rango.click_buffer when it flushes and bulk
+loads by rango.loader. A row that is missing (a category from before the
+table existed) is rebuilt from the pages with refresh(), as is every row
+by "manage.py refresh_category_stats".
+"""
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from rango.models import Category, CategoryStats, Page
+
+
+def refresh(category_id):
+    """Recompute a category's stats from its pages, returns the row"""
+    with transaction.atomic():
+        CategoryStats.objects.get_or_create(category_id=category_id)
+        # Lock the row before counting: an add() that commits first is in
+        # the count, one that doesn't waits and then adds on top of it
+        stats = CategoryStats.objects.select_for_update().get(category_id=category_id)
+        # A replica may not have the change being counted yet
+        totals = Page.objects.using(DEFAULT_DB_ALIAS).filter(category_id=category_id).aggregate(
+            page_count=Count('id'), total_views=Sum('views'))
+        stats.page_count = totals['page_count']
+        stats.total_views = totals['total_views'] or 0
+        stats.save(update_fields=['page_count', 'total_views'])
+    return stats
+
+
+def refresh_all():
+    """Recompute the stats of every category, returns how many there are"""
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    for category_id in category_ids:
+        refresh(category_id)
+    return len(category_ids)
+
+
+def add(category_id, pages=0, views=0, added=None):
+    """
+    Adjust a category's stats by the given number of pages and views.
+    Call it inside the transaction making the change.
+    """
+    changes = {}
+    if pages:
+        changes['page_count'] = F('page_count') + pages
+    if views:
+        changes['total_views'] = F('total_views') + views
+    if added:
+        changes['last_page_added'] = added
+    if not changes:
+        return
+    if not CategoryStats.objects.filter(category_id=category_id).update(**changes):
+        # No row yet, count what the database now holds
+        refresh(category_id)
+        if added:
+            CategoryStats.objects.filter(category_id=category_id).update(
+                last_page_added=added)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CategoryStats.objects.create(category=instance)
+
+
+@receiver(post_save, sender=Page)
+def page_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        add(instance.category_id, pages=1, views=instance.views, added=timezone.now())
+    else:
+        # Edited pages (say views changed in the admin) are rare enough
+        # to simply recount the category
+        refresh(instance.category_id)
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, **kwargs):
+    # No fallback to refresh() here, the category itself may be going
+    CategoryStats.objects.filter(category_id=instance.category_id).update(
+        page_count=F('page_count') - 1, total_views=F('total_views') - instance.views)
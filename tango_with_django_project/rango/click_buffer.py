@@ -0,0 +1,184 @@
+"""
+Write-behind buffer for the page click counter used by track_url.
+
+Rather than reading and saving a whole Page row on every outbound click,
+track_url records the click here. Clicks are gathered in memory per page
+id and written out as one F('views') + n UPDATE per page, all inside a
+single transaction that also adds them to their categories' total_views
+(see rango/category_stats.py). The new view counts are then offered to
+the most viewed pages leaderboard (rango/leaderboard.py). A flush happens
+in a background thread when either RANGO_CLICK_BUFFER_MAX_PENDING clicks
+are waiting or RANGO_CLICK_BUFFER_FLUSH_INTERVAL seconds have passed
+since the last one, so the redirect never waits on the database. A timer
+thread checks every FLUSH_INTERVAL seconds as well, so the last clicks
+before a quiet spell don't wait for the next click.
+
+A failed flush is logged and its clicks are put back to be retried, but
+only as many as fit under MAX_PENDING; the rest are dropped (and the
+number logged). MAX_PENDING is therefore also (roughly) the most clicks
+a crashed process, or a database that stays down, can lose.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import F
+
+from rango import category_stats
+from rango import leaderboard
+from rango import page_cache
+from rango.models import Page
+
+logger = logging.getLogger(__name__)
+
+
+def max_pending():
+    return getattr(settings, 'RANGO_CLICK_BUFFER_MAX_PENDING', 50)
+
+
+def flush_interval():
+    return getattr(settings, 'RANGO_CLICK_BUFFER_FLUSH_INTERVAL', 10)
+
+
+class ClickBuffer(object):
+    "Thread safe, in-process store of page_id -> clicks not yet written"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._count = 0
+        self._last_flush = time.time()
+        self._flushing = False
+        self._timer = None
+
+    def add(self, page_id, clicks=1):
+        """Record clicks for a page, starting a background flush if due"""
+        with self._lock:
+            self._pending[page_id] = self._pending.get(page_id, 0) + clicks
+            self._count += clicks
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            due = (self._count >= max_pending() or
+                   time.time() - self._last_flush >= flush_interval())
+            if not due or self._flushing:
+                return
+            self._flushing = True
+
+        thread = threading.Thread(target=self._background_flush)
+        thread.daemon = True
+        thread.start()
+
+    def _run_timer(self):
+        try:
+            while True:
+                time.sleep(flush_interval())
+                self._flush_if_idle()
+        finally:
+            # Should the loop ever end, the next add() starts a new timer
+            with self._lock:
+                self._timer = None
+
+    def _flush_if_idle(self):
+        # Flush what has waited FLUSH_INTERVAL seconds, returns whether it did
+        with self._lock:
+            due = (self._count and not self._flushing and
+                   time.time() - self._last_flush >= flush_interval())
+            if not due:
+                return False
+            self._flushing = True
+        self._background_flush()
+        return True
+
+    def pending(self, page_id):
+        """Number of clicks on a page that have not been written yet"""
+        with self._lock:
+            return self._pending.get(page_id, 0)
+
+    def _drain(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._count = 0
+            self._last_flush = time.time()
+        return pending
+
+    def _restore(self, pending):
+        # Put back counts from a failed flush so that they are retried, as
+        # many as fit under max_pending(), returns how many were dropped
+        dropped = 0
+        with self._lock:
+            for page_id, clicks in pending.items():
+                kept = max(min(clicks, max_pending() - self._count), 0)
+                if kept:
+                    self._pending[page_id] = self._pending.get(page_id, 0) + kept
+                    self._count += kept
+                dropped += clicks - kept
+        if dropped:
+            logger.warning("Dropped %d clicks the database didn't take", dropped)
+        return dropped
+
+    def flush(self):
+        """Write every pending click to the database, returns the pages updated"""
+        pending = self._drain()
+        if not pending:
+            return 0
+        try:
+            # The clicks per category, for the categories' total_views
+            category_clicks = {}
+            views = {}
+            # From the primary, the views are offered to the leaderboard
+            for page_id, category_id, page_views in (
+                    Page.objects.using(DEFAULT_DB_ALIAS).filter(id__in=pending.keys())
+                    .values_list('id', 'category_id', 'views')):
+                category_clicks[category_id] = (category_clicks.get(category_id, 0) +
+                                                pending[page_id])
+                views[page_id] = page_views + pending[page_id]
+            with transaction.atomic():
+                for page_id, clicks in pending.items():
+                    Page.objects.filter(id=page_id).update(views=F('views') + clicks)
+                for category_id, clicks in category_clicks.items():
+                    category_stats.add(category_id, views=clicks)
+        except Exception:
+            self._restore(pending)
+            raise
+
+        # Move the pages up the most viewed leaderboard
+        for page_id, page_views in views.items():
+            leaderboard.pages.offer(page_id, page_views)
+
+        # update() sends no post_save, so purge the cached pages showing views
+        page_cache.purge('pages', *['category:{0}'.format(i) for i in category_clicks])
+        return len(pending)
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            # The clicks are back in the buffer, the next flush retries them
+            logger.exception("Flushing the click buffer failed")
+        finally:
+            with self._lock:
+                self._flushing = False
+            # Each thread gets its own connection, don't leave it open
+            connection.close()
+
+
+# The buffer shared by every request handled in this process
+click_buffer = ClickBuffer()
+
+# Don't drop buffered clicks when the process shuts down cleanly
+atexit.register(click_buffer.flush)
+
+
+def record_click(page_id):
+    click_buffer.add(page_id)
+
+
+def flush():
+    return click_buffer.flush()
@@ -0,0 +1,261 @@
+"""
+Serving files from disk without copying them through Python.
+
+django.views.static.serve reads a file into the worker and writes it out
+again, chunk by chunk. serve_file() instead answers conditional requests
+(If-None-Match, If-Modified-Since) with a 304 from an in-memory index of
+the files' sizes and modification times, and hands the copying to
+whatever can do it best, picked by RANGO_SENDFILE_BACKEND:
+
+- None (the default): the response carries the open file, and
+  FileWrapperMiddleware (wrapped around the WSGI application in wsgi.py)
+  gives it to the server's wsgi.file_wrapper. gunicorn and mod_wsgi send
+  it with the sendfile() system call; the built-in server just reads it.
+  Range requests get their bytes, as a 206.
+- 'x-sendfile': an empty response with an X-Sendfile header naming the
+  file, for Apache's mod_xsendfile or lighttpd.
+- 'x-accel-redirect': an empty response with an X-Accel-Redirect header
+  naming the file's internal location in nginx, per
+  RANGO_X_ACCEL_LOCATIONS, e.g. for MEDIA_ROOT
+      location /_media/ { internal; alias /path/to/media/; }
+
+The web server then handles ranges and the copying itself.
+"""
+
+import mimetypes
+import os
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+BLOCK_SIZE = 64 * 1024
+
+FileInfo = namedtuple('FileInfo', 'size mtime etag content_type')
+
+
+def index_ttl():
+    return getattr(settings, 'RANGO_FILE_INDEX_TTL', 5)
+
+
+class FileIndex(object):
+    """
+    The size, modification time, ETag and type of recently served files,
+    so that most requests need no stat() at all. Entries are trusted for
+    RANGO_FILE_INDEX_TTL seconds, and refreshed sooner when the file being
+    sent turns out to differ.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, path):
+        """The FileInfo of path, None if it isn't a file"""
+        entry = self._entries.get(path)
+        if entry is not None and time.time() - entry[1] < index_ttl():
+            return entry[0]
+        return self.refresh(path)
+
+    def refresh(self, path, stat=None):
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            info = None
+        else:
+            if not os.path.isfile(path):
+                info = None
+            else:
+                info = FileInfo(stat.st_size, stat.st_mtime,
+                                '"{0:x}-{1:x}"'.format(stat.st_size, int(stat.st_mtime * 1000000)),
+                                mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        with self._lock:
+            # Forgetting everything now and then keeps the index bounded
+            if len(self._entries) >= self.max_size:
+                self._entries.clear()
+            self._entries[path] = (info, time.time())
+        return info
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+index = FileIndex()
+
+
+def _etag_matches(header, etag):
+    tags = [tag.strip() for tag in header.split(',')]
+    # A weak match is enough to skip the body
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+
+def parse_range(header, size):
+    """
+    The (first, last) byte of a single "bytes=" range, None to send the
+    whole file (no, a malformed or a multiple range) or False if the range
+    can't be satisfied.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    ranges = header[len('bytes='):].split(',')
+    if len(ranges) != 1:
+        return None
+    first, _, last = ranges[0].strip().partition('-')
+    try:
+        if not first:
+            # The last N bytes
+            length = int(last)
+            if not length:
+                return False
+            return max(size - length, 0), size - 1
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if first > last:
+        return False if first >= size else None
+    return first, last
+
+
+def _x_accel_location(path):
+    for root, location in getattr(settings, 'RANGO_X_ACCEL_LOCATIONS', ()):
+        root = os.path.join(os.path.abspath(root), '')
+        if path.startswith(root):
+            return location.rstrip('/') + '/' + path[len(root):].replace(os.sep, '/')
+    raise ImproperlyConfigured("No RANGO_X_ACCEL_LOCATIONS root holds {0}".format(path))
+
+
+def _read(f, length):
+    while length > 0:
+        chunk = f.read(min(BLOCK_SIZE, length))
+        if not chunk:
+            break
+        length -= len(chunk)
+        yield chunk
+
+
+def serve_file(req, path, content_type=None, content_encoding=None):
+    """The response sending the file at path (an absolute path) to req"""
+    info = index.get(path)
+    if info is None:
+        raise Http404
+
+    if_none_match = req.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, info.etag)
+    else:
+        not_modified = not was_modified_since(req.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                              info.mtime, info.size)
+    if not_modified:
+        response = HttpResponseNotModified()
+        response['ETag'] = info.etag
+        return response
+
+    backend = getattr(settings, 'RANGO_SENDFILE_BACKEND', None)
+    if backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type or info.content_type)
+        response['X-Sendfile'] = path
+    elif backend == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type or info.content_type)
+        response['X-Accel-Redirect'] = _x_accel_location(path)
+    else:
+        response = _file_response(req, path, info, content_type or info.content_type)
+        info = response.info
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    response['Last-Modified'] = http_date(info.mtime)
+    response['ETag'] = info.etag
+    return response
+
+
+def _file_response(req, path, info, content_type):
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        raise Http404
+    # The index may be a few seconds behind, the open file isn't
+    stat = os.fstat(f.fileno())
+    if (stat.st_size, stat.st_mtime) != (info.size, info.mtime):
+        info = index.refresh(path, stat)
+
+    byte_range = None
+    if_range = req.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range in (info.etag, http_date(info.mtime)):
+        byte_range = parse_range(req.META.get('HTTP_RANGE'), info.size)
+
+    if byte_range is False:
+        f.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{0}'.format(info.size)
+    elif byte_range:
+        first, last = byte_range
+        f.seek(first)
+        response = StreamingHttpResponse(_read(f, last - first + 1), status=206,
+                                          content_type=content_type)
+        response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(first, last, info.size)
+        response['Content-Length'] = last - first + 1
+        response._closable_objects.append(f)
+    else:
+        response = StreamingHttpResponse(_read(f, info.size), content_type=content_type)
+        response['Content-Length'] = info.size
+        response._closable_objects.append(f)
+        if req.method != 'HEAD':
+            # FileWrapperMiddleware hands this to the server
+            response.file_to_stream = f
+    response['Accept-Ranges'] = 'bytes'
+    response.info = info
+    return response
+
+
+def serve(req, path, document_root, private=()):
+    """
+    A view serving document_root, instead of django.views.static.serve,
+    except for the directories under it named in private
+    """
+    try:
+        full_path = safe_join(document_root, path)
+    except (SuspiciousOperation, ValueError):
+        raise Http404
+    for directory in private:
+        if full_path.startswith(os.path.join(os.path.abspath(document_root), directory, '')):
+            raise Http404
+    return serve_file(req, full_path)
+
+
+class _ClosingFile(object):
+    """
+    The file for wsgi.file_wrapper. Servers close the wrapper rather than
+    the response, so closing it closes the response, which closes the
+    file and lets Django know the request is over.
+    """
+
+    def __init__(self, f, response):
+        self.read = f.read
+        self.fileno = f.fileno
+        self.tell = f.tell
+        self.seek = f.seek
+        self.close = response.close
+
+
+class FileWrapperMiddleware(object):
+    "WSGI middleware giving the files of serve_file() to wsgi.file_wrapper"
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        response = self.application(environ, start_response)
+        f = getattr(response, 'file_to_stream', None)
+        # A HEAD response has no body, Django has emptied it already
+        if (f is not None and 'wsgi.file_wrapper' in environ
+                and environ.get('REQUEST_METHOD') != 'HEAD'):
+            return environ['wsgi.file_wrapper'](_ClosingFile(f, response), BLOCK_SIZE)
+        return response
@@ -1,6 +1,7 @@
 # This form.py is in fact a model exclusively dedicated to Django forms
 
 from django import forms
+from rango import canonical
 from rango.models import Category, Page
 from rango.models import UserProfile
 from django.contrib.auth.models import User
@@ -16,25 +17,32 @@ class CategoryForm(forms.ModelForm):
     class Meta:
         "Provide an association between the ModelForm and the Category Model"
         model = Category
+        # The slug is filled in from the name when the category is saved
+        fields = ('name', 'visits', 'likes')
         
 class PageForm(forms.ModelForm):
     "Form class presenting data from Page Model"
     title = forms.CharField(max_length=128, help_text="Please enter the title of the page.")
     url = forms.URLField(max_length=200, help_text="Please enter the URL of the page.")
     views = forms.IntegerField(widget=forms.HiddenInput(), initial=0)
-    
-    def clean(self):
-        "Method to clean data coming into the forms"
-        cleaned_data = self.cleaned_data
-        url = cleaned_data.get('url')
 
-        # If url is not empty and doesn't start with 'http://', prepend 'http://'.
-        if url and not url.startswith('http://'):
-            url = 'http://' + url
-            cleaned_data['url'] = url
-        # Return a dictionary cleaned_data = {'url': url}
-        # Always return this dict as cleaned_data to avoid error
-        return cleaned_data
+    def __init__(self, *args, **kwargs):
+        # The category the page goes in, to check for links already saved there
+        self.category = kwargs.pop('category', None)
+        super(PageForm, self).__init__(*args, **kwargs)
+
+    def clean_url(self):
+        "Method to clean the url coming into the form"
+        # Add http:// to a url typed without a scheme, but leave https:// alone
+        url = canonical.with_scheme(self.cleaned_data['url'])
+
+        # Refuse a link the category already has, however it is spelled.
+        # This is a single lookup on the (category, url_hash) index.
+        if self.category is not None:
+            if Page.objects.filter(category=self.category,
+                                   url_hash=canonical.url_hash(url)).exists():
+                raise forms.ValidationError("This page is already in the category.")
+        return url
 
     class Meta:
         # Provide an association between the ModelForm and a model
@@ -0,0 +1,52 @@
+"""
+Cached HTML fragments for the category sidebar and category page lists.
+
+base.html and category.html wrap their rango/category_list.html and
+rango/page_list.html includes in {% cache %} tags (from rango_cache,
+which fills them from the primary database) that vary on a version
+counter: the category_cache version for the sidebar, and the page_cache
+'category:<id>' tag version for a category's pages. A model change bumps
+the counter and so retires the fragment.
+
+auto_add_page and suggest_category render the same includes for AJAX
+requests; render_fragment() lets them share the cached HTML by building
+the same key the {% cache %} tag does.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import render_to_string
+
+from rango import category_cache
+from rango import page_cache
+from rango import routers
+
+CATEGORY_LIST = 'rango_category_list'
+PAGE_LIST = 'rango_page_list'
+
+
+def fragment_timeout():
+    return getattr(settings, 'RANGO_FRAGMENT_CACHE_TIMEOUT', 60 * 60)
+
+
+def page_list_version(category_id):
+    """The version the cached page list of a category varies on"""
+    return page_cache.tag_version('category:{0}'.format(category_id))
+
+
+def render_fragment(template_name, context_dict, fragment_name, vary_on):
+    """Render template_name, or return the HTML {% cache %} stored for it"""
+    key = make_template_fragment_key(fragment_name, vary_on)
+    content = cache.get(key)
+    if content is None:
+        with routers.primary():
+            content = render_to_string(template_name, context_dict)
+        cache.set(key, content, fragment_timeout())
+    return content
+
+
+def fragment_versions(req):
+    """Context processor with what the {% cache %} tags in the templates need"""
+    return {'fragment_timeout': fragment_timeout(),
+            'category_list_version': category_cache.get_version()}
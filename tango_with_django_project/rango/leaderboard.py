@@ -0,0 +1,178 @@
+"""
+Top-N leaderboards of the most viewed pages and most liked categories.
+
+Each board is a short list of entries (dicts with an 'id' and a score),
+best first and at most RANGO_LEADERBOARD_SIZE long, kept in the cache
+framework so every process shares it. Reading the index page's top five
+is then a single cache get rather than a sort over the Page or Category
+table.
+
+Scores only go up in normal use, so boards are updated in place: the
+click buffer offers each page it flushes with its new views and
+like_category offers the category it liked with its new total. An entry
+that beats the last one on the board gets in and pushes it out. Other
+changes (a page edited or deleted, a category renamed) simply drop the
+board if the item is on it. Boards are rebuilt from the database with one
+indexed query on the primary database when missing and every
+RANGO_LEADERBOARD_RECONCILE seconds, which also repairs any update lost
+to two processes writing at once.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rango import category_cache
+from rango.models import Category, Page
+
+BOARD_KEY = 'rango:leaderboard:{0}'
+
+
+def board_size():
+    return getattr(settings, 'RANGO_LEADERBOARD_SIZE', 10)
+
+
+def reconcile_interval():
+    return getattr(settings, 'RANGO_LEADERBOARD_RECONCILE', 60 * 5)
+
+
+def page_entry(page_id, title, url, views):
+    """The dict kept for each page on the pages board"""
+    return {'id': page_id,
+            'title': title,
+            'url': url,
+            'views': views}
+
+
+class Leaderboard(object):
+    """
+    A cached top-N list. load(n) returns the best n entries from the
+    database and describe(id) the entry of one item, score is the key of
+    the score in an entry.
+    """
+
+    def __init__(self, name, score, load, describe):
+        self.key = BOARD_KEY.format(name)
+        self.score = score
+        self.load = load
+        self.describe = describe
+        # Serializes read-modify-write updates within this process
+        self._lock = threading.Lock()
+
+    def reconcile(self):
+        """Rebuild the board from the database, returns its entries"""
+        entries = self.load(board_size())
+        cache.set(self.key, {'entries': entries, 'reconciled': time.time()}, None)
+        return entries
+
+    def _board(self):
+        board = cache.get(self.key)
+        if board is None or time.time() - board['reconciled'] >= reconcile_interval():
+            return None
+        return board
+
+    def top(self, n):
+        """The best n entries"""
+        board = self._board()
+        entries = board['entries'] if board else self.reconcile()
+        return entries[:n]
+
+    def offer(self, item_id, score):
+        """Record an item's new score, putting it on the board if it qualifies"""
+        with self._lock:
+            board = self._board()
+            if board is None:
+                # The next read reloads it from the database anyway
+                return
+            entries = board['entries']
+            current = [entry for entry in entries if entry['id'] == item_id]
+            if current:
+                entry = dict(current[0])
+                entries = [e for e in entries if e['id'] != item_id]
+            elif len(entries) < board_size() or score > entries[-1][self.score]:
+                entry = self.describe(item_id)
+                if entry is None:
+                    return
+            else:
+                return
+            entry[self.score] = score
+            entries.append(entry)
+            entries.sort(key=lambda e: (-e[self.score], -e['id']))
+            board['entries'] = entries[:board_size()]
+            cache.set(self.key, board, None)
+
+    def discard(self, item_id):
+        """Drop the board if the item is on it, it's rebuilt on the next read"""
+        board = cache.get(self.key)
+        if board and any(entry['id'] == item_id for entry in board['entries']):
+            cache.delete(self.key)
+
+
+# Boards are read from the primary, a lagging read replica must not end
+# up in the cache
+
+def _load_pages(n):
+    rows = (Page.objects.using(DEFAULT_DB_ALIAS).order_by('-views', '-id')
+            .values_list('id', 'title', 'url', 'views')[:n])
+    return [page_entry(*row) for row in rows]
+
+
+def _describe_page(page_id):
+    rows = (Page.objects.using(DEFAULT_DB_ALIAS).filter(id=page_id)
+            .values_list('id', 'title', 'url', 'views'))
+    return page_entry(*rows[0]) if rows else None
+
+
+def _load_categories(n):
+    rows = (Category.objects.using(DEFAULT_DB_ALIAS).order_by('-likes', '-id')
+            .values_list('id', 'name', 'slug', 'likes')[:n])
+    return [category_cache.make_entry(*row) for row in rows]
+
+
+def _describe_category(category_id):
+    rows = (Category.objects.using(DEFAULT_DB_ALIAS).filter(id=category_id)
+            .values_list('id', 'name', 'slug', 'likes'))
+    return category_cache.make_entry(*rows[0]) if rows else None
+
+
+pages = Leaderboard('pages', 'views', _load_pages, _describe_page)
+categories = Leaderboard('categories', 'likes', _load_categories, _describe_category)
+
+
+def top_pages(n=5):
+    return pages.top(n)
+
+
+def top_categories(n=5):
+    return categories.top(n)
+
+
+@receiver(post_save, sender=Page)
+def page_saved(sender, instance, created, **kwargs):
+    if created:
+        pages.offer(instance.id, instance.views)
+    else:
+        pages.discard(instance.id)
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, **kwargs):
+    pages.discard(instance.id)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if created:
+        categories.offer(instance.id, instance.likes)
+    else:
+        categories.discard(instance.id)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    categories.discard(instance.id)
@@ -0,0 +1,115 @@
+"""
+Sharded like counters for like_category.
+
+Each like increments one of RANGO_LIKE_SHARDS randomly chosen
+CategoryLikeShard rows with a single atomic UPDATE, so likes on a popular
+category no longer serialize on (and overwrite) the Category row. Readers
+get the total from the cache. The total is recomputed from the shards at
+most once every RANGO_LIKE_ROLLUP_INTERVAL seconds, in a background
+thread, and written back to Category.likes as a denormalized rollup.
+"""
+
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+
+from rango import category_cache
+from rango import leaderboard
+from rango import page_cache
+from rango.models import Category, CategoryLikeShard
+
+TOTAL_KEY = 'rango:likes:{0}'
+ROLLUP_KEY = 'rango:likes:{0}:rolled_up'
+
+
+def num_shards():
+    return getattr(settings, 'RANGO_LIKE_SHARDS', 8)
+
+
+def rollup_interval():
+    return getattr(settings, 'RANGO_LIKE_ROLLUP_INTERVAL', 30)
+
+
+def _increment(category_id, shard, likes=1):
+    # A single UPDATE ... SET count = count + 1, returns False if the row is missing
+    updated = CategoryLikeShard.objects.filter(
+        category_id=category_id, shard=shard).update(count=F('count') + likes)
+    return updated > 0
+
+
+def _seed(category_id):
+    """Move the likes a category had before sharding into shard 0"""
+    likes = Category.objects.values_list('likes', flat=True).get(id=category_id)
+    try:
+        with transaction.atomic():
+            CategoryLikeShard.objects.create(category_id=category_id, shard=0, count=likes)
+    except IntegrityError:
+        # Already seeded (possibly by a concurrent like)
+        pass
+
+
+def rollup(category_id):
+    """Sum the shards into Category.likes and the cache, returns the total"""
+    shards = CategoryLikeShard.objects.filter(category_id=category_id)
+    if not shards.exists():
+        _seed(category_id)
+    total = shards.aggregate(total=Sum('count'))['total'] or 0
+
+    if Category.objects.filter(id=category_id).exclude(likes=total).update(likes=total):
+        # update() sends no post_save, so refresh the sidebar and pages ourselves
+        category_cache.bump_version()
+        page_cache.purge('categories', 'category:{0}'.format(category_id))
+
+    cache.set(TOTAL_KEY.format(category_id), total, None)
+    cache.set(ROLLUP_KEY.format(category_id), True, rollup_interval())
+    return total
+
+
+def _background_rollup(category_id):
+    try:
+        rollup(category_id)
+    finally:
+        connection.close()
+
+
+def get_total(category_id):
+    """Return the (approximate) number of likes of a category"""
+    total = cache.get(TOTAL_KEY.format(category_id))
+    if total is None:
+        total = rollup(category_id)
+    return total
+
+
+def add_like(category_id):
+    """Add one like to a category and return its approximate total"""
+    shard = random.randrange(num_shards())
+    if not _increment(category_id, shard):
+        # First like on this shard, make sure old likes are kept
+        _seed(category_id)
+        if not _increment(category_id, shard):
+            try:
+                with transaction.atomic():
+                    CategoryLikeShard.objects.create(category_id=category_id,
+                                                     shard=shard, count=1)
+            except IntegrityError:
+                _increment(category_id, shard)
+
+    try:
+        total = cache.incr(TOTAL_KEY.format(category_id))
+    except ValueError:
+        # Nothing cached yet, this also records when we rolled up
+        total = rollup(category_id)
+    else:
+        # Refresh Category.likes in the background once the last rollup is old
+        if cache.add(ROLLUP_KEY.format(category_id), True, rollup_interval()):
+            thread = threading.Thread(target=_background_rollup, args=(category_id,))
+            thread.daemon = True
+            thread.start()
+
+    # Move the category up the most liked leaderboard
+    leaderboard.categories.offer(category_id, total)
+    return total
@@ -0,0 +1,258 @@
+"""
+Concurrent health checks of the links saved as pages.
+
+LinkChecker.run() reads the pages to check in id order, a chunk at a
+time, and hands them to a pool of worker threads through a bounded queue,
+so only a few thousand urls are ever in memory. Each worker sends a HEAD
+request, falling back to GET for servers that refuse HEAD, and follows
+redirects itself to record the final url. At most per_host requests go
+to one host at once, and a host that answers 429/503 or times out is
+backed off from: its delay doubles (or follows Retry-After) and halves
+again with each success.
+
+Results are written as PageHealth rows by the main thread, batch_size at
+a time in one transaction. A run only checks pages without a result newer
+than max_age, so an interrupted run picks up where it left off when it is
+started again.
+"""
+
+import datetime
+import httplib
+import socket
+import threading
+import time
+import urlparse
+from Queue import Queue
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.encoding import iri_to_uri
+
+from rango.models import Page, PageHealth
+
+USER_AGENT = 'Rango link checker'
+REDIRECTS = (301, 302, 303, 307, 308)
+# Answers that mean "not now" rather than "broken"
+BACK_OFF = (429, 503)
+# Servers that don't do HEAD say so in several ways
+NO_HEAD = (400, 403, 404, 405, 501)
+MAX_DELAY = 30.0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CheckError(Exception):
+    "A link check got no usable response"
+
+
+class HostThrottle(object):
+    "Limits concurrent requests to a host and backs off when it struggles"
+
+    def __init__(self, per_host):
+        self.slots = threading.BoundedSemaphore(per_host)
+        self.lock = threading.Lock()
+        self.delay = 0.0
+
+    def wait(self):
+        with self.lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+    def slow_down(self, retry_after=None):
+        with self.lock:
+            if retry_after is None:
+                retry_after = max(self.delay * 2, 0.5)
+            self.delay = min(retry_after, MAX_DELAY)
+
+    def speed_up(self):
+        with self.lock:
+            self.delay = self.delay / 2 if self.delay > 0.1 else 0.0
+
+
+class LinkChecker(object):
+    "Checks the links of pages with a pool of threads"
+
+    def __init__(self, workers=None, per_host=None, timeout=None, batch_size=500,
+                 max_age=None, retries=2, max_redirects=5):
+        self.workers = workers or _setting('RANGO_LINK_CHECK_WORKERS', 20)
+        self.per_host = per_host or _setting('RANGO_LINK_CHECK_PER_HOST', 2)
+        self.timeout = timeout or _setting('RANGO_LINK_CHECK_TIMEOUT', 10)
+        self.batch_size = batch_size
+        if max_age is None:
+            max_age = _setting('RANGO_LINK_CHECK_MAX_AGE', 60 * 60 * 24)
+        self.max_age = max_age
+        self.retries = retries
+        self.max_redirects = max_redirects
+        self._throttles = {}
+        self._throttles_lock = threading.Lock()
+        self.checked = 0
+        self.broken = 0
+        self.seconds = 0.0
+
+    def throttle(self, host):
+        with self._throttles_lock:
+            if host not in self._throttles:
+                self._throttles[host] = HostThrottle(self.per_host)
+            return self._throttles[host]
+
+    def _request(self, method, url):
+        """Send one request, returns (status, location)"""
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise CheckError('Not an http(s) url')
+        connection_class = (httplib.HTTPSConnection if parts.scheme == 'https'
+                            else httplib.HTTPConnection)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        throttle = self.throttle(parts.netloc)
+        with throttle.slots:
+            throttle.wait()
+            connection = connection_class(parts.hostname, parts.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, headers={'User-Agent': USER_AGENT})
+                response = connection.getresponse()
+                # Enough of the body for the server to be happy, no more
+                response.read(1024 if method == 'GET' else 0)
+            except (socket.error, httplib.HTTPException) as e:
+                throttle.slow_down()
+                raise CheckError(str(e) or e.__class__.__name__)
+            finally:
+                connection.close()
+
+        retry_after = response.getheader('Retry-After', '')
+        if response.status in BACK_OFF:
+            throttle.slow_down(float(retry_after) if retry_after.isdigit() else None)
+        else:
+            throttle.speed_up()
+        return response.status, response.getheader('Location')
+
+    def _fetch(self, method, url):
+        """Follow redirects from url, returns (status, final url)"""
+        for redirect in range(self.max_redirects + 1):
+            for attempt in range(self.retries + 1):
+                try:
+                    status, location = self._request(method, url)
+                except CheckError:
+                    if attempt == self.retries:
+                        raise
+                    continue
+                if status not in BACK_OFF or attempt == self.retries:
+                    break
+            if status in REDIRECTS and location:
+                url = urlparse.urljoin(url, location)
+                continue
+            return status, url
+        raise CheckError('Too many redirects')
+
+    def check(self, url):
+        """Check one url, returns a (status, final_url, latency, error) tuple"""
+        start = time.time()
+        # Non-ASCII urls are sent percent-encoded
+        url = str(iri_to_uri(url))
+        try:
+            status, final_url = self._fetch('HEAD', url)
+            if status in NO_HEAD:
+                status, final_url = self._fetch('GET', url)
+            error = ''
+        except CheckError as e:
+            status, final_url, error = None, '', str(e)
+        except Exception as e:
+            # A malformed url (a port that isn't a number, say), a certificate
+            # for another host, ... still make the link broken, not the checker
+            status, final_url, error = None, '', '{0}: {1}'.format(type(e).__name__, e)
+        return status, final_url, time.time() - start, error[:255]
+
+    def pages_to_check(self, chunk_size=1000):
+        """Yield (id, url) of the pages without a recent check, in id order"""
+        pages = Page.objects.order_by('id')
+        if self.max_age:
+            cutoff = timezone.now() - datetime.timedelta(seconds=self.max_age)
+            pages = pages.exclude(health__checked__gte=cutoff)
+        last_id = 0
+        while True:
+            # Keyset chunks, so no cursor is held open while results are saved
+            chunk = list(pages.filter(id__gt=last_id)
+                         .values_list('id', 'url')[:chunk_size].iterator())
+            if not chunk:
+                return
+            for row in chunk:
+                yield row
+            last_id = chunk[-1][0]
+
+    def save(self, results):
+        """Replace the PageHealth rows of the checked pages in one transaction"""
+        if not results:
+            return
+        now = timezone.now()
+        records = [PageHealth(page_id=page_id, status=status, final_url=final_url[:1024],
+                              latency=latency, error=error, checked=now)
+                   for page_id, (status, final_url, latency, error) in results]
+        with transaction.atomic():
+            PageHealth.objects.filter(page_id__in=[r.page_id for r in records]).delete()
+            PageHealth.objects.bulk_create(records)
+        self.checked += len(records)
+        self.broken += len([r for r in records if r.is_broken()])
+
+    def _work(self, tasks, results):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            page_id, url = task
+            result = (None, '', 0.0, 'Not checked')
+            try:
+                result = self.check(url)
+            finally:
+                # Every task must answer, run() waits for as many results
+                results.put((page_id, result))
+
+    def _drain(self, results, pending, wait=False):
+        # Move finished checks into pending, saving every full batch
+        while not results.empty() or (wait and self._outstanding):
+            pending.append(results.get())
+            self._outstanding -= 1
+            if len(pending) >= self.batch_size:
+                self.save(pending)
+                del pending[:]
+
+    def run(self, pages=None):
+        """Check pages ((id, url) pairs, the due pages by default), returns self"""
+        start = time.time()
+        tasks = Queue(self.workers * 4)
+        results = Queue()
+        threads = [threading.Thread(target=self._work, args=(tasks, results))
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        pending = []
+        self._outstanding = 0
+        try:
+            for task in (pages if pages is not None else self.pages_to_check()):
+                tasks.put(task)
+                self._outstanding += 1
+                self._drain(results, pending)
+            self._drain(results, pending, wait=True)
+            for thread in threads:
+                tasks.put(None)
+        finally:
+            # Whatever got checked is kept, even when interrupted
+            while not results.empty():
+                pending.append(results.get())
+            self.save(pending)
+
+        self.seconds += time.time() - start
+        return self
+
+    def rate(self):
+        """Links checked per second"""
+        if not self.seconds:
+            return 0.0
+        return self.checked / self.seconds
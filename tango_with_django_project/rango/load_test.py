@@ -0,0 +1,272 @@
+"""
+Load test of web searches against a slow search API.
+
+run_load_test() points the Bing client at a local stub API that takes
+latency seconds to answer and serves the site from one of two servers:
+
+- 'threads': a WSGI server with a fixed pool of worker threads, like a
+  process of a synchronous WSGI deployment, and
+- 'gevent': tango_with_django_project/gevent_wsgi.py, in a child process
+  since gevent must patch the standard library before anything else
+  imports it. Needs gevent installed.
+
+It then fires searches concurrent searches at /rango/search/ while a
+probe keeps requesting /rango/about/, which never searches, and reports
+how many searches reached the API at once and how long the probe had to
+wait.
+
+With threads and max_in_flight=0 (no limit) every worker ends up waiting
+on the API and the about page waits with them. Under gevent a waiting
+search holds no worker, so every search is answered and the about page
+stays fast. A max_in_flight limit with threads is the fallback for when
+even that isn't enough: searches beyond it fail fast with no results.
+
+Use it through "manage.py search_load_test", or from a test.
+"""
+
+import httplib
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from Queue import Queue
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+
+from rango import benchmark
+from rango import bing_search
+
+# Any alphanumeric token is accepted, as long as cookie and form agree
+CSRF_TOKEN = 'loadtest' * 4
+
+# Run as the gevent server's child process, with the port, the database,
+# the stub API's url and the searches limit as arguments
+GEVENT_SERVER = """
+from gevent import monkey
+monkey.patch_all()
+import sys
+from django.conf import settings
+port, database, root_url, max_in_flight = sys.argv[1:]
+settings.DATABASES['default']['NAME'] = database
+settings.RANGO_BING_ROOT_URL = root_url
+settings.RANGO_BING_GEVENT_MAX_IN_FLIGHT = int(max_in_flight)
+from gevent.pywsgi import WSGIServer
+from tango_with_django_project.gevent_wsgi import application
+WSGIServer(('127.0.0.1', int(port)), application, log=None).serve_forever()
+"""
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    "Answers like the Bing API does, but only after server.latency seconds"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+            server.requests += 1
+        try:
+            time.sleep(server.latency)
+            query = urlparse.parse_qs(urlparse.urlsplit(self.path).query)['Query'][0]
+            body = json.dumps({'d': {'results': [{'Title': query,
+                                                  'Url': 'http://example.com/',
+                                                  'Description': 'Load test result'}]}})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSearchServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubSearchHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    "Handles requests with a fixed number of worker threads"
+
+    def __init__(self, workers):
+        WSGIServer.__init__(self, ('127.0.0.1', 0), QuietHandler)
+        self.request_queue_size = 128
+        self._requests = Queue()
+        for i in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+
+    def process_request(self, request, client_address):
+        # Wait for a free worker, like a synchronous deployment does
+        self._requests.put((request, client_address))
+
+    def _work(self):
+        while True:
+            request, client_address = self._requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                connection.close()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class GeventSite(object):
+    "The site served by gevent_wsgi.py from a child process"
+
+    def __init__(self, root_url, max_in_flight):
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        self.server_port = probe.getsockname()[1]
+        probe.close()
+        self.process = subprocess.Popen(
+            [sys.executable, '-c', GEVENT_SERVER, str(self.server_port),
+             connection.settings_dict['NAME'], root_url, str(max_in_flight)],
+            cwd=settings.PROJECT_PATH)
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', self.server_port), 1).close()
+                return
+            except socket.error:
+                if self.process.poll() is not None or time.time() > deadline:
+                    self.close()
+                    raise RuntimeError("The gevent server didn't start")
+                time.sleep(0.1)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
+
+
+def _start(server):
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.daemon = True
+    thread.start()
+
+
+def _request(port, method, path, params=None):
+    conn = httplib.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        headers = {'Cookie': 'csrftoken=' + CSRF_TOKEN}
+        body = None
+        if params is not None:
+            params = dict(params, csrfmiddlewaretoken=CSRF_TOKEN)
+            body = urllib.urlencode(params)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_load_test(searches=50, workers=8, latency=0.5, max_in_flight=4, server='threads'):
+    """
+    Run the load test, returns a report dict. workers only applies to the
+    'threads' server, the 'gevent' one takes requests as they come.
+    """
+    stub = StubSearchServer(latency)
+    _start(stub)
+    root_url = 'http://127.0.0.1:{0}/Bing/Search/'.format(stub.server_port)
+
+    old_client = bing_search.search_client
+    if server == 'gevent':
+        try:
+            site = GeventSite(root_url, max_in_flight)
+        except Exception:
+            stub.shutdown()
+            stub.server_close()
+            raise
+    else:
+        site = PooledWSGIServer(workers)
+        site.set_app(WSGIHandler())
+        _start(site)
+        bing_search.search_client = bing_search.SearchClient(
+            root_url=root_url, pool_size=workers, read_timeout=latency + 10,
+            max_in_flight=max_in_flight)
+        bing_search.search_cache.clear()
+
+    statuses = []
+    probe_times = []
+    done = threading.Event()
+
+    def search(i):
+        # Distinct queries, so the search cache can't answer for the API
+        statuses.append(_request(site.server_port, 'POST', '/rango/search/',
+                                 {'query': 'load test {0}'.format(i)}))
+
+    def probe():
+        while not done.is_set():
+            start = time.time()
+            statuses.append(_request(site.server_port, 'GET', '/rango/about/'))
+            probe_times.append(time.time() - start)
+            time.sleep(0.01)
+
+    try:
+        start = time.time()
+        prober = threading.Thread(target=probe)
+        prober.start()
+        threads = [threading.Thread(target=search, args=(i,)) for i in range(searches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.time() - start
+        done.set()
+        prober.join()
+    finally:
+        if bing_search.search_client is not old_client:
+            bing_search.search_client.close()
+            bing_search.search_client = old_client
+        site.close()
+        stub.shutdown()
+        stub.server_close()
+
+    return {'server': server,
+            'searches': searches,
+            'workers': workers if server == 'threads' else None,
+            'latency': latency,
+            'max_in_flight': max_in_flight,
+            'seconds': round(seconds, 3),
+            'searches_answered': stub.requests,
+            'searches_shed': searches - stub.requests,
+            'peak_in_flight': stub.peak,
+            # A shed search answers 503 on purpose, that isn't an error
+            'errors': len([status for status in statuses if status not in (200, 503)]),
+            'probe_requests': len(probe_times),
+            'probe_p50_ms': round(1000 * benchmark.percentile(probe_times, 0.5), 3),
+            'probe_p95_ms': round(1000 * benchmark.percentile(probe_times, 0.95), 3)}
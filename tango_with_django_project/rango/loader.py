@@ -0,0 +1,143 @@
+"""
+Bulk, streaming loader for categories and pages.
+
+Rows are dicts with a 'category', 'title' and 'url' and optionally the
+page's 'views' and the category's 'likes' and 'visits' (only used when
+the category has to be created). They are read lazily from JSON lines or
+CSV files, or made up by synthetic_rows() for load tests, so the input
+never has to fit in memory.
+
+Categories are resolved through an in-memory name -> id map. Pages are
+inserted with bulk_create in chunks, one transaction per chunk, and a
+page whose link is already saved in its category is skipped by checking
+a set of (category, canonical url hash) keys instead of querying per row. Each
+chunk also updates the stats of the categories it adds pages to and purges
+their cached pages and page lists. At the end the leaderboards are rebuilt
+and the search index updated.
+"""
+
+import csv
+import json
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from rango import canonical
+from rango import category_stats
+from rango import leaderboard
+from rango import local_search
+from rango import page_cache
+from rango.models import Category, Page
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    # The csv module works on bytes in Python 2, decode each value
+    for row in csv.DictReader(stream):
+        yield dict((key, value.decode('utf-8')) for key, value in row.items())
+
+
+def synthetic_rows(count, categories=100):
+    """Make up count pages spread over the given number of categories"""
+    for i in range(count):
+        category = i % categories
+        yield {'category': u'Synthetic {0}'.format(category),
+               'title': u'Synthetic page {0}'.format(i),
+               'url': u'http://example.com/{0}/{1}/'.format(category, i),
+               'views': i % 1000}
+
+
+def page_key(category_id, url_hash):
+    """A compact key identifying a link within a category"""
+    return (category_id, url_hash.decode('hex'))
+
+
+class PageLoader(object):
+    "Loads rows of pages into the database in chunks"
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.seen = set(page_key(category_id, url_hash) for category_id, url_hash in
+                        Page.objects.values_list('category_id', 'url_hash').iterator())
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.categories_created = 0
+        self.seconds = 0.0
+
+    def category_id(self, row):
+        name = row['category']
+        if name not in self.categories:
+            # Created one by one, since save() works out the slug
+            category = Category.objects.create(name=name,
+                                               likes=int(row.get('likes') or 0),
+                                               visits=int(row.get('visits') or 0))
+            self.categories[name] = category.id
+            self.categories_created += 1
+        return self.categories[name]
+
+    def _insert(self, pages):
+        # bulk_create sends no post_save, update the categories' stats here
+        totals = {}
+        for page in pages:
+            count, views = totals.get(page.category_id, (0, 0))
+            totals[page.category_id] = (count + 1, views + page.views)
+        added = timezone.now()
+        with transaction.atomic():
+            Page.objects.bulk_create(pages)
+            for category_id, (count, views) in totals.items():
+                category_stats.add(category_id, pages=count, views=views, added=added)
+        # Nor the purges of the cached pages and page list fragments
+        page_cache.purge('pages', *['category:{0}'.format(i) for i in totals])
+        self.inserted += len(pages)
+
+    def load(self, rows):
+        """Insert every new page in rows, returns self for its counters"""
+        start = time.time()
+        inserted = self.inserted
+        chunk = []
+        for row in rows:
+            self.read += 1
+            category_id = self.category_id(row)
+            url_hash = canonical.url_hash(row['url'])
+            key = page_key(category_id, url_hash)
+            if key in self.seen:
+                self.skipped += 1
+                continue
+            self.seen.add(key)
+            # bulk_create doesn't call save(), so set the url_hash here
+            chunk.append(Page(category_id=category_id,
+                              title=row['title'],
+                              url=row['url'],
+                              url_hash=url_hash,
+                              views=int(row.get('views') or 0)))
+            if len(chunk) >= self.chunk_size:
+                self._insert(chunk)
+                chunk = []
+        if chunk:
+            self._insert(chunk)
+
+        # bulk_create sends no post_save, so rank and index the new pages in
+        # one go, if this call added any
+        if self.inserted > inserted:
+            leaderboard.pages.reconcile()
+            leaderboard.categories.reconcile()
+            if local_search.is_available():
+                local_search.rebuild_index()
+
+        self.seconds += time.time() - start
+        return self
+
+    def rate(self):
+        """Rows read per second"""
+        if not self.seconds:
+            return 0.0
+        return self.read / self.seconds
@@ -0,0 +1,132 @@
+"""
+Full-text search over the pages already saved in Rango.
+
+The index is an SQLite FTS5 virtual table holding each Page's title and
+url plus its category's name, with the page id as rowid. It is created
+by syncdb, kept up to date by the Page and Category signals below and can
+be rebuilt from scratch with "manage.py rebuild_search_index". Results
+are ranked with BM25 and come back in the same title/link/summary shape
+as rango.bing_search.run_query, so the templates can show either.
+
+Without an index (another database, an SQLite built without FTS5, or a
+database synced before the table existed) saves leave the index alone
+and searches find nothing, until "manage.py rebuild_search_index".
+"""
+
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete, post_syncdb
+from django.dispatch import receiver
+
+from rango.models import Category, Page
+
+INDEX_TABLE = 'rango_page_fts'
+
+# Database name -> whether it has the index, so it's looked up once
+_available = {}
+
+
+def is_supported():
+    """Whether the database can hold the index: SQLite, with FTS5"""
+    if connection.vendor != 'sqlite':
+        return False
+    cursor = connection.cursor()
+    cursor.execute('PRAGMA compile_options')
+    return 'ENABLE_FTS5' in [option for option, in cursor.fetchall()]
+
+
+def is_available():
+    """Whether the index exists, saves and searches skip it otherwise"""
+    name = connection.settings_dict['NAME']
+    if name not in _available:
+        available = is_supported()
+        if available:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                           [INDEX_TABLE])
+            available = cursor.fetchone() is not None
+        _available[name] = available
+    return _available[name]
+
+
+def create_index():
+    """Create the FTS5 table if it isn't there yet"""
+    if not is_supported():
+        return
+    cursor = connection.cursor()
+    cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS {0} '
+                   'USING fts5(title, url, category)'.format(INDEX_TABLE))
+    _available[connection.settings_dict['NAME']] = True
+
+
+def rebuild_index():
+    """Re-index every page in one pass, returns the number of pages indexed"""
+    create_index()
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM {0}'.format(INDEX_TABLE))
+        cursor.execute('INSERT INTO {0} (rowid, title, url, category) '
+                       'SELECT p.id, p.title, p.url, c.name '
+                       'FROM {1} p JOIN {2} c ON p.category_id = c.id'.format(
+                           INDEX_TABLE, Page._meta.db_table, Category._meta.db_table))
+        cursor.execute('SELECT COUNT(*) FROM {0}'.format(INDEX_TABLE))
+        return cursor.fetchone()[0]
+
+
+def to_match_expression(query):
+    """Turn free text into an FTS5 query matching pages that contain every word"""
+    # Quoting each word keeps FTS5 operators and punctuation from the user
+    # out of the query syntax
+    return ' '.join('"{0}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+def search(query, max_results=10):
+    """Return the best matching pages as title/link/summary dicts"""
+    expression = to_match_expression(query)
+    if not expression or not is_available():
+        return []
+
+    cursor = connection.cursor()
+    cursor.execute('SELECT title, url, category FROM {0} WHERE {0} MATCH %s '
+                   'ORDER BY bm25({0}) LIMIT %s'.format(INDEX_TABLE),
+                   [expression, max_results])
+    return [{'title': title,
+             'link': url,
+             'summary': u'Saved in {0}'.format(category)}
+            for title, url, category in cursor.fetchall()]
+
+
+@receiver(post_syncdb)
+def index_created(sender, **kwargs):
+    # sender is the models module of the app that was just synced
+    if sender.__name__ == 'rango.models':
+        create_index()
+
+
+@receiver(post_save, sender=Page)
+def page_saved(sender, instance, **kwargs):
+    if not is_available():
+        return
+    cursor = connection.cursor()
+    cursor.execute('INSERT OR REPLACE INTO {0} (rowid, title, url, category) '
+                   'VALUES (%s, %s, %s, %s)'.format(INDEX_TABLE),
+                   [instance.id, instance.title, instance.url, instance.category.name])
+
+
+@receiver(post_delete, sender=Page)
+def page_deleted(sender, instance, **kwargs):
+    if not is_available():
+        return
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(INDEX_TABLE), [instance.id])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    # A renamed category changes the indexed text of all of its pages
+    if created or not is_available():
+        return
+    cursor = connection.cursor()
+    cursor.execute('UPDATE {0} SET category = %s WHERE rowid IN '
+                   '(SELECT id FROM {1} WHERE category_id = %s)'.format(
+                       INDEX_TABLE, Page._meta.db_table),
+                   [instance.name, instance.id])
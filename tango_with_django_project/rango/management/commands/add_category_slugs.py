@@ -0,0 +1,31 @@
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+
+from rango.models import Category
+
+
+class Command(NoArgsCommand):
+    help = ("Adds the Category.slug column to a database created before it "
+            "existed, and fills it in for every category.")
+
+    def handle_noargs(self, **options):
+        table = Category._meta.db_table
+        cursor = connection.cursor()
+        columns = [column[0] for column in
+                   connection.introspection.get_table_description(cursor, table)]
+
+        with transaction.atomic():
+            if 'slug' not in columns:
+                cursor.execute("ALTER TABLE {0} ADD COLUMN slug varchar(128) NOT NULL "
+                               "DEFAULT ''".format(connection.ops.quote_name(table)))
+
+            # Category.save() works out a unique slug from the name
+            count = 0
+            for category in Category.objects.order_by('id'):
+                category.save()
+                count += 1
+
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS rango_category_slug_uniq "
+                           "ON {0} (slug)".format(connection.ops.quote_name(table)))
+
+        self.stdout.write("Set the slug of {0} categories.".format(count))
@@ -0,0 +1,24 @@
+from django.core.management.base import NoArgsCommand
+from django.core.management.color import no_style
+from django.core.management.sql import sql_indexes
+from django.db import DatabaseError, connection, transaction
+from django.db.models import get_app
+
+
+class Command(NoArgsCommand):
+    help = ("Creates the indexes rango's models declare (db_index, index_together) "
+            "that are missing from a database created before they were added. "
+            "syncdb only creates indexes along with new tables.")
+
+    def handle_noargs(self, **options):
+        cursor = connection.cursor()
+        created = 0
+        for statement in sql_indexes(get_app('rango'), no_style(), connection):
+            try:
+                with transaction.atomic():
+                    cursor.execute(statement)
+                created += 1
+            except DatabaseError:
+                # The index is already there
+                pass
+        self.stdout.write("Created {0} missing indexes.".format(created))
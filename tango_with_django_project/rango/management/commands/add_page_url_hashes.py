@@ -0,0 +1,56 @@
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+from django.db.models import F
+
+from rango import canonical
+from rango import category_stats
+from rango.models import Page
+
+
+class Command(NoArgsCommand):
+    help = ("Adds the Page.url_hash column to a database created before it existed, "
+            "fills it in for every page, merges pages whose links turn out to be "
+            "the same within a category and makes (category, url_hash) unique.")
+
+    def handle_noargs(self, **options):
+        table = Page._meta.db_table
+        cursor = connection.cursor()
+        columns = [column[0] for column in
+                   connection.introspection.get_table_description(cursor, table)]
+
+        with transaction.atomic():
+            if 'url_hash' not in columns:
+                cursor.execute("ALTER TABLE {0} ADD COLUMN url_hash varchar(40) NOT NULL "
+                               "DEFAULT ''".format(connection.ops.quote_name(table)))
+
+            # The first page saved with a link keeps it, later copies are
+            # merged into it: their views are added and they are deleted
+            keep = {}
+            duplicates = []
+            updated = 0
+            rows = Page.objects.order_by('id').values_list('id', 'category_id', 'url',
+                                                           'url_hash')
+            for page_id, category_id, url, old_hash in rows.iterator():
+                url_hash = canonical.url_hash(url)
+                if (category_id, url_hash) in keep:
+                    duplicates.append((page_id, keep[(category_id, url_hash)]))
+                    continue
+                keep[(category_id, url_hash)] = page_id
+                if url_hash != old_hash:
+                    Page.objects.filter(id=page_id).update(url_hash=url_hash)
+                    updated += 1
+
+            for page_id, keep_id in duplicates:
+                page = Page.objects.get(id=page_id)
+                Page.objects.filter(id=keep_id).update(views=F('views') + page.views)
+                # delete() sends post_delete, which keeps the search index right
+                page.delete()
+                # The views moved to another page, so the total is unchanged
+                category_stats.refresh(page.category_id)
+
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS rango_page_url_hash_uniq "
+                           "ON {0} (category_id, url_hash)".format(
+                               connection.ops.quote_name(table)))
+
+        self.stdout.write("Set the url_hash of {0} pages and merged {1} duplicates.".format(
+            updated, len(duplicates)))
@@ -0,0 +1,30 @@
+from django.core.management.base import NoArgsCommand
+from django.db import connection, transaction
+
+from rango import profile_images
+from rango.models import UserProfile
+
+
+class Command(NoArgsCommand):
+    help = ("Adds the UserProfile.avatar and thumbnail columns to a database created "
+            "before they existed, moves the existing pictures where /media/ doesn't "
+            "serve them, then makes the variants of every existing picture.")
+
+    def handle_noargs(self, **options):
+        table = UserProfile._meta.db_table
+        cursor = connection.cursor()
+        columns = [column[0] for column in
+                   connection.introspection.get_table_description(cursor, table)]
+
+        with transaction.atomic():
+            for field in ('avatar', 'thumbnail'):
+                if field not in columns:
+                    cursor.execute("ALTER TABLE {0} ADD COLUMN {1} varchar(100) NOT NULL "
+                                   "DEFAULT ''".format(connection.ops.quote_name(table),
+                                                       connection.ops.quote_name(field)))
+
+        count = profile_images.hide_originals()
+        self.stdout.write("Moved {0} profile pictures to {1}.".format(
+            count, profile_images.staging_dir()))
+        count = profile_images.process_pending()
+        self.stdout.write("Processed {0} profile pictures.".format(count))
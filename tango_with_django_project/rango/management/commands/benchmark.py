@@ -0,0 +1,68 @@
+import os
+import tempfile
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from rango import benchmark
+from rango.models import Category
+
+
+class Command(BaseCommand):
+    help = ("Loads a synthetic dataset into a throwaway test database, requests "
+            "every rango URL and reports query counts and timings per route. "
+            "Fails when a route runs more queries than rango/query_budget.json allows, "
+            "or when a URL in rango/urls.py has no route or budget.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--categories', type='int', default=20,
+                    help='Number of categories to create (default 20).'),
+        make_option('--pages', type='int', default=50,
+                    help='Number of pages per category (default 50).'),
+        make_option('--users', type='int', default=10,
+                    help='Number of users to create (default 10).'),
+        make_option('--iterations', type='int', default=20,
+                    help='Measured requests per route (default 20).'),
+        make_option('--output', default='benchmark_report.json',
+                    help='Where to write the JSON report.'),
+        make_option('--budget', default=benchmark.BUDGET_PATH,
+                    help='Query budget to check the report against.'),
+    )
+
+    def handle(self, **options):
+        setup_test_environment()
+        # Background flushes run in their own threads, which can't see an
+        # in-memory SQLite database, so use a temporary file instead
+        if connection.vendor == 'sqlite':
+            handle, path = tempfile.mkstemp(suffix='.db')
+            os.close(handle)
+            connection.settings_dict['TEST_NAME'] = path
+        budget = benchmark.load_budget(options['budget'])
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = benchmark.load_dataset(options['categories'], options['pages'],
+                                          options['users'])
+            category = Category.objects.order_by('-likes')[0]
+            failures = benchmark.check_routes(category, category.page_set.all()[0], budget)
+            if failures:
+                raise CommandError("Routes out of date:\n" + "\n".join(failures))
+            report = benchmark.run_benchmark(user, options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        benchmark.write_report(report, options['output'])
+
+        self.stdout.write("{0:<20} {1:>7} {2:>10} {3:>10} {4:>10}".format(
+            'route', 'queries', 'p50 ms', 'p95 ms', 'render ms'))
+        for name, result in sorted(report.items()):
+            self.stdout.write("{0:<20} {1:>7} {2:>10} {3:>10} {4:>10}".format(
+                name, result['queries'], result['p50_ms'], result['p95_ms'],
+                result['render_ms']))
+        self.stdout.write("Report written to {0}".format(options['output']))
+
+        failures = benchmark.check_budget(report, budget)
+        if failures:
+            raise CommandError("Over the query budget:\n" + "\n".join(failures))
@@ -0,0 +1,36 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from rango import link_checker
+
+
+class Command(BaseCommand):
+    help = ("Checks the link of every page not checked in the last --max-age seconds "
+            "and records its status, final url and latency. Safe to interrupt: run it "
+            "again and it carries on with the pages it didn't get to.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', type='int',
+                    help='Links checked at once (default RANGO_LINK_CHECK_WORKERS).'),
+        make_option('--per-host', type='int', dest='per_host',
+                    help='Requests to one host at once (default RANGO_LINK_CHECK_PER_HOST).'),
+        make_option('--timeout', type='float',
+                    help='Seconds to wait on a request (default RANGO_LINK_CHECK_TIMEOUT).'),
+        make_option('--batch-size', type='int', default=500, dest='batch_size',
+                    help='Results saved per transaction (default 500).'),
+        make_option('--max-age', type='int', dest='max_age',
+                    help='Recheck pages checked longer than this many seconds ago '
+                         '(default RANGO_LINK_CHECK_MAX_AGE, 0 rechecks every page).'),
+    )
+
+    def handle(self, *args, **options):
+        checker = link_checker.LinkChecker(workers=options['workers'],
+                                           per_host=options['per_host'],
+                                           timeout=options['timeout'],
+                                           batch_size=options['batch_size'],
+                                           max_age=options['max_age'])
+        checker.run()
+        self.stdout.write(
+            "Checked {0} links, {1} broken, in {2:.2f}s ({3:.0f} links/s).".format(
+                checker.checked, checker.broken, checker.seconds, checker.rate()))
@@ -0,0 +1,31 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from rango import profiler
+
+
+class Command(BaseCommand):
+    args = '[directory]'
+    help = ("Adds up the request profiles in the directory (default RANGO_PROFILE_DIR) "
+            "into collapsed stacks, one \"view;frame;frame microseconds\" line each, "
+            "ready for flamegraph.pl or speedscope.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--view',
+                    help='Only the profiles of this URL name.'),
+        make_option('--output', '-o',
+                    help='Write the stacks to this file instead of stdout.'),
+    )
+
+    def handle(self, *args, **options):
+        directory = args[0] if args else None
+        stacks = profiler.collapse(profiler.load_dumps(directory), view=options['view'])
+        lines = ['{0} {1}'.format(stack, micros) for stack, micros in sorted(stacks.items())]
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(''.join(line + '\n' for line in lines))
+            self.stderr.write("Wrote {0} stacks to {1}.".format(len(lines), options['output']))
+        else:
+            for line in lines:
+                self.stdout.write(line)
@@ -0,0 +1,59 @@
+import itertools
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rango import loader
+
+
+class Command(BaseCommand):
+    args = '<file file ...>'
+    help = ("Loads categories and pages from JSON lines or CSV files (use - for "
+            "stdin), or generates synthetic ones with --synthetic. Each row needs "
+            "a category, title and url; views, likes and visits are optional.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', choices=['jsonl', 'csv'],
+                    help='Input format, guessed from the file extension by default.'),
+        make_option('--chunk-size', type='int', default=1000, dest='chunk_size',
+                    help='Pages inserted per transaction (default 1000).'),
+        make_option('--synthetic', type='int', default=0,
+                    help='Generate this many synthetic pages instead of reading files.'),
+        make_option('--synthetic-categories', type='int', default=100,
+                    dest='synthetic_categories',
+                    help='Spread synthetic pages over this many categories (default 100).'),
+    )
+
+    def handle(self, *paths, **options):
+        if not paths and not options['synthetic']:
+            raise CommandError("Give at least one file to load, or --synthetic.")
+
+        def read_files():
+            for path in paths:
+                format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+                read = loader.read_csv if format == 'csv' else loader.read_jsonl
+                if path == '-':
+                    for row in read(sys.stdin):
+                        yield row
+                else:
+                    with open(path, 'rb') as stream:
+                        for row in read(stream):
+                            yield row
+
+        rows = read_files()
+        if options['synthetic']:
+            rows = itertools.chain(loader.synthetic_rows(options['synthetic'],
+                                                         options['synthetic_categories']),
+                                   rows)
+
+        # A single load, so the leaderboards and search index are only
+        # rebuilt once however many files there are
+        pages = loader.PageLoader(chunk_size=options['chunk_size'])
+        pages.load(rows)
+
+        self.stdout.write(
+            "Read {0} rows: {1} pages added, {2} already there, {3} new categories "
+            "in {4:.2f}s ({5:.0f} rows/s).".format(
+                pages.read, pages.inserted, pages.skipped, pages.categories_created,
+                pages.seconds, pages.rate()))
@@ -0,0 +1,13 @@
+from django.core.management.base import NoArgsCommand
+
+from rango import profile_images
+
+
+class Command(NoArgsCommand):
+    help = ("Makes the avatar and thumbnail of every profile picture that has none "
+            "yet. Run it from cron if RANGO_PROFILE_IMAGES_IN_BACKGROUND is False, "
+            "or after a restart lost the background thread's queue.")
+
+    def handle_noargs(self, **options):
+        count = profile_images.process_pending()
+        self.stdout.write("Processed {0} profile pictures.".format(count))
@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+
+from rango import profiler
+
+
+class Command(NoArgsCommand):
+    help = ("Prints a token for the X-Rango-Profile header, which has the request "
+            "carrying it profiled for RANGO_PROFILE_TOKEN_AGE seconds.")
+
+    def handle_noargs(self, **options):
+        self.stdout.write(profiler.make_token())
@@ -0,0 +1,13 @@
+from django.core.management.base import NoArgsCommand, CommandError
+
+from rango import local_search
+
+
+class Command(NoArgsCommand):
+    help = "Rebuilds the full-text index used to search Rango's own pages."
+
+    def handle_noargs(self, **options):
+        if not local_search.is_supported():
+            raise CommandError("The local search index needs an SQLite database with FTS5.")
+        count = local_search.rebuild_index()
+        self.stdout.write("Indexed {0} pages.".format(count))
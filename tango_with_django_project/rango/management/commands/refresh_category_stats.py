@@ -0,0 +1,12 @@
+from django.core.management.base import NoArgsCommand
+
+from rango import category_stats
+
+
+class Command(NoArgsCommand):
+    help = ("Recomputes the page count and total views of every category from its "
+            "pages, creating any missing CategoryStats rows.")
+
+    def handle_noargs(self, **options):
+        count = category_stats.refresh_all()
+        self.stdout.write("Refreshed the stats of {0} categories.".format(count))
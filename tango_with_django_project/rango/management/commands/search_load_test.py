@@ -0,0 +1,77 @@
+import os
+import tempfile
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from rango import benchmark
+from rango import load_test
+
+
+class Command(BaseCommand):
+    help = ("Fires concurrent web searches backed by a slow stub search API at the "
+            "threaded server with no limit on searches in flight, at the gevent server "
+            "(if gevent is installed), and at the threaded server shedding searches "
+            "over --max-in-flight, and reports how long other pages waited meanwhile.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--searches', type='int', default=50,
+                    help='Concurrent searches to send (default 50).'),
+        make_option('--workers', type='int', default=8,
+                    help='Worker threads serving the site (default 8).'),
+        make_option('--latency', type='float', default=0.5,
+                    help='Seconds the stub search API takes to answer (default 0.5).'),
+        make_option('--max-in-flight', type='int', dest='max_in_flight',
+                    help='Limit for the threaded run that sheds searches '
+                         '(default RANGO_BING_MAX_IN_FLIGHT).'),
+        make_option('--gevent-max-in-flight', type='int', dest='gevent_max_in_flight',
+                    help='Limit for the gevent run (default RANGO_BING_GEVENT_MAX_IN_FLIGHT).'),
+    )
+
+    def handle(self, **options):
+        max_in_flight = options['max_in_flight']
+        if max_in_flight is None:
+            max_in_flight = getattr(settings, 'RANGO_BING_MAX_IN_FLIGHT', 8)
+        gevent_max_in_flight = options['gevent_max_in_flight']
+        if gevent_max_in_flight is None:
+            gevent_max_in_flight = getattr(settings, 'RANGO_BING_GEVENT_MAX_IN_FLIGHT', 500)
+
+        # Blocking workers as they are, the same load under gevent, and
+        # shedding, the fallback for an overload gevent can't absorb
+        runs = [('threads', 0)]
+        try:
+            import gevent
+            runs.append(('gevent', gevent_max_in_flight))
+        except ImportError:
+            self.stdout.write("gevent isn't installed, skipping the gevent server.")
+        runs.append(('threads', max_in_flight))
+
+        setup_test_environment()
+        # The server's worker threads can't see an in-memory SQLite database
+        if connection.vendor == 'sqlite':
+            handle, path = tempfile.mkstemp(suffix='.db')
+            os.close(handle)
+            connection.settings_dict['TEST_NAME'] = path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            benchmark.load_dataset(categories=5, pages=5, users=1)
+            reports = [load_test.run_load_test(options['searches'], options['workers'],
+                                               options['latency'], limit, server)
+                       for server, limit in runs]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write("{0:<8} {1:<14} {2:>8} {3:>8} {4:>8} {5:>8} {6:>12} {7:>12}".format(
+            'server', 'max in flight', 'seconds', 'answered', 'shed', 'peak', 'about p50 ms',
+            'about p95 ms'))
+        for report in reports:
+            self.stdout.write(
+                "{0:<8} {1:<14} {2:>8} {3:>8} {4:>8} {5:>8} {6:>12} {7:>12}".format(
+                    report['server'], report['max_in_flight'] or 'no limit', report['seconds'],
+                    report['searches_answered'], report['searches_shed'],
+                    report['peak_in_flight'], report['probe_p50_ms'],
+                    report['probe_p95_ms']))
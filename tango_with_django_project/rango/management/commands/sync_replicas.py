@@ -0,0 +1,24 @@
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from rango import routers
+
+
+class Command(NoArgsCommand):
+    help = ("Copies the primary SQLite database over every read replica in "
+            "RANGO_READ_REPLICAS, standing in for replication when trying replicas "
+            "out locally.")
+
+    def handle_noargs(self, **options):
+        replicas = routers.read_replicas()
+        if not replicas:
+            raise CommandError("RANGO_READ_REPLICAS names no replicas.")
+        for alias in [DEFAULT_DB_ALIAS] + replicas:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError("sync_replicas only copies SQLite databases, "
+                                   "{0} is not one.".format(alias))
+
+        source = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        for alias in replicas:
+            routers.copy_sqlite(source, connections[alias].settings_dict['NAME'])
+            self.stdout.write("Copied {0} to {1}.".format(DEFAULT_DB_ALIAS, alias))
@@ -0,0 +1,271 @@
+"""
+Per-view request metrics, exposed in the Prometheus text format.
+
+MetricsMiddleware times every request and files it under the URL name it
+resolved to in rango/urls.py (anything else, the admin say, under
+'other'): the request count, a latency histogram, the number of SQL
+queries and the time they took, the time spent rendering templates and
+the time spent in web searches (see timer()).
+
+Queries are counted by a thin wrapper put around the cursors of the
+request's connections, not from the query log DEBUG keeps. Templates are
+timed when TEMPLATE_LOADERS goes through TimingLoader below.
+
+Each process adds its numbers up in memory and writes them out to the
+cache framework at most every RANGO_METRICS_FLUSH_INTERVAL seconds, one
+cache.incr() per changed counter, so the cache is the store shared by
+all worker processes. With the LocMemCache in settings.py every process
+has a cache, and so totals, of its own: /rango/metrics/ then only shows
+the process that answered it. Point CACHES at memcached (or another
+shared backend) to get the totals of the whole site. Times are kept as
+whole microseconds since incr() only adds integers. /rango/metrics/
+renders the totals for a scraper.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template_from_string
+from django.template.loaders import cached
+
+KEY = 'rango:metrics:{0}:{1}'
+OTHER = 'other'
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Counters kept per view: (name, help, is a time in microseconds)
+COUNTERS = (
+    ('requests_total', 'Requests handled.', False),
+    ('request_duration_seconds_sum', 'Total time spent handling requests.', True),
+    ('sql_queries_total', 'SQL queries run.', False),
+    ('sql_duration_seconds_total', 'Time spent running SQL queries.', True),
+    ('template_render_seconds_total', 'Time spent rendering templates.', True),
+    ('search_calls_total', 'Web searches made.', False),
+    ('search_duration_seconds_total', 'Time spent in web searches.', True),
+)
+
+_state = threading.local()
+_view_names = None
+
+
+def flush_interval():
+    return getattr(settings, 'RANGO_METRICS_FLUSH_INTERVAL', 5)
+
+
+def _micros(seconds):
+    return int(round(seconds * 1000000))
+
+
+def view_names():
+    """The URL names in rango/urls.py, plus 'other'"""
+    global _view_names
+    if _view_names is None:
+        # Imported here, rango.urls imports the views which use this module
+        from rango import urls
+        names = set(pattern.name for pattern in urls.urlpatterns if pattern.name)
+        _view_names = sorted(names) + [OTHER]
+    return _view_names
+
+
+def _key(view, counter):
+    # Cache keys can't hold the spaces some URL names have
+    return KEY.format(re.sub(r'\W', '_', view), counter)
+
+
+class Recorder(object):
+    "Adds counters up in memory and writes them to the cache now and then"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.time()
+
+    def add(self, view, counters):
+        with self._lock:
+            for counter, value in counters.items():
+                if value:
+                    key = _key(view, counter)
+                    self._pending[key] = self._pending.get(key, 0) + value
+            due = time.time() - self._last_flush >= flush_interval()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        for key, value in pending.items():
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                # First time anyone counts this, add() keeps a racing value
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+
+recorder = Recorder()
+
+
+class TimedTemplate(object):
+    "A template whose rendering counts towards the request's template time"
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, attr):
+        return getattr(self.template, attr)
+
+    def render(self, context):
+        if not getattr(_state, 'active', False) or _state.render_depth:
+            return self.template.render(context)
+        # Only the outermost template is timed, the ones it includes are in it
+        _state.render_depth += 1
+        start = time.time()
+        try:
+            return self.template.render(context)
+        finally:
+            _state.render_depth -= 1
+            _state.counters['template_render_seconds_total'] += _micros(time.time() - start)
+
+
+class TimingLoader(cached.Loader):
+    """
+    Template loader wrapping others, like the cached loader does, to hand
+    out TimedTemplates. Nothing is cached, wrap the cached loader for that.
+    """
+
+    def load_template(self, template_name, template_dirs=None):
+        template, origin = self.find_template(template_name, template_dirs)
+        if not hasattr(template, 'render'):
+            try:
+                template = get_template_from_string(template, origin, template_name)
+            except TemplateDoesNotExist:
+                return template, origin
+        return TimedTemplate(template), None
+
+
+class CountingCursor(object):
+    "Counts and times the queries run through the cursor it wraps"
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def _timed(self, method, *args):
+        start = time.time()
+        try:
+            return method(*args)
+        finally:
+            if getattr(_state, 'active', False):
+                _state.counters['sql_queries_total'] += 1
+                _state.counters['sql_duration_seconds_total'] += _micros(time.time() - start)
+
+    def execute(self, sql, params=None):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list)
+
+    def callproc(self, procname, params=None):
+        return self._timed(self.cursor.callproc, procname, params)
+
+
+def _counting(make_cursor):
+    def cursor():
+        return CountingCursor(make_cursor())
+    return cursor
+
+
+@contextmanager
+def timer(what):
+    """Time a block as part of the current request, e.g. timer('search')"""
+    start = time.time()
+    try:
+        yield
+    finally:
+        if getattr(_state, 'active', False):
+            _state.counters[what + '_calls_total'] += 1
+            _state.counters[what + '_duration_seconds_total'] += _micros(time.time() - start)
+
+
+def start_request():
+    _state.active = True
+    _state.render_depth = 0
+    _state.counters = dict((name, 0) for name, help, is_time in COUNTERS)
+    _state.start = time.time()
+    # Only this connection object's cursor() is replaced, for this request
+    for db in connections.all():
+        if 'cursor' not in db.__dict__:
+            db.cursor = _counting(db.cursor)
+
+
+def finish_request(view):
+    if not getattr(_state, 'active', False):
+        return
+    _state.active = False
+    counters = _state.counters
+    elapsed = time.time() - _state.start
+    counters['requests_total'] = 1
+    counters['request_duration_seconds_sum'] = _micros(elapsed)
+    for db in connections.all():
+        db.__dict__.pop('cursor', None)
+    # Every bucket the request fits in counts it, so buckets are cumulative
+    for bound in BUCKETS:
+        if elapsed <= bound:
+            counters['request_duration_seconds_bucket_{0}'.format(bound)] = 1
+    recorder.add(view if view in view_names() else OTHER, counters)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render():
+    """Every view's totals in the Prometheus text exposition format"""
+    recorder.flush()
+    views = view_names()
+    names = [name for name, help, is_time in COUNTERS]
+    names += ['request_duration_seconds_bucket_{0}'.format(bound) for bound in BUCKETS]
+    values = cache.get_many([_key(view, name) for view in views for name in names])
+
+    def value(view, name):
+        return values.get(_key(view, name), 0)
+
+    lines = []
+    for name, help, is_time in COUNTERS:
+        if name == 'request_duration_seconds_sum':
+            continue
+        lines.append('# HELP rango_{0} {1}'.format(name, help))
+        lines.append('# TYPE rango_{0} counter'.format(name))
+        for view in views:
+            total = value(view, name)
+            lines.append('rango_{0}{{view="{1}"}} {2}'.format(
+                name, _escape(view), total / 1000000.0 if is_time else total))
+
+    lines.append('# HELP rango_request_duration_seconds Time spent handling requests.')
+    lines.append('# TYPE rango_request_duration_seconds histogram')
+    for view in views:
+        label = _escape(view)
+        for bound in BUCKETS:
+            count = value(view, 'request_duration_seconds_bucket_{0}'.format(bound))
+            lines.append('rango_request_duration_seconds_bucket{{view="{0}",le="{1}"}} {2}'
+                         .format(label, bound, count))
+        total = value(view, 'requests_total')
+        lines.append('rango_request_duration_seconds_bucket{{view="{0}",le="+Inf"}} {1}'
+                     .format(label, total))
+        lines.append('rango_request_duration_seconds_sum{{view="{0}"}} {1}'.format(
+            label, value(view, 'request_duration_seconds_sum') / 1000000.0))
+        lines.append('rango_request_duration_seconds_count{{view="{0}"}} {1}'.format(
+            label, total))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,129 @@
+"""
+Middleware for rango.
+
+ReplicaStickinessMiddleware keeps visitors who just wrote something on
+the primary database, see rango/routers.py.
+
+MetricsMiddleware records per-view request metrics, see rango/metrics.py.
+
+ProfilerMiddleware profiles the requests asking for it, and a sample of
+the others, see rango/profiler.py.
+
+VisitMiddleware counts a visitor's visits in a signed cookie instead of
+the session, so that counting a visit never forces a session save (and,
+with the cached_db engine, an UPDATE of django_session). The cookie holds
+"<visits>:<unix timestamp of the last visit>" and is only written when a
+new visit starts, i.e. when more than RANGO_VISIT_WINDOW seconds have
+passed since the last one.
+"""
+
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from rango import metrics
+from rango import profiler
+from rango import routers
+
+VISIT_COOKIE = 'rango_visits'
+VISIT_SALT = 'rango.visits'
+PRIMARY_COOKIE = 'rango_primary'
+
+
+def visit_window():
+    return getattr(settings, 'RANGO_VISIT_WINDOW', 10)
+
+
+class VisitMiddleware(object):
+    """
+    Sets req.visits (visits counted before this one) and req.last_visit
+    (when the last one started) on every request.
+    """
+
+    def process_request(self, req):
+        now = int(time.time())
+        visits, last_visit = 0, now
+
+        value = req.get_signed_cookie(VISIT_COOKIE, default=None, salt=VISIT_SALT)
+        if value:
+            try:
+                visits, last_visit = [int(part) for part in value.split(':')]
+            except ValueError:
+                visits, last_visit = 0, now
+
+        req.visits = visits
+        req.last_visit = datetime.fromtimestamp(last_visit, timezone.utc)
+
+        # AJAX calls made by a page are part of that page's visit
+        if value is None or (not req.is_ajax() and now - last_visit > visit_window()):
+            req._visit_cookie = '{0}:{1}'.format(visits + 1, now)
+
+    def process_response(self, req, response):
+        value = getattr(req, '_visit_cookie', None)
+        if value:
+            response.set_signed_cookie(VISIT_COOKIE, value, salt=VISIT_SALT,
+                                       max_age=getattr(settings, 'RANGO_VISIT_COOKIE_AGE',
+                                                       60 * 60 * 24 * 365),
+                                       httponly=True)
+        return response
+
+
+class ReplicaStickinessMiddleware(object):
+    """
+    Pins requests to the primary database when they may write, or when the
+    visitor wrote less than RANGO_REPLICA_STICKY_SECONDS ago. List it
+    before SessionMiddleware, so that session saves count as writes.
+    """
+
+    def process_request(self, req):
+        if not routers.read_replicas():
+            return
+        routers.start_tracking()
+        routers.pin_to_primary(req.method not in ('GET', 'HEAD') or
+                               PRIMARY_COOKIE in req.COOKIES)
+
+    def process_response(self, req, response):
+        if not routers.read_replicas():
+            return response
+        if routers.has_written():
+            # The cookie expires when the replicas should have caught up
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=routers.sticky_seconds(),
+                                httponly=True)
+        # Threads serve other visitors next
+        routers.pin_to_primary(False)
+        return response
+
+
+class MetricsMiddleware(object):
+    """
+    Times each request and files it under its URL name. List it first, so
+    that the other middleware's work is part of the time.
+    """
+
+    def process_request(self, req):
+        metrics.start_request()
+
+    def process_response(self, req, response):
+        match = getattr(req, 'resolver_match', None)
+        metrics.finish_request(match.url_name if match else None)
+        return response
+
+
+class ProfilerMiddleware(object):
+    """
+    Profiles a request when profiler.wanted() says so and writes the dump
+    when it's done. List it first, so that it sees all the other middleware.
+    """
+
+    def process_request(self, req):
+        if profiler.wanted(req):
+            req._profile = profiler.Profile()
+
+    def process_response(self, req, response):
+        profile = getattr(req, '_profile', None)
+        if profile:
+            match = getattr(req, 'resolver_match', None)
+            profile.save(req, match.url_name if match else None, response.status_code)
+        return response
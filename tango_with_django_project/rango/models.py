@@ -1,11 +1,31 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.template.defaultfilters import slugify
+
+from rango import canonical
 
 # Create your models here.
 class Category(models.Model):
     name = models.CharField(max_length=128, unique=True)
     visits = models.IntegerField(default=0)
-    likes = models.IntegerField(default=0)
+    # Indexed for the sidebar, which lists categories by likes
+    likes = models.IntegerField(default=0, db_index=True)
+    # What category URLs are made of, e.g. /rango/category/other-frameworks/
+    # Filled in from the name when the category is first saved, and kept
+    # when it is renamed so that links to the category don't break.
+    slug = models.SlugField(max_length=128, unique=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            base = slugify(self.name) or 'category'
+            slug = base
+            n = 1
+            # Different names can slugify alike ('C++' and 'C'), keep slugs unique
+            while Category.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+                n += 1
+                slug = '{0}-{1}'.format(base, n)
+            self.slug = slug
+        super(Category, self).save(*args, **kwargs)
 
     # For prettified representation of a model instance
     # i.e. >> print Category will return <Category: Category object>
@@ -20,11 +40,77 @@ class Page(models.Model):
     category = models.ForeignKey(Category)
     title = models.CharField(max_length=128)
     url = models.URLField()
-    views = models.IntegerField(default=0)
+    # Indexed for the most viewed pages on the index page
+    views = models.IntegerField(default=0, db_index=True)
+    # Hash of the canonical url, the same for near-duplicate links
+    # (see rango/canonical.py). Filled in from the url on every save.
+    url_hash = models.CharField(max_length=40, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.url_hash = canonical.url_hash(self.url)
+        # Saving a page updates its category's CategoryStats from post_save
+        # (see rango/category_stats.py), do both in one transaction
+        with transaction.atomic(savepoint=False):
+            super(Page, self).save(*args, **kwargs)
 
     def __unicode__(self):
         return self.title
 
+    class Meta:
+        # Category pages are listed by (views, id), see rango/paging.py
+        index_together = [['category', 'views', 'id']]
+        # A link is saved once per category
+        unique_together = ('category', 'url_hash')
+
+class CategoryLikeShard(models.Model):
+    # A category's likes are spread over several shard rows so that
+    # concurrent likes don't all queue up on the same row.
+    # Category.likes holds their (periodically refreshed) total,
+    # see rango/like_counter.py
+    category = models.ForeignKey(Category)
+    shard = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return u'{0} #{1}'.format(self.category, self.shard)
+
+    class Meta:
+        unique_together = ('category', 'shard')
+
+class CategoryStats(models.Model):
+    # Denormalized figures about a category's pages, so that they can be
+    # listed along with the categories without counting the pages.
+    # Kept up to date by rango/category_stats.py
+    category = models.OneToOneField(Category, primary_key=True, related_name='stats')
+    page_count = models.IntegerField(default=0)
+    total_views = models.IntegerField(default=0)
+    last_page_added = models.DateTimeField(null=True, blank=True)
+
+    def __unicode__(self):
+        return u'{0} stats'.format(self.category)
+
+    class Meta:
+        verbose_name_plural = "Category stats"
+
+class PageHealth(models.Model):
+    # The outcome of the last link check of a page, written in batches by
+    # "manage.py check_links" (see rango/link_checker.py)
+    page = models.OneToOneField(Page, primary_key=True, related_name='health')
+    # None when no response came back at all (see error)
+    status = models.IntegerField(null=True, blank=True)
+    # Where the link ended up after following redirects
+    final_url = models.URLField(max_length=1024, blank=True)
+    # Seconds the whole check took
+    latency = models.FloatField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    checked = models.DateTimeField(db_index=True)
+
+    def is_broken(self):
+        return self.status is None or self.status >= 400
+
+    def __unicode__(self):
+        return u'{0}: {1}'.format(self.page, self.status or self.error)
+
 class UserProfile(models.Model):
     # This line is required. Links UserProfile to a User model instance
     user = models.OneToOneField(User)
@@ -32,8 +118,24 @@ class UserProfile(models.Model):
     # The additional attributes we wish to include, apart from the default
     # provided (username, password, email, firstname, surname)
     website = models.URLField(blank=True)
-    picture = models.ImageField(upload_to='profile_images', blank=True)
+    # The picture as uploaded, only kept to make the variants below from
+    picture = models.ImageField(upload_to='profile_images/staging', blank=True)
+    # Small JPEG variants of the picture, made in the background by
+    # rango/profile_images.py. Empty until then.
+    avatar = models.ImageField(upload_to='profile_images/avatars', blank=True, editable=False)
+    thumbnail = models.ImageField(upload_to='profile_images/thumbnails', blank=True,
+                                  editable=False)
 
     # Override the __unicode__() method to return out something meaningful!
     def __unicode__(self):
         return self.user.username
+
+# Register the signal handlers that keep the cached category sidebar,
+# the local search index, the suggestion index, the page cache, the
+# category stats and the leaderboards fresh
+import rango.category_cache
+import rango.local_search
+import rango.suggest_index
+import rango.page_cache
+import rango.category_stats
+import rango.leaderboard
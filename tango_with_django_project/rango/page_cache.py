@@ -0,0 +1,159 @@
+"""
+Full-page cache for anonymous GET requests, invalidated by tags.
+
+Views wrapped in cache_anonymous_page() are rendered once per path and
+served straight from the cache to anonymous visitors afterwards, without
+touching the ORM or the template engine. Each entry records the tags it
+depends on (e.g. 'categories' or 'category:3') together with the
+version each tag had when the page was rendered; purge() bumps a tag's
+version, which makes every page depending on it stale at once.
+
+Two things on these pages differ per visitor and are patched into the
+cached HTML on every request: the CSRF token of the search forms, and
+any value the view passes through hole() (such as the visit counter,
+which is computed by the decorator's per_request function on a hit).
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template import Context
+from django.template.base import render_value_in_context
+
+from rango import routers
+from rango.models import Category, Page
+
+PAGE_KEY = 'rango:page:{0}'
+TAG_KEY = 'rango:page_tag:{0}'
+HOLE = '@@rango-hole:{0}@@'
+
+
+def page_timeout():
+    return getattr(settings, 'RANGO_PAGE_CACHE_TIMEOUT', 60 * 5)
+
+
+def _new_version():
+    # Microseconds, so a tag whose version was evicted starts again above
+    # every version a cached page can still hold, never back at a used one
+    return int(time.time() * 1000000)
+
+
+def _tag_versions(tags):
+    keys = dict((TAG_KEY.format(tag), tag) for tag in tags)
+    found = cache.get_many(keys.keys())
+    versions = {}
+    for key, tag in keys.items():
+        if key not in found:
+            # add() keeps a version another process set in the meantime
+            version = _new_version()
+            cache.add(key, version, None)
+            found[key] = cache.get(key, version)
+        versions[tag] = found[key]
+    return versions
+
+
+def tag_version(tag):
+    """The current version of a tag"""
+    return _tag_versions([tag])[tag]
+
+
+def purge(*tags):
+    """Make every cached page depending on one of the tags stale"""
+    for tag in tags:
+        key = TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Missing or evicted, pages may still hold any older version
+            cache.set(key, _new_version(), None)
+
+
+def hole(req, name, value):
+    """
+    Use in a cached view for a context value that differs per visitor.
+    The value is left out of the cached page and filled in per request.
+    """
+    holes = getattr(req, '_page_cache_holes', None)
+    if holes is None:
+        return value
+    holes[name] = value
+    return HOLE.format(name)
+
+
+def _fill(content, req, values):
+    # Put the per-visitor values back into the cached HTML
+    context = Context()
+    for name, value in values.items():
+        content = content.replace(HOLE.format(name),
+                                  render_value_in_context(value, context).encode('utf-8'))
+    if HOLE.format('csrf') in content:
+        # get_token() also makes sure the visitor gets the CSRF cookie
+        # The token is ASCII, keep the content a byte string
+        content = content.replace(HOLE.format('csrf'), str(get_token(req) or ''))
+    return content
+
+
+def cache_anonymous_page(tags, per_request=None):
+    """
+    Decorator caching a view's page for anonymous GET requests.
+    tags(req, *args, **kwargs) returns the tags the page depends on and
+    per_request(req) returns the values the view passed through hole().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(req, *args, **kwargs):
+            if req.method != 'GET' or req.user.is_authenticated():
+                return view(req, *args, **kwargs)
+
+            key = PAGE_KEY.format(hashlib.md5(req.get_full_path()).hexdigest())
+            entry = cache.get(key)
+            if entry is not None and _tag_versions(entry['tags']) == entry['tags']:
+                values = per_request(req) if per_request else {}
+                response = HttpResponse(_fill(entry['content'], req, values),
+                                        content_type=entry['content_type'])
+                response['X-Rango-Cache'] = 'hit'
+                return response
+
+            # Read the tag versions before rendering, so that a change made
+            # while we render leaves this entry stale rather than wrong
+            versions = _tag_versions(tags(req, *args, **kwargs))
+            req._page_cache_holes = {}
+            # A page rendered from a lagging replica would stay cached
+            with routers.primary():
+                response = view(req, *args, **kwargs)
+            values, req._page_cache_holes = req._page_cache_holes, None
+
+            if not response.streaming:
+                content = response.content
+                if response.status_code == 200:
+                    token = req.META.get('CSRF_COOKIE')
+                    if token:
+                        content = content.replace(str(token), HOLE.format('csrf'))
+                    cache.set(key, {'content': content,
+                                    'content_type': response['Content-Type'],
+                                    'tags': versions}, page_timeout())
+                response.content = _fill(content, req, values)
+            response['X-Rango-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Every page shows the category sidebar
+    purge('categories', 'category:{0}'.format(instance.id))
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def page_changed(sender, instance, **kwargs):
+    purge('pages', 'category:{0}'.format(instance.category_id))
@@ -0,0 +1,59 @@
+"""
+Keyset ("cursor") pagination for a category's pages.
+
+Pages are listed most viewed first, ordered on (views, id) so that every
+page has a unique position. Instead of an OFFSET, each slice remembers
+the (views, id) of its last page as a cursor like "42-1337", and the next
+slice starts right after it. With the (category, views, id) index on
+Page every slice is a short index range scan, however big the category.
+"""
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def per_page():
+    return getattr(settings, 'RANGO_PAGES_PER_LOAD', 20)
+
+
+def parse_cursor(cursor):
+    """Turn "views-id" into a (views, id) tuple, or None"""
+    try:
+        views, page_id = cursor.split('-')
+        return int(views), int(page_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+class KeysetPage(object):
+    """
+    One slice of a Page queryset. Nothing is queried until the template
+    asks for pages or next_cursor, so a cached fragment costs nothing.
+    """
+
+    def __init__(self, queryset, after=None, size=None):
+        self.queryset = queryset
+        self.after = parse_cursor(after)
+        self.size = size or per_page()
+
+    @cached_property
+    def _items(self):
+        queryset = self.queryset.order_by('-views', '-id')
+        if self.after:
+            views, page_id = self.after
+            queryset = queryset.filter(Q(views__lt=views) |
+                                       Q(views=views, id__lt=page_id))
+        # One extra row tells us whether there is a next slice
+        return list(queryset[:self.size + 1])
+
+    @property
+    def pages(self):
+        return self._items[:self.size]
+
+    @property
+    def next_cursor(self):
+        if len(self._items) <= self.size:
+            return None
+        last = self._items[self.size - 1]
+        return '{0}-{1}'.format(last.views, last.id)
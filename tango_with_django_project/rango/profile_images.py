@@ -0,0 +1,194 @@
+"""
+Resized variants of profile pictures, made outside the request.
+
+register() only stores the uploaded picture, as is, under
+profile_images/staging/ and hands the profile to enqueue(). A worker
+thread then makes the variants named in RANGO_PROFILE_IMAGE_SIZES (an
+avatar for the profile page and a thumbnail for lists), each scaled to
+fit in a square of that many pixels, saved as a progressive JPEG without
+the original's EXIF and other metadata, and records them on the
+UserProfile. Templates show the variants, never the original, and /media/
+won't serve it either (RANGO_PRIVATE_MEDIA): the avatar on the profile
+page, and the thumbnail in the navbar of every page, its url cached so
+that showing it costs no query (see the user_thumbnail context processor).
+
+The thread lives in the web process, so a restart can lose the profiles
+it had queued. Set RANGO_PROFILE_IMAGES_IN_BACKGROUND to False to leave
+every picture to "manage.py process_profile_images" instead (run it from
+cron), which also picks up anything the thread didn't get to.
+
+Pictures uploaded before staging/ existed were stored straight under
+profile_images/, where /media/ still serves them. hide_originals(), run
+by "manage.py add_profile_image_variants", moves them into staging/.
+"""
+
+import Queue
+import logging
+import posixpath
+import threading
+from StringIO import StringIO
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils.functional import SimpleLazyObject
+
+from rango.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Pixels the variants (UserProfile fields) fit in, see RANGO_PROFILE_IMAGE_SIZES
+SIZES = {'avatar': 256, 'thumbnail': 64}
+# White, for pictures with a transparent background
+BACKGROUND = (255, 255, 255)
+THUMBNAIL_KEY = 'rango:thumbnail:{0}'
+# Seconds a thumbnail url is cached, process() forgets it straight away
+THUMBNAIL_TIMEOUT = 60 * 60
+
+_queue = Queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def sizes():
+    return dict(SIZES, **getattr(settings, 'RANGO_PROFILE_IMAGE_SIZES', {}))
+
+
+def in_background():
+    return getattr(settings, 'RANGO_PROFILE_IMAGES_IN_BACKGROUND', True)
+
+
+def resize(image, size):
+    """A JPEG of image scaled down to fit in a size x size square"""
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.ANTIALIAS)
+    if variant.mode in ('RGBA', 'LA') or 'transparency' in variant.info:
+        variant = variant.convert('RGBA')
+        flat = Image.new('RGB', variant.size, BACKGROUND)
+        flat.paste(variant, mask=variant.split()[-1])
+        variant = flat
+    elif variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    out = StringIO()
+    # A new image carries no EXIF (location, camera, ...) unless told to
+    variant.save(out, 'JPEG', quality=getattr(settings, 'RANGO_PROFILE_IMAGE_QUALITY', 80),
+                 optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def process(profile):
+    """Make and record the variants of profile's picture"""
+    profile.picture.open('rb')
+    try:
+        image = Image.open(profile.picture)
+        image.load()
+    finally:
+        profile.picture.close()
+    # Phones store the picture sideways and say so in the EXIF
+    orientation = {3: 180, 6: 270, 8: 90}.get(_orientation(image))
+    if orientation:
+        image = image.rotate(orientation, expand=True)
+
+    name = 'user_{0}.jpg'.format(profile.user_id)
+    for field, size in sizes().items():
+        old = getattr(profile, field)
+        if old:
+            old.delete(save=False)
+        getattr(profile, field).save(name, ContentFile(resize(image, size)), save=False)
+    UserProfile.objects.filter(id=profile.id).update(
+        **dict((field, getattr(profile, field).name) for field in sizes()))
+    cache.delete(THUMBNAIL_KEY.format(profile.user_id))
+
+
+def _orientation(image):
+    try:
+        return (image._getexif() or {}).get(0x0112)
+    except (AttributeError, IndexError, KeyError, IOError, SyntaxError):
+        return None
+
+
+def thumbnail_url(user_id):
+    """The url of a user's thumbnail, '' while there is none"""
+    key = THUMBNAIL_KEY.format(user_id)
+    url = cache.get(key)
+    if url is None:
+        names = UserProfile.objects.filter(user_id=user_id).values_list('thumbnail', flat=True)
+        url = default_storage.url(names[0]) if names and names[0] else ''
+        cache.set(key, url, THUMBNAIL_TIMEOUT)
+    return url
+
+
+def user_thumbnail(req):
+    """Context processor with the logged in user's thumbnail url, looked up if used"""
+    return {'user_thumbnail': SimpleLazyObject(
+        lambda: thumbnail_url(req.user.id) if req.user.is_authenticated() else '')}
+
+
+def pending():
+    """Profiles with a picture that has no variants yet"""
+    return UserProfile.objects.exclude(picture='').filter(avatar='')
+
+
+def staging_dir():
+    """Where uploaded pictures are kept, see RANGO_PRIVATE_MEDIA"""
+    return UserProfile._meta.get_field('picture').upload_to
+
+
+def hide_originals():
+    """Move pictures stored outside staging_dir() into it, returns how many"""
+    count = 0
+    for profile in UserProfile.objects.exclude(picture='').exclude(
+            picture__startswith=staging_dir() + '/'):
+        storage, name = profile.picture.storage, profile.picture.name
+        try:
+            with storage.open(name, 'rb') as f:
+                new_name = storage.save(
+                    posixpath.join(staging_dir(), posixpath.basename(name)), f)
+        except (IOError, OSError):
+            logger.exception("Couldn't move the picture of %s", profile)
+            continue
+        UserProfile.objects.filter(id=profile.id).update(picture=new_name)
+        storage.delete(name)
+        count += 1
+    return count
+
+
+def process_pending(profiles=None):
+    """Process the given (or all) pending profiles, returns how many"""
+    count = 0
+    for profile in (profiles if profiles is not None else pending()):
+        try:
+            process(profile)
+            count += 1
+        except IOError:
+            logger.exception("Couldn't process the picture of %s", profile)
+    return count
+
+
+def enqueue(profile):
+    """Have the worker thread make the variants of profile's picture"""
+    global _worker
+    if not in_background():
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work)
+            _worker.daemon = True
+            _worker.start()
+    _queue.put(profile.id)
+
+
+def _work():
+    while True:
+        profile_id = _queue.get()
+        try:
+            process_pending(pending().filter(id=profile_id))
+        except Exception:
+            logger.exception("Profile picture worker failed")
+        finally:
+            # The next picture may be a while, don't keep the connection
+            connection.close()
@@ -0,0 +1,234 @@
+"""
+On-demand profiling of single requests.
+
+ProfilerMiddleware profiles a request when it carries an X-Rango-Profile
+header holding a token from "manage.py profile_token" (signed with
+SECRET_KEY, valid for RANGO_PROFILE_TOKEN_AGE seconds), or at random for
+a RANGO_PROFILE_SAMPLE_RATE fraction of all requests (0 turns sampling
+off).
+
+RANGO_PROFILE_MODE picks the profiler:
+
+- 'sample' (the default): a thread looks at the request's stack every
+  RANGO_PROFILE_INTERVAL seconds and counts the stacks it sees. Cheap
+  enough to leave sampling on in production.
+- 'cprofile': cProfile records every call, slowing the request down a
+  lot but giving exact call counts. The .prof file beside the dump
+  opens with pstats or snakeviz.
+
+Each profile is written to RANGO_PROFILE_DIR as a JSON dump holding the
+request, its timings, the stacks (sample mode) and its SQL log. Only the
+newest RANGO_PROFILE_KEEP dumps are kept. "manage.py collapse_profiles"
+adds the dumps up into a collapsed-stack file for flamegraph.pl or
+speedscope.
+"""
+
+import cProfile
+import glob
+import json
+import os
+import pstats
+import random
+import sys
+import thread
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+HEADER = 'HTTP_X_RANGO_PROFILE'
+SALT = 'rango.profile'
+
+
+def profile_dir():
+    return getattr(settings, 'RANGO_PROFILE_DIR', 'profiles')
+
+
+def make_token():
+    """A token for the X-Rango-Profile header"""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def wanted(req):
+    """Whether req should be profiled"""
+    token = req.META.get(HEADER)
+    if token:
+        try:
+            signing.TimestampSigner(salt=SALT).unsign(
+                token, max_age=getattr(settings, 'RANGO_PROFILE_TOKEN_AGE', 60 * 60))
+            return True
+        except signing.BadSignature:
+            pass
+    return random.random() < getattr(settings, 'RANGO_PROFILE_SAMPLE_RATE', 0)
+
+
+def frame_name(filename, line, function):
+    # Two path components tell rango/views.py from django/.../views.py
+    filename = os.path.join(*filename.split(os.sep)[-2:])
+    return '{0} ({1}:{2})'.format(function, filename, line)
+
+
+class Sampler(object):
+    "Counts the stacks a thread is seen running every interval seconds"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = thread.get_ident()
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling, once this returns the stacks no longer change"""
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                return
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(frame_name(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+
+class Profile(object):
+    "One request being profiled"
+
+    def __init__(self, mode=None):
+        self.mode = mode or getattr(settings, 'RANGO_PROFILE_MODE', 'sample')
+        self.interval = getattr(settings, 'RANGO_PROFILE_INTERVAL', 0.005)
+        self._queries = {}
+        for db in connections.all():
+            self._queries[db.alias] = (len(db.queries), db.use_debug_cursor)
+            db.use_debug_cursor = True
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = Sampler(self.interval)
+            self._profiler.start()
+        self.start = time.time()
+
+    def stop(self):
+        """Stop profiling, returns the SQL log of the request"""
+        self.seconds = time.time() - self.start
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        queries = []
+        for db in connections.all():
+            start, use_debug_cursor = self._queries.get(db.alias, (0, None))
+            queries += [dict(query, db=db.alias) for query in db.queries[start:]]
+            db.use_debug_cursor = use_debug_cursor
+        return queries
+
+    def save(self, req, view, status):
+        """Stop profiling and write the dump, returns its path"""
+        queries = self.stop()
+        directory = profile_dir()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        name = '{0:.6f}-{1}-{2}'.format(self.start, os.getpid(), thread.get_ident())
+        dump = {'path': req.path,
+                'method': req.method,
+                'view': view or 'other',
+                'status': status,
+                'seconds': self.seconds,
+                'mode': self.mode,
+                'sql': queries}
+        if self.mode == 'cprofile':
+            self._profiler.dump_stats(os.path.join(directory, name + '.prof'))
+            dump['profile'] = name + '.prof'
+        else:
+            dump['interval'] = self.interval
+            dump['stacks'] = self._profiler.stacks
+        path = os.path.join(directory, name + '.json')
+        with open(path, 'w') as f:
+            json.dump(dump, f)
+        rotate(directory)
+        return path
+
+
+def rotate(directory):
+    """Delete all but the newest RANGO_PROFILE_KEEP dumps"""
+    paths = sorted(glob.glob(os.path.join(directory, '*.json')))
+    for path in paths[:-getattr(settings, 'RANGO_PROFILE_KEEP', 200) or None]:
+        for stale in (path, path[:-len('.json')] + '.prof'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+
+def load_dumps(directory=None):
+    """Load every dump in directory, oldest first"""
+    directory = directory or profile_dir()
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as f:
+            dump = json.load(f)
+        dump['directory'] = directory
+        yield dump
+
+
+def profile_stacks(path):
+    """
+    Collapsed stacks weighted in microseconds from a cProfile file.
+    cProfile only knows who called whom, so a function's time is shared
+    out among its callers in proportion to the time each spent in it.
+    """
+    stats = pstats.Stats(path).stats
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    stacks = Counter()
+
+    def walk(func, stack, share):
+        stack = stack + [frame_name(*func)]
+        tt = stats[func][2]
+        if tt * share > 0:
+            stacks[';'.join(stack)] += int(round(tt * share * 1000000))
+        ct = stats[func][3]
+        for callee, edge_time in callees.get(func, []):
+            # Recursion is folded into the outermost call, and paths
+            # worth less than a microsecond are dropped
+            if frame_name(*callee) not in stack and share * edge_time >= 0.000001:
+                walk(callee, stack, share * edge_time / ct)
+
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        if not callers:
+            walk(func, [], 1.0)
+    return stacks
+
+
+def collapse(dumps, view=None):
+    """
+    Add dumps up into collapsed stacks, "<view>;<frame>;<frame> <us>",
+    weighted in microseconds so that both modes can be mixed.
+    """
+    stacks = Counter()
+    for dump in dumps:
+        if view and dump['view'] != view:
+            continue
+        if dump.get('profile'):
+            found = profile_stacks(os.path.join(dump['directory'], dump['profile']))
+        else:
+            weight = int(round(dump['interval'] * 1000000))
+            found = dict((stack, count * weight) for stack, count in dump['stacks'].items())
+        for stack, micros in found.items():
+            stacks[dump['view'] + ';' + stack] += micros
+    return stacks
@@ -0,0 +1,120 @@
+"""
+Database router sending rango's reads to read replicas.
+
+Reads of Category, Page and UserProfile go to one of the databases named
+in RANGO_READ_REPLICAS, picked at random per query; every write, and
+every read of another model, goes to the primary ('default'). With no
+replicas configured the router steps aside and everything stays on the
+primary, as before.
+
+Replicas lag behind the primary, so a visitor who just wrote something
+must not be sent to one straight away. ReplicaStickinessMiddleware pins
+a request to the primary when it is not a GET/HEAD, or when the visitor
+wrote something less than RANGO_REPLICA_STICKY_SECONDS ago (remembered in
+a cookie), and sets that cookie whenever a request ends up writing. A
+GET that writes (auto_add_page, like_category, ...) reads from the
+primary from its first write on.
+
+Caches that are filled once and then served for a long time read from
+the primary: the category sidebar snapshot, the leaderboards and the
+category stats by using() it, cached pages and fragments by rendering
+inside primary(), so that a lagging replica doesn't get cached.
+
+To try it with SQLite, add a second database and keep it in sync with
+"manage.py sync_replicas", which copies the primary's file over it.
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Models whose reads may be served by a replica
+REPLICATED = ('rango.category', 'rango.page', 'rango.userprofile')
+
+_state = threading.local()
+
+
+def read_replicas():
+    return getattr(settings, 'RANGO_READ_REPLICAS', [])
+
+
+def sticky_seconds():
+    return getattr(settings, 'RANGO_REPLICA_STICKY_SECONDS', 10)
+
+
+def pin_to_primary(pinned=True):
+    """Send every read made by this thread to the primary (or stop doing so)"""
+    _state.pinned = pinned
+
+
+@contextmanager
+def primary():
+    """Send the reads made inside the block to the primary"""
+    pinned = getattr(_state, 'pinned', False)
+    _state.pinned = True
+    try:
+        yield
+    finally:
+        _state.pinned = pinned
+
+
+def start_tracking():
+    """Forget the writes this thread made so far, see has_written()"""
+    _state.written = False
+
+
+def has_written():
+    """Whether this thread asked for the primary to write since start_tracking()"""
+    return getattr(_state, 'written', False)
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        replicas = read_replicas()
+        if not replicas or getattr(_state, 'pinned', False):
+            return DEFAULT_DB_ALIAS
+        # Read your own writes, the replicas haven't seen them yet
+        if getattr(_state, 'written', False):
+            return DEFAULT_DB_ALIAS
+        if '{0}.{1}'.format(model._meta.app_label, model._meta.model_name) not in REPLICATED:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_syncdb(self, db, model):
+        # Replicas get their tables by being copied from the primary
+        if db in read_replicas():
+            return False
+        return None
+
+
+def copy_sqlite(source, target):
+    """
+    Copy the SQLite database at source over the one at target, for trying
+    replicas out locally. Writers to source wait while it's being copied.
+    """
+    temporary = target + '.tmp'
+    db = sqlite3.connect(source, isolation_level=None)
+    try:
+        # Holding the write lock keeps the file consistent while we copy it
+        db.execute('BEGIN IMMEDIATE')
+        shutil.copyfile(source, temporary)
+    finally:
+        db.execute('ROLLBACK')
+        db.close()
+    # Connections open on the old copy keep it until they are closed
+    os.rename(temporary, target)
@@ -0,0 +1,129 @@
+"""
+In-process prefix index for the suggest_category autocomplete.
+
+rango-ajax.js asks for suggestions on every keyup, so instead of running
+a case-insensitive LIKE query per keystroke we keep every category's
+case-folded name in a sorted list (searched with bisect) together with
+the precomputed top SUGGESTIONS categories, by likes, for every prefix.
+
+Category saves and deletes in this process update the index
+incrementally. Changes made elsewhere (other processes, like rollups)
+show up as a new category_cache version, and the index is then rebuilt
+from the cached sidebar snapshot, so a lookup never needs the database
+while the snapshot is warm.
+"""
+
+import threading
+from bisect import bisect_left, insort
+
+from django.dispatch import receiver
+
+from rango import category_cache
+from rango.models import Category
+
+# How many categories are suggested at most
+SUGGESTIONS = 8
+
+
+def _rank(entry):
+    # Most liked first, then alphabetically
+    return (-entry['likes'], entry['name'].lower())
+
+
+class PrefixIndex(object):
+    "Case-insensitive name prefix -> top categories, kept in memory"
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._keys = []
+        self._top = {}
+
+    def _matching(self, prefix):
+        # Every entry whose folded name starts with prefix, via bisect
+        start = bisect_left(self._keys, (prefix,))
+        matches = []
+        for key, cat_id in self._keys[start:]:
+            if not key.startswith(prefix):
+                break
+            matches.append(self._entries[cat_id])
+        return matches
+
+    def _refresh_prefixes(self, name):
+        # Recompute the top lists of every prefix of name
+        key = name.lower()
+        for i in range(len(key) + 1):
+            prefix = key[:i]
+            top = sorted(self._matching(prefix), key=_rank)[:SUGGESTIONS]
+            if top:
+                self._top[prefix] = top
+            else:
+                self._top.pop(prefix, None)
+
+    def rebuild(self, entries, version):
+        """Replace the whole index with the given snapshot entries"""
+        keys = sorted((entry['name'].lower(), entry['id']) for entry in entries)
+        by_id = dict((entry['id'], entry) for entry in entries)
+        top = {}
+        # Walk categories from most to least liked, so each prefix list
+        # fills up in rank order
+        for entry in sorted(entries, key=_rank):
+            key = entry['name'].lower()
+            for i in range(len(key) + 1):
+                ranked = top.setdefault(key[:i], [])
+                if len(ranked) < SUGGESTIONS:
+                    ranked.append(entry)
+        with self._lock:
+            self._entries, self._keys, self._top = by_id, keys, top
+            self.version = version
+
+    def remove(self, cat_id):
+        """Take a category out of the index"""
+        with self._lock:
+            entry = self._entries.pop(cat_id, None)
+            if entry is None:
+                return
+            self._keys.remove((entry['name'].lower(), cat_id))
+            self._refresh_prefixes(entry['name'])
+
+    def update(self, entry):
+        """Add a category to the index, or replace its old entry"""
+        with self._lock:
+            old = self._entries.pop(entry['id'], None)
+            if old is not None:
+                self._keys.remove((old['name'].lower(), old['id']))
+            self._entries[entry['id']] = entry
+            insort(self._keys, (entry['name'].lower(), entry['id']))
+            if old is not None:
+                self._refresh_prefixes(old['name'])
+            self._refresh_prefixes(entry['name'])
+
+    def suggest(self, starts_with=''):
+        """Return up to SUGGESTIONS categories whose name starts with starts_with"""
+        version = category_cache.get_version()
+        if version != self.version:
+            self.rebuild(category_cache.get_snapshot(), version)
+        return self._top.get(starts_with.lower(), [])
+
+
+# The index shared by every request handled in this process
+prefix_index = PrefixIndex()
+
+
+def suggest(starts_with=''):
+    return prefix_index.suggest(starts_with)
+
+
+@receiver(category_cache.snapshot_changed, sender=Category)
+def category_changed(sender, instance, deleted, version, **kwargs):
+    # Only worth patching an index that was up to date before this change,
+    # anything else gets rebuilt on the next lookup
+    if prefix_index.version != version - 1:
+        return
+    if deleted:
+        prefix_index.remove(instance.id)
+    else:
+        prefix_index.update(category_cache.make_entry(instance.id, instance.name,
+                                                      instance.slug, instance.likes))
+    prefix_index.version = version
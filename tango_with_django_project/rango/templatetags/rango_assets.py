@@ -0,0 +1,22 @@
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html_join
+
+from rango import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset_bundle(name):
+    """
+    Link to a bundle of RANGO_ASSET_BUNDLES, or to each of its sources
+    when bundling is off, as a stylesheet or script by its extension.
+    """
+    names = [name] if assets.bundled() else assets.bundles()[name]
+    if name.endswith('.css'):
+        tag = u'<link href="{0}" rel="stylesheet">'
+    else:
+        tag = u'<script src="{0}"></script>'
+    return format_html_join(u'\n    ', tag,
+                            ((staticfiles_storage.url(source),) for source in names))
@@ -0,0 +1,27 @@
+"""
+{% cache %} that fills its fragment from the primary database.
+
+Load it instead of Django's cache library: on a miss the querysets the
+fragment evaluates read from the primary rather than a replica, so a
+replica's lag doesn't get cached for the fragment's lifetime.
+"""
+
+from django import template
+from django.templatetags import cache
+
+from rango import routers
+
+register = template.Library()
+
+
+class PrimaryCacheNode(cache.CacheNode):
+
+    def render(self, context):
+        with routers.primary():
+            return super(PrimaryCacheNode, self).render(context)
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    node = cache.do_cache(parser, token)
+    return PrimaryCacheNode(node.nodelist, node.expire_time_var, node.fragment_name, node.vary_on)
@@ -5,7 +5,63 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase, TransactionTestCase
+from django.test.client import Client, RequestFactory
+from django.test.utils import override_settings
+from django.utils.functional import empty
+
+from PIL import Image
+
+from rango import assets
+from rango import benchmark
+from rango import bing_search
+from rango import canonical
+from rango import category_cache
+from rango import category_stats
+from rango import click_buffer
+from rango import file_serving
+from rango import fragment_cache
+from rango import leaderboard
+from rango import like_counter
+from rango import link_checker
+from rango import load_test
+from rango import loader
+from rango import local_search
+from rango import metrics
+from rango import page_cache
+from rango import paging
+from rango import profile_images
+from rango import profiler
+from rango import routers
+from rango import suggest_index
+from rango.bing_search import (SearchBusy, SearchCache, SearchClient, SearchError,
+                               normalize_query)
+from rango.forms import PageForm
+from rango.middleware import PRIMARY_COOKIE, VISIT_COOKIE, VISIT_SALT
+from rango.models import (Category, CategoryLikeShard, CategoryStats, Page, PageHealth,
+                          UserProfile)
 
 
 class SimpleTest(TestCase):
@@ -14,3 +70,1321 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class CategoryCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Category.objects.create(name='Python', likes=10)
+        Category.objects.create(name='Other Frameworks', likes=20)
+
+    def test_snapshot_is_ordered_by_likes(self):
+        snapshot = category_cache.get_snapshot()
+        self.assertEqual([c['name'] for c in snapshot],
+                         ['Other Frameworks', 'Python'])
+        self.assertEqual(snapshot[0]['slug'], 'other-frameworks')
+
+    def test_warm_snapshot_costs_no_queries(self):
+        category_cache.get_snapshot()
+        with self.assertNumQueries(0):
+            category_cache.get_snapshot()
+
+    def test_saving_a_category_bumps_the_version(self):
+        version = category_cache.get_version()
+        category_cache.get_snapshot()
+        Category.objects.create(name='Django', likes=30)
+        self.assertEqual(category_cache.get_version(), version + 1)
+        self.assertEqual(category_cache.get_snapshot()[0]['name'], 'Django')
+
+    def test_deleting_a_category_bumps_the_version(self):
+        category_cache.get_snapshot()
+        Category.objects.get(name='Python').delete()
+        self.assertEqual(len(category_cache.get_snapshot()), 1)
+
+    def test_evicted_version_doesnt_bring_an_old_snapshot_back(self):
+        cache.clear()
+        category_cache.get_snapshot()
+        Category.objects.create(name='Django', likes=30)
+        cache.delete(category_cache.VERSION_KEY)
+        self.assertEqual(category_cache.get_snapshot()[0]['name'], 'Django')
+
+
+@override_settings(RANGO_CLICK_BUFFER_MAX_PENDING=1000,
+                   RANGO_CLICK_BUFFER_FLUSH_INTERVAL=1000)
+class ClickBufferTest(TestCase):
+    def setUp(self):
+        click_buffer.flush()
+        category = Category.objects.create(name='Python')
+        self.page = Page.objects.create(category=category, title='Docs',
+                                        url='http://docs.python.org/')
+
+    def test_track_url_redirects_without_writing(self):
+        response = self.client.get('/rango/goto/', {'page_id': self.page.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'http://docs.python.org/')
+        self.assertEqual(Page.objects.get(id=self.page.id).views, 0)
+        self.assertEqual(click_buffer.click_buffer.pending(self.page.id), 1)
+
+    def test_flush_applies_batched_increments(self):
+        for i in range(3):
+            self.client.get('/rango/goto/', {'page_id': self.page.id})
+        self.assertEqual(click_buffer.flush(), 1)
+        self.assertEqual(Page.objects.get(id=self.page.id).views, 3)
+        self.assertEqual(click_buffer.click_buffer.pending(self.page.id), 0)
+
+    def test_unknown_page_redirects_home(self):
+        response = self.client.get('/rango/goto/', {'page_id': 'nope'})
+        self.assertEqual(response['Location'], 'http://testserver/rango/')
+
+    @override_settings(RANGO_CLICK_BUFFER_MAX_PENDING=3)
+    def test_failed_flushes_keep_at_most_max_pending_clicks(self):
+        buffer = click_buffer.ClickBuffer()
+        buffer._pending, buffer._count = {self.page.id: 2}, 2
+        self.assertEqual(buffer._restore({self.page.id: 4}), 3)
+        self.assertEqual(buffer._count, 3)
+        self.assertEqual(buffer.pending(self.page.id), 3)
+
+    def test_a_failed_background_flush_is_logged(self):
+        buffer = click_buffer.ClickBuffer()
+        buffer._pending, buffer._count, buffer._flushing = {self.page.id: 1}, 1, True
+        buffer.flush = lambda: 1 / 0
+        buffer._background_flush()
+        self.assertFalse(buffer._flushing)
+
+    def test_idle_clicks_are_flushed_by_the_timer(self):
+        self.client.get('/rango/goto/', {'page_id': self.page.id})
+        self.assertFalse(click_buffer.click_buffer._flush_if_idle())
+        with override_settings(RANGO_CLICK_BUFFER_FLUSH_INTERVAL=0):
+            self.assertTrue(click_buffer.click_buffer._flush_if_idle())
+        self.assertEqual(Page.objects.get(id=self.page.id).views, 1)
+
+
+class LikeCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Python', likes=5)
+
+    def test_existing_likes_are_kept(self):
+        self.assertEqual(like_counter.add_like(self.category.id), 6)
+        self.assertEqual(like_counter.rollup(self.category.id), 6)
+        self.assertEqual(Category.objects.get(id=self.category.id).likes, 6)
+
+    def test_likes_are_spread_over_shards(self):
+        for i in range(20):
+            like_counter.add_like(self.category.id)
+        self.assertEqual(like_counter.get_total(self.category.id), 25)
+        shards = CategoryLikeShard.objects.filter(category=self.category)
+        self.assertTrue(shards.count() > 1)
+        self.assertTrue(shards.count() <= like_counter.num_shards())
+
+    def test_like_category_view_returns_total(self):
+        User.objects.create_user('rango', 'rango@example.com', 'secret')
+        self.client.login(username='rango', password='secret')
+        response = self.client.get('/rango/like_category/',
+                                   {'category_id': self.category.id})
+        self.assertEqual(response.content, '6')
+
+
+class SearchCacheTest(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def fetch(self, value):
+        def fetch():
+            self.calls.append(value)
+            return [value]
+        return fetch
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  Django   TUTORIAL '), 'django tutorial')
+
+    def test_repeat_queries_are_hits(self):
+        results = SearchCache()
+        results.get('django', self.fetch('a'))
+        self.assertEqual(results.get('django', self.fetch('b')), ['a'])
+        self.assertEqual(self.calls, ['a'])
+        self.assertEqual(results.stats()['hits'], 1)
+        self.assertEqual(results.stats()['misses'], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        results = SearchCache(max_size=2)
+        results.get('a', self.fetch('a'))
+        results.get('b', self.fetch('b'))
+        results.get('a', self.fetch('a'))
+        results.get('c', self.fetch('c'))
+        self.assertEqual(results.get('b', self.fetch('b2')), ['b2'])
+        self.assertEqual(results.get('a', self.fetch('a2')), ['a2'])
+
+    def test_stale_entries_are_served_while_refreshing(self):
+        results = SearchCache(ttl=0, stale=60)
+        results.get('django', self.fetch('old'))
+        self.assertEqual(results.get('django', self.fetch('new')), ['old'])
+        self.assertEqual(results.stats()['stale_hits'], 1)
+
+    def test_expired_entries_are_fetched_again(self):
+        results = SearchCache(ttl=0, stale=0)
+        results.get('django', self.fetch('old'))
+        self.assertEqual(results.get('django', self.fetch('new')), ['new'])
+
+    def test_empty_results_are_not_cached(self):
+        results = SearchCache()
+        results.get('django', lambda: [])
+        self.assertEqual(results.stats()['size'], 0)
+
+
+class StubBingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlsplit(self.path).query)
+        if query['Query'] == ["'slow'"]:
+            # Hold the response back until the test is over
+            self.server.release.wait(1)
+        skip = int(query['$skip'][0])
+        results = [{'Title': 'Result {0}'.format(skip + i),
+                    'Url': 'http://example.com/{0}'.format(skip + i),
+                    'Description': self.headers.get('Authorization')}
+                   for i in range(int(query['$top'][0]))]
+        body = json.dumps({'d': {'results': results}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubBingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def __init__(self, *args):
+        HTTPServer.__init__(self, *args)
+        self.release = threading.Event()
+
+    def handle_error(self, request, client_address):
+        # The client hung up on a slow response, that's expected
+        pass
+
+
+class SearchClientTest(TestCase):
+    def setUp(self):
+        self.server = StubBingServer(('127.0.0.1', 0), StubBingHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.client = SearchClient(
+            root_url='http://127.0.0.1:{0}/Bing/Search/'.format(self.server.server_port),
+            api_key='key', read_timeout=0.2)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_search_sends_auth_and_parses_results(self):
+        results = self.client.search('django', results_per_page=2)
+        self.assertEqual([r['title'] for r in results], ['Result 0', 'Result 1'])
+        self.assertEqual(results[0]['summary'], 'Basic OmtleQ==')
+
+    def test_connections_are_kept_alive(self):
+        for i in range(3):
+            self.client.search('django')
+        self.assertEqual(self.server.connections, 1)
+
+    def test_slow_upstream_times_out(self):
+        self.assertRaises(SearchError, self.client.search, 'slow')
+
+    def test_search_pages_keeps_page_order(self):
+        results = self.client.search_pages('django', pages=3, results_per_page=2)
+        self.assertEqual([r['title'] for r in results],
+                         ['Result {0}'.format(i) for i in range(6)])
+
+
+class LocalSearchTest(TestCase):
+    def setUp(self):
+        self.python = Category.objects.create(name='Python')
+        self.tutorial = Page.objects.create(category=self.python,
+                                            title='Official Python Tutorial',
+                                            url='http://docs.python.org/2/tutorial/')
+        Page.objects.create(category=self.python, title='Learn Python in 10 Minutes',
+                            url='http://www.korokithakis.net/tutorials/python/')
+
+    def test_results_have_run_query_shape(self):
+        results = local_search.search('official tutorial')
+        self.assertEqual(results, [{'title': 'Official Python Tutorial',
+                                    'link': 'http://docs.python.org/2/tutorial/',
+                                    'summary': 'Saved in Python'}])
+
+    def test_category_name_and_url_are_searchable(self):
+        self.assertEqual(len(local_search.search('python')), 2)
+        self.assertEqual(len(local_search.search('korokithakis')), 1)
+
+    def test_index_follows_changes(self):
+        self.tutorial.title = 'The Python Docs'
+        self.tutorial.save()
+        self.assertEqual(local_search.search('official'), [])
+        self.python.name = 'Snakes'
+        self.python.save()
+        self.assertEqual(len(local_search.search('snakes')), 2)
+        self.tutorial.delete()
+        self.assertEqual(len(local_search.search('snakes')), 1)
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(local_search.search('"python AND OR ('), [])
+
+    def test_rebuild(self):
+        self.assertEqual(local_search.rebuild_index(), 2)
+        self.assertEqual(len(local_search.search('python')), 2)
+
+    def test_pages_save_without_the_index(self):
+        connection.cursor().execute('DROP TABLE {0}'.format(local_search.INDEX_TABLE))
+        local_search._available.clear()
+        try:
+            self.tutorial.save()
+            self.python.name = 'Snakes'
+            self.python.save()
+            self.tutorial.delete()
+            self.assertEqual(local_search.search('python'), [])
+        finally:
+            local_search.create_index()
+
+    def test_search_view_uses_local_source(self):
+        response = self.client.post('/rango/search/', {'query': 'official',
+                                                       'source': 'rango'})
+        self.assertContains(response, 'Official Python Tutorial')
+
+
+class SuggestIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        suggest_index.prefix_index.version = None
+        for i, name in enumerate(['Python', 'Pyramid', 'Django', 'Perl']):
+            Category.objects.create(name=name, likes=i)
+
+    def names(self, starts_with):
+        return [c['name'] for c in suggest_index.suggest(starts_with)]
+
+    def test_suggestions_are_ranked_by_likes(self):
+        self.assertEqual(self.names('p'), ['Perl', 'Pyramid', 'Python'])
+        self.assertEqual(self.names('PY'), ['Pyramid', 'Python'])
+        self.assertEqual(self.names(''), ['Perl', 'Django', 'Pyramid', 'Python'])
+        self.assertEqual(self.names('x'), [])
+
+    def test_suggestions_are_capped(self):
+        for i in range(10):
+            Category.objects.create(name='Pascal {0}'.format(i))
+        self.assertEqual(len(self.names('p')), suggest_index.SUGGESTIONS)
+
+    def test_warm_index_costs_no_queries(self):
+        self.names('p')
+        with self.assertNumQueries(0):
+            self.names('py')
+
+    def test_changes_are_applied_incrementally(self):
+        self.names('p')
+        Category.objects.create(name='Pylons', likes=10)
+        category = Category.objects.get(name='Perl')
+        category.name = 'Ruby'
+        category.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('py'), ['Pylons', 'Pyramid', 'Python'])
+            self.assertEqual(self.names('pe'), [])
+        Category.objects.get(name='Pylons').delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('py'), ['Pyramid', 'Python'])
+
+    def test_changes_do_not_depend_on_receiver_order(self):
+        # Move category_cache's receiver behind every other one
+        post_save.disconnect(category_cache.category_changed, sender=Category)
+        post_save.connect(category_cache.category_changed, sender=Category)
+        self.names('p')
+        Category.objects.create(name='Pylons', likes=10)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('py'), ['Pylons', 'Pyramid', 'Python'])
+
+    def test_suggest_category_view(self):
+        response = self.client.get('/rango/suggest_category/', {'suggestion': 'dj'})
+        self.assertContains(response, '<a href="/rango/category/django/">Django</a>')
+
+
+class CategorySlugTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_slug_is_filled_in_on_the_first_save(self):
+        category = Category.objects.create(name='Other Frameworks')
+        self.assertEqual(category.slug, 'other-frameworks')
+        # Renaming keeps the category's url
+        category.name = 'Web Frameworks'
+        category.save()
+        self.assertEqual(Category.objects.get(id=category.id).slug, 'other-frameworks')
+
+    def test_clashing_slugs_are_made_unique(self):
+        Category.objects.create(name='C')
+        self.assertEqual(Category.objects.create(name='C++').slug, 'c-2')
+
+    def test_category_view_resolves_by_slug(self):
+        Category.objects.create(name='my_category')
+        response = self.client.get('/rango/category/my_category/')
+        self.assertEqual(response.context['category'].name, 'my_category')
+        response = self.client.get('/rango/category/other-frameworks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse('category' in response.context)
+
+    def test_add_page_redirects_to_category(self):
+        User.objects.create_user('rango', 'rango@example.com', 'secret')
+        self.client.login(username='rango', password='secret')
+        category = Category.objects.create(name='Python')
+        response = self.client.post('/rango/category/python/add_page/',
+                                    {'title': 'Docs', 'url': 'http://docs.python.org/',
+                                     'views': 0})
+        self.assertRedirects(response, '/rango/category/python/')
+        self.assertEqual(category.page_set.count(), 1)
+
+
+# A TransactionTestCase, so that savepoints don't add to the query counts
+@override_settings(RANGO_CLICK_BUFFER_MAX_PENDING=1000,
+                   RANGO_CLICK_BUFFER_FLUSH_INTERVAL=1000)
+class QueryBudgetTest(TransactionTestCase):
+    def test_every_route_is_within_budget(self):
+        cache.clear()
+        user = benchmark.load_dataset(categories=3, pages=5, users=2)
+        report = benchmark.run_benchmark(user, iterations=2)
+        self.assertEqual(benchmark.check_budget(report, benchmark.load_budget()), [])
+
+    def test_every_url_has_a_route_and_a_budget(self):
+        category = Category.objects.create(name='Python')
+        page = Page.objects.create(category=category, title='Docs',
+                                   url='http://docs.python.org/')
+        self.assertEqual(benchmark.check_routes(category, page, benchmark.load_budget()), [])
+        budget = dict(benchmark.load_budget(), stale=1)
+        del budget['about']
+        self.assertEqual(benchmark.check_routes(category, page, budget),
+                         ['about has no query budget', 'stale is budgeted but is not a route'])
+
+        routes = benchmark.routes
+        benchmark.routes = lambda category, page: [route for route in routes(category, page)
+                                                   if route[0] != 'about']
+        self.addCleanup(setattr, benchmark, 'routes', routes)
+        self.assertEqual(benchmark.check_routes(category, page, benchmark.load_budget()),
+                         ["The 'about' URL has no benchmark route",
+                          'about is budgeted but is not a route'])
+
+
+class PageLoaderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        python = Category.objects.create(name='Python')
+        Page.objects.create(category=python, title='Docs', url='http://docs.python.org/')
+
+    def test_jsonl_rows_are_loaded_and_duplicates_skipped(self):
+        stream = StringIO('{"category": "Python", "title": "Docs", "url": "http://docs.python.org/"}\n'
+                          '{"category": "Python", "title": "PyPI", "url": "http://pypi.python.org/"}\n'
+                          '\n'
+                          '{"category": "Django", "title": "Docs", "url": "http://djangoproject.com/", "views": 3, "likes": 7}\n'
+                          '{"category": "Django", "title": "Docs", "url": "http://djangoproject.com/"}\n')
+        pages = loader.PageLoader(chunk_size=1).load(loader.read_jsonl(stream))
+        self.assertEqual((pages.read, pages.inserted, pages.skipped, pages.categories_created),
+                         (4, 2, 2, 1))
+        django = Category.objects.get(name='Django')
+        self.assertEqual((django.slug, django.likes), ('django', 7))
+        self.assertEqual(Page.objects.get(category=django).views, 3)
+
+    def test_csv_rows(self):
+        stream = StringIO('category,title,url,views\n'
+                          'Flask,Flask,http://flask.pocoo.org,5\n')
+        pages = loader.PageLoader().load(loader.read_csv(stream))
+        self.assertEqual(pages.inserted, 1)
+        self.assertEqual(Page.objects.get(title='Flask').views, 5)
+
+    def test_synthetic_rows(self):
+        pages = loader.PageLoader(chunk_size=7).load(loader.synthetic_rows(50, categories=5))
+        self.assertEqual((pages.inserted, pages.categories_created), (50, 5))
+        self.assertEqual(len(local_search.search('synthetic')), 10)
+
+    def test_loaded_pages_show_up_on_cached_pages_and_boards(self):
+        self.assertEqual(self.client.get('/rango/category/python/')['X-Rango-Cache'], 'miss')
+        self.assertEqual(leaderboard.top_pages()[0]['title'], 'Docs')
+        stream = StringIO('category,title,url,views\n'
+                          'Python,PyPI,http://pypi.python.org/,50\n')
+        loader.PageLoader().load(loader.read_csv(stream))
+        response = self.client.get('/rango/category/python/')
+        self.assertEqual(response['X-Rango-Cache'], 'miss')
+        self.assertContains(response, 'PyPI')
+        self.assertEqual(leaderboard.top_pages()[0]['title'], 'PyPI')
+
+    def count_reconciles(self):
+        calls = []
+        reconcile = leaderboard.pages.reconcile
+        leaderboard.pages.reconcile = lambda: calls.append(1) or reconcile()
+        self.addCleanup(delattr, leaderboard.pages, 'reconcile')
+        return calls
+
+    def test_loads_without_new_pages_skip_the_rebuild(self):
+        calls = self.count_reconciles()
+        pages = loader.PageLoader()
+        pages.load(loader.synthetic_rows(3))
+        pages.load(loader.synthetic_rows(3))
+        self.assertEqual((pages.inserted, len(calls)), (3, 1))
+
+    def test_load_pages_rebuilds_once_for_every_file(self):
+        calls = self.count_reconciles()
+        paths = []
+        for i in range(3):
+            stream = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False)
+            stream.write('{{"category": "Python", "title": "Page", '
+                         '"url": "http://example.com/{0}/"}}\n'.format(i))
+            stream.close()
+            self.addCleanup(os.remove, stream.name)
+            paths.append(stream.name)
+        call_command('load_pages', *paths, stdout=StringIO())
+        self.assertEqual((Page.objects.count(), len(calls)), (4, 1))
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python = Category.objects.create(name='Python')
+        self.django = Category.objects.create(name='Django')
+        self.page = Page.objects.create(category=self.python, title='Docs',
+                                        url='http://docs.python.org/')
+
+    def test_anonymous_pages_are_served_from_the_cache(self):
+        self.assertEqual(self.client.get('/rango/')['X-Rango-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get('/rango/')
+        self.assertEqual(response['X-Rango-Cache'], 'hit')
+        self.assertContains(response, 'Docs')
+
+    def test_visits_are_filled_in_per_visitor(self):
+        self.client.get('/rango/')
+        response = Client().get('/rango/')
+        self.assertEqual(response['X-Rango-Cache'], 'hit')
+        self.assertContains(response, '<strong>0</strong> times')
+        self.assertNotContains(response, '@@rango-hole')
+
+    def test_csrf_token_is_per_visitor(self):
+        self.client.get('/rango/category/python/')
+        other = Client(enforce_csrf_checks=True)
+        response = other.get('/rango/category/python/')
+        self.assertEqual(response['X-Rango-Cache'], 'hit')
+        token = response.cookies['csrftoken'].value
+        self.assertContains(response, "value='{0}'".format(token))
+        response = other.post('/rango/category/python/',
+                              {'query': '', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 200)
+
+    def test_saving_a_page_purges_only_its_category(self):
+        self.client.get('/rango/category/python/')
+        self.client.get('/rango/category/django/')
+        Page.objects.create(category=self.python, title='PyPI',
+                            url='http://pypi.python.org/')
+        response = self.client.get('/rango/category/python/')
+        self.assertEqual(response['X-Rango-Cache'], 'miss')
+        self.assertContains(response, 'PyPI')
+        self.assertEqual(self.client.get('/rango/category/django/')['X-Rango-Cache'], 'hit')
+
+    def test_evicted_tag_versions_dont_bring_stale_pages_back(self):
+        self.client.get('/rango/category/python/')
+        page_cache.purge('category:{0}'.format(self.python.id))
+        cache.delete(page_cache.TAG_KEY.format('category:{0}'.format(self.python.id)))
+        response = self.client.get('/rango/category/python/')
+        self.assertEqual(response['X-Rango-Cache'], 'miss')
+
+    def test_logged_in_users_are_not_cached(self):
+        User.objects.create_user('rango', 'rango@example.com', 'secret')
+        self.client.login(username='rango', password='secret')
+        self.client.get('/rango/')
+        self.assertFalse(self.client.get('/rango/').has_header('X-Rango-Cache'))
+
+
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('rango', 'rango@example.com', 'secret')
+        self.client.login(username='rango', password='secret')
+        self.python = Category.objects.create(name='Python')
+        Page.objects.create(category=self.python, title='Docs',
+                            url='http://docs.python.org/')
+
+    def test_page_list_is_rendered_once(self):
+        self.client.get('/rango/category/python/')
+        # The lazy page queryset isn't run for a cached fragment
+        with self.assertNumQueries(0):
+            fragment_cache.render_fragment('rango/page_list.html',
+                                           {'page_slice': paging.KeysetPage(Page.objects.all())},
+                                           fragment_cache.PAGE_LIST,
+                                           [self.python.id,
+                                            fragment_cache.page_list_version(self.python.id)])
+
+    def test_auto_add_page_refreshes_the_shared_fragment(self):
+        self.client.get('/rango/category/python/')
+        response = self.client.get('/rango/auto_add_page/',
+                                   {'category_id': self.python.id, 'title': 'PyPI',
+                                    'url': 'http://pypi.python.org/'})
+        self.assertContains(response, 'PyPI')
+        self.assertContains(self.client.get('/rango/category/python/'), 'PyPI')
+
+    def test_sidebar_follows_category_changes(self):
+        self.assertContains(self.client.get('/rango/'), '>Python</a>')
+        Category.objects.create(name='Django', likes=1)
+        self.assertContains(self.client.get('/rango/'), '>Django</a>')
+
+    def test_suggestions_are_cached_per_prefix(self):
+        self.assertContains(self.client.get('/rango/suggest_category/', {'suggestion': 'py'}),
+                            '>Python</a>')
+        self.assertNotContains(self.client.get('/rango/suggest_category/', {'suggestion': 'dj'}),
+                               '>Python</a>')
+
+
+class VisitMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def set_visits(self, visits, seconds_ago):
+        signer = signing.get_cookie_signer(salt=VISIT_COOKIE + VISIT_SALT)
+        self.client.cookies[VISIT_COOKIE] = signer.sign(
+            '{0}:{1}'.format(visits, int(time.time()) - seconds_ago))
+
+    def test_first_visit_sets_cookie_without_a_session(self):
+        response = self.client.get('/rango/about/')
+        self.assertContains(response, 'visited this site 0 times')
+        self.assertTrue(VISIT_COOKIE in response.cookies)
+        self.assertFalse('sessionid' in response.cookies)
+
+    def test_visits_within_the_window_write_nothing(self):
+        self.set_visits(3, 1)
+        response = self.client.get('/rango/about/')
+        self.assertContains(response, 'visited this site 3 times')
+        self.assertFalse(VISIT_COOKIE in response.cookies)
+
+    def test_new_visit_is_counted_after_the_window(self):
+        self.set_visits(3, 60 * 60 * 24 * 2)
+        response = self.client.get('/rango/')
+        self.assertContains(response, '<strong>3</strong> times')
+        value = signing.get_cookie_signer(salt=VISIT_COOKIE + VISIT_SALT).unsign(
+            response.cookies[VISIT_COOKIE].value)
+        self.assertEqual(value.split(':')[0], '4')
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies[VISIT_COOKIE] = '99:0:forged'
+        self.assertContains(self.client.get('/rango/about/'), 'visited this site 0 times')
+
+
+@override_settings(RANGO_PAGES_PER_LOAD=2)
+class KeysetPagingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python = Category.objects.create(name='Python')
+        for i, views in enumerate([5, 3, 3, 3, 0]):
+            Page.objects.create(category=self.python, title='Page {0}'.format(views),
+                                url='http://example.com/{0}/'.format(i), views=views)
+        self.ids = list(Page.objects.order_by('-views', '-id').values_list('id', flat=True))
+
+    def test_slices_follow_views_then_id(self):
+        seen = []
+        cursor = None
+        while True:
+            page_slice = paging.KeysetPage(Page.objects.filter(category=self.python), cursor)
+            seen.extend(page.id for page in page_slice.pages)
+            cursor = page_slice.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.ids)
+
+    def test_bad_cursor_starts_over(self):
+        page_slice = paging.KeysetPage(Page.objects.all(), 'nonsense')
+        self.assertEqual([page.id for page in page_slice.pages], self.ids[:2])
+
+    def test_category_page_and_load_more(self):
+        response = self.client.get('/rango/category/python/')
+        self.assertContains(response, 'id="more_pages"')
+        self.assertEqual(len(response.context['page_slice'].pages), 2)
+        cursor = response.context['page_slice'].next_cursor
+
+        response = self.client.get('/rango/more_pages/', {'category_id': self.python.id,
+                                                          'after': cursor})
+        self.assertEqual(response.content.count('<li>'), 2)
+        response = self.client.get('/rango/more_pages/', {'category_id': self.python.id,
+                                                          'after': response['X-Rango-Next']})
+        self.assertEqual(response.content.count('<li>'), 1)
+        self.assertFalse(response.has_header('X-Rango-Next'))
+
+
+class CategoryStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python = Category.objects.create(name='Python')
+
+    def stats(self):
+        return CategoryStats.objects.get(category=self.python)
+
+    def test_page_create_and_delete(self):
+        page = Page.objects.create(category=self.python, title='Docs',
+                                   url='http://docs.python.org/', views=3)
+        Page.objects.create(category=self.python, title='PyPI', url='http://pypi.python.org/')
+        stats = self.stats()
+        self.assertEqual((stats.page_count, stats.total_views), (2, 3))
+        self.assertIsNotNone(stats.last_page_added)
+
+        page.delete()
+        stats = self.stats()
+        self.assertEqual((stats.page_count, stats.total_views), (1, 0))
+
+    def test_click_flush_and_bulk_load(self):
+        page = Page.objects.create(category=self.python, title='Docs',
+                                   url='http://docs.python.org/')
+        click_buffer.click_buffer.add(page.id, 4)
+        click_buffer.flush()
+        self.assertEqual(self.stats().total_views, 4)
+
+        loader.PageLoader().load([{'category': 'Python', 'title': 'Wiki',
+                                   'url': 'http://wiki.python.org/', 'views': 6}])
+        stats = self.stats()
+        self.assertEqual((stats.page_count, stats.total_views), (2, 10))
+
+    def test_missing_row_is_rebuilt(self):
+        Page.objects.create(category=self.python, title='Docs',
+                            url='http://docs.python.org/', views=5)
+        CategoryStats.objects.all().delete()
+        self.assertEqual(category_stats.refresh(self.python.id).total_views, 5)
+
+        CategoryStats.objects.all().delete()
+        category_stats.add(self.python.id, views=1)
+        self.assertEqual(self.stats().page_count, 1)
+
+
+@override_settings(RANGO_LEADERBOARD_SIZE=3)
+class LeaderboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.python = Category.objects.create(name='Python')
+        self.pages = [Page.objects.create(category=self.python, title='Page {0}'.format(i),
+                                          url='http://example.com/{0}/'.format(i), views=i)
+                      for i in range(5)]
+
+    def ids(self, entries):
+        return [entry['id'] for entry in entries]
+
+    def test_clicks_move_pages_up_without_queries(self):
+        self.assertEqual(self.ids(leaderboard.top_pages(3)),
+                         [self.pages[4].id, self.pages[3].id, self.pages[2].id])
+        click_buffer.click_buffer.add(self.pages[0].id, 10)
+        click_buffer.flush()
+        with self.assertNumQueries(0):
+            top = leaderboard.top_pages(2)
+        self.assertEqual(self.ids(top), [self.pages[0].id, self.pages[4].id])
+        self.assertEqual(top[0]['views'], 10)
+
+    def test_changes_drop_the_board(self):
+        leaderboard.top_pages()
+        self.pages[4].delete()
+        self.assertNotIn(self.pages[4].id, self.ids(leaderboard.top_pages()))
+
+    @override_settings(RANGO_LEADERBOARD_RECONCILE=0)
+    def test_reconciled_with_the_database(self):
+        leaderboard.top_pages()
+        Page.objects.filter(id=self.pages[1].id).update(views=100)
+        self.assertEqual(leaderboard.top_pages(1)[0]['id'], self.pages[1].id)
+
+    def test_likes_and_index_page(self):
+        django = Category.objects.create(name='Django')
+        User.objects.create_user('leo', 'leo@example.com', 'secret')
+        self.client.login(username='leo', password='secret')
+        self.client.get('/rango/like_category/', {'category_id': django.id})
+        self.assertEqual(leaderboard.top_categories(1)[0]['name'], 'Django')
+
+        response = self.client.get('/rango/')
+        self.assertEqual(response.context['top_categories'][0]['name'], 'Django')
+        self.assertEqual(response.context['pages'][0]['title'], 'Page 4')
+
+
+class StubSiteHandler(BaseHTTPRequestHandler):
+    def respond(self, send_body):
+        if self.path == '/no-head' and self.command == 'HEAD':
+            self.send_response(405)
+        elif self.path == '/moved':
+            self.send_response(301)
+            self.send_header('Location', '/ok')
+        elif self.path == '/busy' and self.server.busy:
+            self.server.busy -= 1
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+        elif self.path in ('/ok', '/no-head', '/busy'):
+            self.send_response(200)
+        else:
+            self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.respond(False)
+
+    def do_GET(self):
+        self.respond(True)
+
+    def log_message(self, *args):
+        pass
+
+
+class LinkCheckerTest(TestCase):
+    def setUp(self):
+        self.server = StubBingServer(('127.0.0.1', 0), StubSiteHandler)
+        self.server.busy = 1
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.python = Category.objects.create(name='Python')
+        self.pages = {}
+        for path in ['/ok', '/no-head', '/moved', '/missing', '/busy']:
+            self.pages[path] = Page.objects.create(
+                category=self.python, title=path,
+                url='http://127.0.0.1:{0}{1}'.format(self.server.server_port, path))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def health(self, path):
+        return PageHealth.objects.get(page=self.pages[path])
+
+    def test_statuses_are_recorded(self):
+        checker = link_checker.LinkChecker(workers=3, batch_size=2).run()
+        self.assertEqual((checker.checked, checker.broken), (5, 1))
+        self.assertEqual(self.health('/ok').status, 200)
+        self.assertEqual(self.health('/no-head').status, 200)
+        self.assertEqual(self.health('/busy').status, 200)
+        self.assertEqual(self.health('/missing').status, 404)
+        moved = self.health('/moved')
+        self.assertEqual(moved.status, 200)
+        self.assertTrue(moved.final_url.endswith('/ok'))
+        self.assertIsNotNone(moved.latency)
+
+    def test_unreachable_link(self):
+        checker = link_checker.LinkChecker(workers=2, timeout=1)
+        status, final_url, latency, error = checker.check('ftp://example.com/')
+        self.assertEqual((status, error), (None, 'Not an http(s) url'))
+
+    def test_unexpected_errors_dont_stop_the_run(self):
+        # A port that isn't a number makes urlparse raise ValueError
+        page = self.pages['/ok']
+        checker = link_checker.LinkChecker(workers=2).run([(page.id, 'http://example.com:abc/')])
+        self.assertEqual(checker.checked, 1)
+        self.assertIn('ValueError', self.health('/ok').error)
+
+    def test_resumes_with_unchecked_pages(self):
+        link_checker.LinkChecker(workers=2).run(
+            [(self.pages['/ok'].id, self.pages['/ok'].url)])
+        checker = link_checker.LinkChecker(workers=2).run()
+        self.assertEqual(checker.checked, 4)
+        self.assertEqual(link_checker.LinkChecker(workers=2).run().checked, 0)
+        self.assertEqual(link_checker.LinkChecker(workers=2, max_age=0).run().checked, 5)
+
+
+class CanonicalUrlTest(TestCase):
+    def test_spellings_of_one_link_match(self):
+        self.assertEqual(canonical.canonical_url('HTTP://Example.com:80/a/?b=2&a=1#top'),
+                         'http://example.com/a?a=1&b=2')
+        self.assertEqual(canonical.canonical_url('example.com'), 'http://example.com/')
+        self.assertEqual(canonical.url_hash('https://example.com/a/'),
+                         canonical.url_hash('http://EXAMPLE.com/a'))
+        self.assertNotEqual(canonical.url_hash('http://example.com/a'),
+                            canonical.url_hash('http://example.com/b'))
+
+    def test_malformed_port_is_kept_as_given(self):
+        self.assertEqual(canonical.canonical_url('http://A.com:abc/x/'), 'http://a.com:abc/x')
+        python = Category.objects.create(name='Python')
+        User.objects.create_user('leo', 'leo@example.com', 'secret')
+        self.client.login(username='leo', password='secret')
+        response = self.client.get('/rango/auto_add_page/',
+                                   {'category_id': python.id, 'title': 'Bad',
+                                    'url': 'http://a.com:abc/'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Page.objects.exists())
+
+    def test_form_keeps_https_and_refuses_duplicates(self):
+        python = Category.objects.create(name='Python')
+        form = PageForm({'title': 'Docs', 'url': 'https://docs.python.org/', 'views': 0},
+                        category=python)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['url'], 'https://docs.python.org/')
+        page = form.save(commit=False)
+        page.category = python
+        page.save()
+
+        form = PageForm({'title': 'Docs', 'url': 'http://docs.python.org', 'views': 0},
+                        category=python)
+        self.assertFalse(form.is_valid())
+        self.assertIn('url', form.errors)
+
+    def test_auto_add_page_finds_the_saved_link(self):
+        python = Category.objects.create(name='Python')
+        User.objects.create_user('leo', 'leo@example.com', 'secret')
+        self.client.login(username='leo', password='secret')
+        for url in ['http://docs.python.org/?b=1&a=2', 'https://docs.python.org/?a=2&b=1']:
+            self.client.get('/rango/auto_add_page/',
+                            {'category_id': python.id, 'title': 'Docs', 'url': url})
+        self.assertEqual(Page.objects.filter(category=python).count(), 1)
+
+    def test_backfill_command(self):
+        python = Category.objects.create(name='Python')
+        page = Page.objects.create(category=python, title='Docs', url='http://docs.python.org/')
+        Page.objects.filter(id=page.id).update(url_hash='')
+        call_command('add_page_url_hashes', stdout=StringIO())
+        self.assertEqual(Page.objects.get(id=page.id).url_hash,
+                         canonical.url_hash('http://docs.python.org/'))
+
+
+class SearchConcurrencyTest(TestCase):
+    def test_concurrent_misses_share_one_fetch(self):
+        search_cache = SearchCache()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(1)
+            return ['result']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(search_cache.get('q', fetch)))
+                   for i in range(3)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(calls), results), (1, [['result']] * 3))
+
+    def test_a_shed_search_is_not_cached(self):
+        search_cache = SearchCache()
+
+        def busy():
+            raise SearchBusy('busy')
+        self.assertRaises(SearchBusy, search_cache.get, 'q', busy)
+        self.assertEqual(search_cache.get('q', lambda: ['result']), ['result'])
+
+    def test_a_shed_search_says_so(self):
+        old_client = bing_search.search_client
+
+        class BusyClient(object):
+            def search(self, *args):
+                raise SearchBusy('busy')
+        bing_search.search_client = BusyClient()
+        bing_search.search_cache.clear()
+        try:
+            response = self.client.post('/rango/search/', {'query': 'django'})
+        finally:
+            bing_search.search_client = old_client
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'Search is busy', status_code=503)
+
+    def test_searches_over_the_limit_fail_fast(self):
+        server = StubBingServer(('127.0.0.1', 0), StubBingHandler)
+        thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        client = SearchClient(
+            root_url='http://127.0.0.1:{0}/Bing/Search/'.format(server.server_port),
+            read_timeout=2, max_in_flight=1)
+        slow = threading.Thread(target=client.search, args=('slow',))
+        slow.start()
+        try:
+            while not server.connections:
+                time.sleep(0.01)
+            self.assertRaises(SearchBusy, client.search, 'django')
+            server.release.set()
+            slow.join()
+            # The slot is free again
+            self.assertEqual(len(client.search('django', results_per_page=1)), 1)
+        finally:
+            server.release.set()
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_load_test_sheds_searches_over_the_limit(self):
+        # The site's worker threads can't see the in-memory test database,
+        # so have the sidebar cached beforehand
+        Category.objects.create(name='Python')
+        category_cache.get_snapshot()
+        report = load_test.run_load_test(searches=6, workers=3, latency=0.2, max_in_flight=1)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['peak_in_flight'], 1)
+        self.assertEqual(report['searches_answered'] + report['searches_shed'], 6)
+        self.assertTrue(report['searches_shed'] > 0)
+
+    @override_settings(RANGO_BING_MAX_IN_FLIGHT=3, RANGO_BING_GEVENT_MAX_IN_FLIGHT=300)
+    def test_threads_get_the_lower_limit(self):
+        # gevent isn't patching anything in the test run
+        self.assertFalse(bing_search.cooperative())
+        self.assertEqual(bing_search.max_in_flight(), 3)
+
+
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        routers.pin_to_primary(False)
+        routers.start_tracking()
+
+    def tearDown(self):
+        routers.pin_to_primary(False)
+
+    @override_settings(RANGO_READ_REPLICAS=['replica'])
+    def test_reads_go_to_replicas_unless_pinned(self):
+        self.assertEqual(self.router.db_for_read(Page), 'replica')
+        self.assertEqual(self.router.db_for_read(CategoryLikeShard), 'default')
+        self.assertEqual(self.router.db_for_write(Page), 'default')
+        self.assertFalse(self.router.allow_syncdb('replica', Page))
+        routers.pin_to_primary()
+        self.assertEqual(self.router.db_for_read(Page), 'default')
+
+    @override_settings(RANGO_READ_REPLICAS=['replica'])
+    def test_reads_after_a_write_and_cache_fills_go_to_the_primary(self):
+        with routers.primary():
+            self.assertEqual(self.router.db_for_read(Page), 'default')
+        self.assertEqual(self.router.db_for_read(Page), 'replica')
+        self.router.db_for_write(Page)
+        self.assertEqual(self.router.db_for_read(Page), 'default')
+
+    def test_no_replicas_means_primary(self):
+        self.assertEqual(self.router.db_for_read(Page), 'default')
+
+    # The replica is the primary itself here, only the stickiness is tested
+    @override_settings(RANGO_READ_REPLICAS=['default'], RANGO_REPLICA_STICKY_SECONDS=5)
+    def test_writers_stick_to_the_primary(self):
+        python = Category.objects.create(name='Python')
+        category_cache.get_snapshot()
+        response = self.client.get('/rango/about/')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+        User.objects.create_user('leo', 'leo@example.com', 'secret')
+        self.client.login(username='leo', password='secret')
+        response = self.client.get('/rango/like_category/', {'category_id': python.id})
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]['max-age'], 5)
+
+    def test_copy_sqlite(self):
+        directory = tempfile.mkdtemp()
+        try:
+            primary = os.path.join(directory, 'primary.db')
+            replica = os.path.join(directory, 'replica.db')
+            db = sqlite3.connect(primary)
+            db.execute('CREATE TABLE t (x INTEGER)')
+            db.execute('INSERT INTO t VALUES (1)')
+            db.commit()
+            db.close()
+            routers.copy_sqlite(primary, replica)
+            self.assertEqual(sqlite3.connect(replica).execute('SELECT x FROM t').fetchall(),
+                             [(1,)])
+        finally:
+            shutil.rmtree(directory)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        metrics.recorder.flush()
+        cache.clear()
+
+    def test_requests_are_counted_per_view(self):
+        Category.objects.create(name='Python')
+        bing_search.search_cache.put((normalize_query('django'), 0, 10),
+                                     [{'title': 'Django', 'link': 'http://djangoproject.com/',
+                                       'summary': 'The web framework'}])
+        self.client.get('/rango/about/')
+        self.client.get('/rango/about/')
+        self.client.get('/rango/')
+        self.client.post('/rango/search/', {'query': 'django'})
+        self.client.get('/no/such/page/')
+
+        text = self.client.get('/rango/metrics/').content
+        self.assertIn('rango_requests_total{view="about"} 2\n', text)
+        self.assertIn('rango_requests_total{view="other"} 1\n', text)
+        self.assertIn('rango_search_calls_total{view="search"} 1\n', text)
+        self.assertIn('rango_request_duration_seconds_bucket{view="about",le="+Inf"} 2\n', text)
+        self.assertIn('rango_request_duration_seconds_count{view="first page"} 1\n', text)
+        self.assertNotIn('rango_sql_queries_total{view="first page"} 0\n', text)
+        self.assertNotIn('rango_template_render_seconds_total{view="about"} 0.0\n', text)
+
+    def test_queries_are_counted_without_the_debug_log(self):
+        with self.settings(DEBUG=False):
+            Category.objects.create(name='Python')
+            metrics.start_request()
+            self.assertEqual(len(Category.objects.all()), 1)
+            self.assertEqual(metrics._state.counters['sql_queries_total'], 1)
+            metrics.finish_request('about')
+        self.assertNotIn('cursor', connection.__dict__)
+        self.assertFalse(connection.use_debug_cursor)
+
+    def test_flushed_at_most_every_interval(self):
+        with self.settings(RANGO_METRICS_FLUSH_INTERVAL=3600):
+            metrics.recorder.flush()
+            self.client.get('/rango/about/')
+            self.assertIsNone(cache.get(metrics._key('about', 'requests_total')))
+            metrics.recorder.flush()
+            self.assertEqual(cache.get(metrics._key('about', 'requests_total')), 1)
+
+    def test_only_internal_ips_see_them(self):
+        response = self.client.get('/rango/metrics/', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProfilerTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(RANGO_PROFILE_DIR=self.directory)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+
+    def test_signed_header_profiles_the_request(self):
+        self.client.get('/rango/about/', HTTP_X_RANGO_PROFILE='forged')
+        self.assertEqual(list(profiler.load_dumps()), [])
+
+        Category.objects.create(name='Python')
+        self.client.get('/rango/category/python/', HTTP_X_RANGO_PROFILE=profiler.make_token())
+        [dump] = profiler.load_dumps()
+        self.assertEqual((dump['view'], dump['status'], dump['mode']),
+                         ('category', 200, 'sample'))
+        self.assertIn('rango_category', ' '.join(query['sql'] for query in dump['sql']))
+
+    @override_settings(RANGO_PROFILE_MODE='cprofile')
+    def test_cprofile_dumps_collapse_to_stacks(self):
+        self.client.get('/rango/about/', HTTP_X_RANGO_PROFILE=profiler.make_token())
+        stacks = profiler.collapse(profiler.load_dumps())
+        self.assertTrue(any(stack.startswith('about;') and 'about (rango/views.py' in stack
+                            for stack in stacks))
+
+        out = StringIO()
+        call_command('collapse_profiles', self.directory, view='about', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), len(stacks))
+
+    def test_stopped_sampler_is_done(self):
+        sampler = profiler.Sampler(0.001)
+        sampler.start()
+        time.sleep(0.01)
+        sampler.stop()
+        self.assertFalse(sampler._thread.is_alive())
+
+    @override_settings(RANGO_PROFILE_SAMPLE_RATE=1, RANGO_PROFILE_KEEP=2)
+    def test_sampled_requests_rotate(self):
+        for i in range(3):
+            self.client.get('/rango/about/')
+        self.assertEqual(len(list(profiler.load_dumps())), 2)
+
+
+class ProfileImagesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.directory,
+                                                   RANGO_PROFILE_IMAGES_IN_BACKGROUND=False)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+
+    def upload(self, image, name, **options):
+        picture = StringIO()
+        image.save(picture, **options)
+        picture.seek(0)
+        picture.name = name
+        return self.client.post('/rango/register/', {
+            'username': 'leo', 'email': 'leo@example.com', 'password': 'secret',
+            'website': '', 'picture': picture})
+
+    def test_register_leaves_the_resizing_for_later(self):
+        self.upload(Image.new('RGBA', (300, 200), (255, 0, 0, 0)), 'leo.png', format='PNG')
+        profile = UserProfile.objects.get(user__username='leo')
+        self.assertTrue(profile.picture.name.startswith('profile_images/staging/'))
+        self.assertEqual(profile.avatar.name, '')
+
+        self.client.login(username='leo', password='secret')
+        self.assertContains(self.client.get('/rango/profile/'), 'being processed')
+        self.assertEqual(profile_images.process_pending(), 1)
+        profile = UserProfile.objects.get(id=profile.id)
+        response = self.client.get('/rango/profile/')
+        self.assertContains(response, profile.avatar.url)
+        # The navbar shows the thumbnail
+        self.assertContains(response, profile.thumbnail.url)
+
+        thumbnail = Image.open(profile.thumbnail.path)
+        self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (64, 42)))
+        # The transparent background comes out white
+        self.assertEqual(thumbnail.getpixel((32, 21)), (255, 255, 255))
+
+    def test_variants_are_upright_and_without_metadata(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        self.upload(Image.new('RGB', (1000, 600)), 'leo.jpg', format='JPEG',
+                    exif=exif.tobytes())
+        profile_images.process_pending()
+
+        avatar = Image.open(UserProfile.objects.get(user__username='leo').avatar.path)
+        self.assertEqual(avatar.size, (153, 256))
+        self.assertNotIn('exif', avatar.info)
+
+    def test_old_originals_are_moved_out_of_reach(self):
+        user = User.objects.create_user('leo', 'leo@example.com', 'secret')
+        old = os.path.join(self.directory, 'profile_images', 'leo.jpg')
+        os.makedirs(os.path.dirname(old))
+        Image.new('RGB', (10, 10)).save(old, 'JPEG')
+        UserProfile.objects.create(user=user, picture='profile_images/leo.jpg')
+
+        call_command('add_profile_image_variants', stdout=StringIO())
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.picture.name, 'profile_images/staging/leo.jpg')
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(profile.avatar)
+
+
+class AssetsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(STATIC_ROOT=self.directory)
+        self.settings_override.enable()
+        # The storage keeps the STATIC_ROOT it was made with
+        staticfiles_storage._wrapped = empty
+
+    def tearDown(self):
+        self.settings_override.disable()
+        staticfiles_storage._wrapped = empty
+        shutil.rmtree(self.directory)
+
+    def test_minify_css(self):
+        self.assertEqual(assets.minify_css('/* hi */\na > b {\n  color: red;\n}\n/*! keep */'),
+                         'a>b{color:red}/*! keep */')
+
+    def test_collectstatic_bundles_hashes_and_compresses(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        hashed = staticfiles_storage.manifest()['css/rango.css']
+        self.assertRegexpMatches(hashed, r'^css/rango\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.directory, hashed)) as f:
+            css = f.read()
+        self.assertTrue(css.startswith('body{padding-top:60px;'))
+        self.assertIn(staticfiles_storage.manifest()['img/glyphicons-halflings.png'][4:], css)
+        with gzip.open(os.path.join(self.directory, hashed + '.gz')) as f:
+            self.assertEqual(f.read(), css)
+
+        # One stylesheet and one script, jQuery included
+        html = self.client.get('/rango/about/').content
+        self.assertIn('<link href="/static/{0}" rel="stylesheet">'.format(hashed), html)
+        self.assertEqual(html.count('<script src='), 1)
+        self.assertNotIn('code.jquery.com', html)
+
+        req = RequestFactory().get('/static/' + hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        response = assets.serve(req, hashed)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        req = RequestFactory().get('/static/css/rango.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        response = assets.serve(req, 'css/rango.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    @override_settings(RANGO_ASSETS_BUNDLED=False)
+    def test_unbundled_links_every_source(self):
+        html = self.client.get('/rango/about/').content
+        self.assertIn('<script src="/static/js/rango-ajax.js"></script>', html)
+        self.assertEqual(html.count('rel="stylesheet"'), 3)
+
+
+class FileServingTest(TestCase):
+    def setUp(self):
+        file_serving.index.clear()
+        with open(os.path.join(settings.MEDIA_ROOT, 'rango.jpg'), 'rb') as f:
+            self.content = f.read()
+
+    def test_whole_file_goes_to_the_file_wrapper(self):
+        response = self.client.get('/media/rango.jpg')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+        self.assertEqual(''.join(response.streaming_content), self.content)
+        self.assertTrue(hasattr(response, 'file_to_stream'))
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/missing.jpg').status_code, 404)
+
+    def test_conditional_requests(self):
+        response = self.client.get('/media/rango.jpg')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response.close()
+        self.assertEqual(self.client.get('/media/rango.jpg', HTTP_IF_NONE_MATCH=etag)
+                         .status_code, 304)
+        self.assertEqual(self.client.get('/media/rango.jpg', HTTP_IF_NONE_MATCH='"other"')
+                         .status_code, 200)
+        self.assertEqual(self.client.get('/media/rango.jpg',
+                                         HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get('/media/rango.jpg', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 0-9/{0}'.format(len(self.content)))
+        self.assertEqual(''.join(response.streaming_content), self.content[:10])
+
+        response = self.client.get('/media/rango.jpg', HTTP_RANGE='bytes=-5')
+        self.assertEqual(''.join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get('/media/rango.jpg', HTTP_RANGE='bytes=99999999-')
+        self.assertEqual(response.status_code, 416)
+
+        # The file changed since the client got its first part
+        response = self.client.get('/media/rango.jpg', HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    @override_settings(RANGO_SENDFILE_BACKEND='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        response = self.client.get('/media/rango.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/_media/rango.jpg')
+        self.assertEqual(response.content, '')
+
+    def test_file_wrapper_middleware(self):
+        closed = []
+        req = RequestFactory().get('/media/rango.jpg')
+        response = file_serving.serve_file(req, os.path.join(settings.MEDIA_ROOT, 'rango.jpg'))
+        response._closable_objects.append(type('Closable', (), {
+            'close': lambda self: closed.append(True)})())
+        application = file_serving.FileWrapperMiddleware(lambda environ, start: response)
+
+        body = application({'wsgi.file_wrapper': FileWrapper}, None)
+        self.assertIsInstance(body, FileWrapper)
+        self.assertEqual(''.join(body), self.content)
+        body.close()
+        self.assertEqual(closed, [True])
+        self.assertTrue(response.file_to_stream.closed)
+
+    def test_head_sends_no_file(self):
+        response = self.client.head('/media/rango.jpg')
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+        self.assertFalse(hasattr(response, 'file_to_stream'))
+
+        response = self.client.get('/media/rango.jpg')
+        application = file_serving.FileWrapperMiddleware(lambda environ, start: response)
+        body = application({'wsgi.file_wrapper': FileWrapper, 'REQUEST_METHOD': 'HEAD'}, None)
+        self.assertIs(body, response)
+        response.close()
+
+    def test_private_media_isnt_served(self):
+        staging = os.path.join(settings.MEDIA_ROOT, 'profile_images', 'staging')
+        if not os.path.isdir(staging):
+            os.makedirs(staging)
+        path = os.path.join(staging, 'test_private.jpg')
+        with open(path, 'wb') as f:
+            f.write(self.content)
+        try:
+            self.assertEqual(self.client.get('/media/profile_images/staging/test_private.jpg')
+                             .status_code, 404)
+            self.assertEqual(self.client.get('/media/profile_images/x/../staging/test_private.jpg')
+                             .status_code, 404)
+        finally:
+            os.remove(path)
@@ -19,10 +19,10 @@ urlpatterns = patterns('',
     # Map path '/add_category/' to add_category view
     url(r'^add_category/$', views.add_category, name='add_category'),
 
-    # map path '/category/any_category_name_here/' to category view 
-    url(r'^category/(?P<category_name_url>\w+)/$', views.category, name='category'),
+    # map path '/category/any-category-slug-here/' to category view 
+    url(r'^category/(?P<category_name_slug>[\w-]+)/$', views.category, name='category'),
 
-    url(r'^category/(?P<category_name_url>\w+)/add_page/$', views.add_page, name='add_page'),
+    url(r'^category/(?P<category_name_slug>[\w-]+)/add_page/$', views.add_page, name='add_page'),
 
     url(r'^register/$', views.register, name='register'),
 
@@ -39,7 +39,13 @@ urlpatterns = patterns('',
     url(r'^like_category/$', views.like_category, name='like_category'),
 
     url(r'^suggest_category/$', views.suggest_category, name='suggest_category'),
+    # Search the web (Bing) or Rango's own pages
+    url(r'^search/$', views.search, name='search'),
     url(r'^auto_add_page/$', views.auto_add_page, name='auto_add_page'),
+    # Next slice of a category's pages, for the "Load more" button
+    url(r'^more_pages/$', views.more_pages, name='more_pages'),
+    # Request metrics for Prometheus, see rango/metrics.py
+    url(r'^metrics/$', views.metrics_view, name='metrics'),
 )
 
 
@@ -24,100 +24,43 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 # Basic HTTP functions
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, HttpResponseBadRequest, Http404
+from django.conf import settings
+from django import forms
 # Import the necessary models
-from rango.models import Category, Page
+from rango.models import Category, Page, UserProfile
 from rango.forms import CategoryForm, PageForm, UserForm, UserProfileForm
-# Basic Python modules
-from datetime import datetime
 # External functions
-from rango.bing_search import run_query
-
-def simple_encode_decode(any_string):
-
-    """An adhoc, general function that replace ' ' with '_' in any string provided,
-       and the other way round.
-    """
-    if type(any_string) == str or type(any_string) == unicode:
-
-        # if <any_string> contains a blank space, replace them with '_'
-        if ' ' in any_string:
-            any_string = any_string.replace(' ', '_')
-
-        # Else if '_' is detected, do it the other way.
-        elif '_' in any_string:
-            any_string = any_string.replace('_', ' ')
-
-        else:
-            pass
-    else:
-        raise TypeError("Not of type <'str'> or <'unicode'>")
-
-    return any_string
-
-def get_cat_list(max_results=0, starts_with=''):
-    
-    """
-    Helper function to get a list of categories according to specified
-    maximum results and leading character(s)
-    """
-    # Set cat_list list
-    cat_list = []
-    # If <starts_with> character or string exists
-    if starts_with:
-        # get all categories starting with <starts_with>
-        cat_list = Category.objects.filter(name__istartswith=starts_with)
-    else:
-        # get all categories
-        cat_list = Category.objects.all()
-    # If <max_results> is more than 0
-    if max_results > 0:
-        # and if cat_list's length is more than <max_results>
-        if len(cat_list) > max_results:
-            # Subset cat_list up to max_results
-            cat_list = cat_list[:max_results]
-    # For every category in cat_list,
-    for cat in cat_list:
-        # convert category's name to category's url
-        cat.url = simple_encode_decode(cat.name)
-
-    return cat_list
-
-
-def encode_to_url(cat_list):
-
-    """Recursively replace ' ' in category's name with '_' by taking a list,
-       iterating through each category name. 
-    """
-    for cat in cat_list:
-        if hasattr(cat, 'name'):
-            cat.url = cat.name.replace(' ', '_')
-        else:
-            raise AttributeError("Category object has no attribute 'name'")
-
-    # return a string joined by '_'
-    return cat_list
-
-def decode_from_url(category_name_url):
-
-    """Replace '_' in category's or page's url with ' '"""
-
-    for category_name in category_name_url:
-        # Make a category string out of URL string
-        category_name = category_name_url.replace('_', ' ')
-
-    # return a string joined by ' '
-    return category_name
+from rango.bing_search import SearchBusy, run_query
+from rango import canonical
+from rango import category_cache
+from rango import click_buffer
+from rango import fragment_cache
+from rango import leaderboard
+from rango import like_counter
+from rango import local_search
+from rango import metrics
+from rango import page_cache
+from rango import paging
+from rango import profile_images
+from rango import suggest_index
 
 def get_category_list(n='all', order='likes'):
 
     """Helper function to get cat_list"""
 
+    # The sidebar (likes ordering) is served from the cached snapshot
+    if order == 'likes':
+        if n == 'all':
+            return category_cache.get_snapshot()
+        elif type(n) == int and n >= 0:
+            return category_cache.get_snapshot()[:n]
+        else:
+            raise TypeError("n must be an integer more than or equals to 0")
+
     if n == 'all':
         cat_list = Category.objects.all()
-        if order == 'likes':
-            cat_list = Category.objects.order_by('-likes')[:]
-        elif order == 'name':
+        if order == 'name':
             cat_list = Category.objects.order_by('-name')[:]
         elif order == 'visits':
             cat_list = Category.objects.order_by('-visits')[:]
@@ -125,9 +68,7 @@ def get_category_list(n='all', order='likes'):
             print "order = ['likes', 'name', 'visits']"
         
     elif type(n) == int and n >= 0:
-        if order == 'likes':
-            cat_list = Category.objects.order_by('-likes')[:n]
-        elif order =='name':
+        if order =='name':
             cat_list = Category.objects.order_by('-name')[:n]
         elif order == 'visits':
             cat_list = Category.objects.order_by('-visits')[:n]
@@ -135,13 +76,33 @@ def get_category_list(n='all', order='likes'):
             raise ValueError("Category object has no attribute %s" %(order,))
     else:
         raise TypeError("n must be an integer more than or equals to 0")
-    
-    for cat in cat_list:
-        cat.url = simple_encode_decode(cat.name)
 
     return cat_list
     
+def track_visit(req):
+
+    """
+    Return the visit counter shown on the index and about pages, which
+    rango.middleware.VisitMiddleware keeps in a signed cookie
+    """
+
+    return {'visits': req.visits, 'last_visit_time': req.last_visit}
+
+def category_page_tags(req, category_name_slug):
+
+    """The page cache tags a category page depends on"""
+
+    # Looked up in the cached sidebar snapshot, so no query is needed
+    for cat in category_cache.get_snapshot():
+        if cat['slug'] == category_name_slug:
+            return ['categories', 'category:{0}'.format(cat['id'])]
+    # A category created later purges 'categories' as well
+    return ['categories']
+
 # index view
+# Anonymous visitors get it from the page cache, with their visits filled in
+@page_cache.cache_anonymous_page(tags=lambda req: ['categories', 'pages'],
+                                 per_request=track_visit)
 def index(req):
 
     """View for index page"""
@@ -154,41 +115,21 @@ def index(req):
     
     # Query database for a list of ALL categories (see get_category_list function)
     # cat_list = Category.objects.all()
-    # cat_list = encode_to_url(cat_list)
 
     cat_list = get_category_list()
 
-    # Query database for a list of ALL pages ordered by number of views (descending)
-    page_list = Page.objects.order_by('-views')[:5]
-
-    # Set default
-    visits = 0
-    last_visit_time = str(datetime.now())
+    # The five most liked categories and most viewed pages come from the
+    # leaderboards, which are kept in the cache (see rango/leaderboard.py)
+    top_categories = leaderboard.top_categories(5)
+    page_list = leaderboard.top_pages(5)
 
     # Place the lists in context_dict to be passed on as template argument
-    context_dict = {'cat_list': cat_list, 'pages': page_list}
-
-    # Does the cookie last_visit exist?
-    if req.session.get('last_visit'):
-        # Yes it does! Get the cookie's value.
-        last_visit_time = req.session.get('last_visit')
-        visits = req.session.get('visits', 0)
-        # Cast the value to a Python date/time object.
-        last_visit_time = datetime.strptime(last_visit_time[:-7], "%Y-%m-%d %H:%M:%S")
-
-        # If it's been more than a day since the last visit...
-        if (datetime.now() - last_visit_time).seconds > 10:
-            # increment the time visited
-            req.session['visits'] = visits + 1
-            req.session['last_visit'] = str(datetime.now())
+    context_dict = {'cat_list': cat_list, 'top_categories': top_categories,
+                    'pages': page_list}
 
-    else:
-        # The get returns None, and the session doesn't have a value for the last visit
-        req.session['last_visit'] = str(datetime.now())
-        req.session['visits'] = 1
-
-    context_dict['visits'] = visits
-    context_dict['last_visit_time'] = last_visit_time
+    # The visit counter differs per visitor, so it's a hole in the cached page
+    for name, value in track_visit(req).items():
+        context_dict[name] = page_cache.hole(req, name, value)
 
     # Return response back to the user, updating any cookies that need changed
     return render_to_response('rango/index.html', context_dict, context)
@@ -204,20 +145,8 @@ def about(req):
 
     cat_list = get_category_list()
 
-    if req.session.get('last_visit'):
-        last_visit_time = req.session.get('last_visit')
-        visits = req.session.get('visits', 0)
-        last_visit_time = datetime.strptime(last_visit_time[:-7], "%Y-%m-%d %H:%M:%S")
-
-        if (datetime.now() - last_visit_time).seconds > 10:
-            req.session['visits'] = visits + 1
-            req.session['last_visit'] = str(datetime.now())
-
-    else:
-        req.session['visits'] = visits + 1
-        req.session['last_visit'] = str(datetime.now())
-
-    context_dict = {'cat_list': cat_list, 'visits': visits, 'last_visit_time': last_visit_time}
+    context_dict = {'cat_list': cat_list}
+    context_dict.update(track_visit(req))
 
     # Simply return the template, since no model data are used here
     return render_to_response('rango/about.html', context_dict, context)
@@ -233,12 +162,12 @@ def myass(req):
     return render_to_response('rango/myass.html', context)
 
 # category view
-def category(req, category_name_url):
+@page_cache.cache_anonymous_page(tags=category_page_tags)
+def category(req, category_name_slug):
 
     """
-    This view take an additional parameter, category_name_url
-    which will store the decoded category name. We will need
-    some help functions to encode and decode the category_name_url
+    This view take an additional parameter, category_name_slug
+    which is the slug stored on the category we want to show
     """
 
     # Request our context from the request passed to us.
@@ -246,59 +175,55 @@ def category(req, category_name_url):
     # Retrieve categories list for the left navbar
     cat_list = get_category_list()
 
-    # Change underscores in the category name to spaces
-    # URLs don't handle spaces well, so we encode them as underscores.
-    # We can then simply replace the underscores with spaces again to get the name.
-    # category_name = category_name_url.replace('_', ' ')
-    category_name = decode_from_url(category_name_url)
-
-    context_dict = {'cat_list': cat_list, 'category_name': category_name}
+    # Until we find the category, show the slug we were given
+    context_dict = {'cat_list': cat_list,
+                    'category_name': category_name_slug,
+                    'category_name_slug': category_name_slug}
     try:
-        # Can we find a category with the given name?
+        # Can we find a category with the given slug? It's an indexed lookup.
         # If we can't, the .get() method raises a DoesNotExist exception.
         # So the .get() method returns one model instance or raises an exception
-        category = Category.objects.get(name=category_name)
-        
-        # Add category to the context so that we can access the ids and likes
-        context_dict['category'] = category
-
-        # Retrieve all of the associated pages.
-        # Note that filter returns >= 1 model instance
-        pages = Page.objects.filter(category=category)
+        # Its page_count and total_views come along from CategoryStats
+        category = Category.objects.select_related('stats').get(slug=category_name_slug)
         
-        # Adds our results list to the template context under name pages
-        context_dict['pages'] = pages
+        # Show the latest total from the like counter rather than the rollup
+        category.likes = like_counter.get_total(category.id)
 
-        # We also add the category object from the database to the context dictionary
+        # Add category to the context so that we can access the ids and likes
         # We'll use this in the template to verify that the category exists
-        # context_dict = { 'category_name': category_name, 'pages':pages, 'category': category }
-        # context_dict['category'] = category
+        context_dict['category'] = category
+        context_dict['category_name'] = category.name
+
+        # Retrieve the first slice of the associated pages, most viewed first.
+        # The rest are loaded with AJAX (see more_pages).
+        # The slice is lazy, so it's never queried if the page list
+        # fragment is still in the cache
+        context_dict['page_slice'] = paging.KeysetPage(Page.objects.filter(category=category))
+        context_dict['category_id'] = category.id
+        context_dict['page_list_version'] = fragment_cache.page_list_version(category.id)
     
     except Category.DoesNotExist:
         # We get here if we didn't find the specified category.
         # Don't do anything - the template displays the "no category" message for us.
         pass
 
-    # Create a context dictionary which we can pass to the template rendering engine
-    # We start by containing the name of the category passed by the user
-
-    context_dict = {'cat_list': cat_list,
-                    'category_name': category_name,
-                    'category_name_url': category_name_url,
-                    'pages': pages,
-                    'category': category}
-
-    #context_dict['category_name_url'] = category_name_url
-
+    status = 200
     if req.method == 'POST':
-        query = req.POST['query'].strip()
+        query = req.POST.get('query', '').strip()
         if query:
-            result_list = run_query(query)
+            try:
+                result_list = run_query(query)
+            except SearchBusy:
+                # Too many searches waiting on Bing, tell the user to retry
+                result_list, status = [], 503
+                context_dict['search_busy'] = True
             context_dict['result_list'] = result_list
 
     # Go render the response and return it to the client using the over-convenient
     # render_to_response() shortcut function
-    return render_to_response('rango/category.html', context_dict, context)
+    response = render_to_response('rango/category.html', context_dict, context)
+    response.status_code = status
+    return response
 
 @login_required
 def add_category(req):
@@ -338,41 +263,38 @@ def add_category(req):
     return render_to_response('rango/add_category.html', context_dict, context)
 
 @login_required
-def add_page(req, category_name_url):
+def add_page(req, category_name_slug):
 
     """A view to add page to a category"""
 
     context = RequestContext(req)
     cat_list = get_category_list()
-    category_name = decode_from_url(category_name_url)
+
+    try:
+        cat = Category.objects.get(slug=category_name_slug)
+    except Category.DoesNotExist:
+        return render_to_response('rango/add_category.html', {'cat_list': cat_list}, context)
 
     if req.method == 'POST':
-        form = PageForm(req.POST)
+        form = PageForm(req.POST, category=cat)
 
         if form.is_valid():
             # This time we cannot commit straight away.
             # Not all fields are automatically populated!
             page = form.save(commit=False)
-
-            try:
-                cat = Category.objects.get(name=category_name)
-                page.category = cat
-            except Category.DoesNotExist:
-                return render_to_response('rango/add_category.html', {}, context)
-            # Also, create a default value for the number of views.
-            page_views = 0
+            page.category = cat
             # With this, we can then save our new model instance
             page.save()
             # Now that the page is saved, display the category instead.
-            return category(req, category_name_url)
+            return redirect('category', category_name_slug=cat.slug)
         else:
             print form.errors
     else:
         form = PageForm()
 
     context_dict = {'cat_list': cat_list,
-                    'category_name_url': category_name_url,
-                    'category_name': category_name,
+                    'category_name_slug': cat.slug,
+                    'category_name': cat.name,
                     'form': form}
 
     return render_to_response('rango/add_page.html', context_dict, context)
@@ -416,6 +338,10 @@ def register(req):
             # Now we save the UserProfile Model instance
             profile.save()
 
+            # Resizing the picture can take a while, so it's done in the background
+            if profile.picture:
+                profile_images.enqueue(profile)
+
             # Update our variable to tell the template registration is successful.
             registered = True
 
@@ -498,7 +424,8 @@ def profile(req):
     context = RequestContext(req)
     cat_list = get_category_list()
     context_dict = {'cat_list': cat_list}
-    u = User.objects.get(username=req.user)
+    # The auth middleware has loaded the user already
+    u = req.user
 
     try:
         up = UserProfile.objects.get(user=u)
@@ -514,16 +441,29 @@ def search(req):
     context = RequestContext(req)
     cat_list = get_category_list()
     result_list = []
+    search_busy = False
 
     if req.method == 'POST':
         query = req.POST['query'].strip()
 
         if query:
-            # Run our Bing function to get the results list
-            result_list = run_query(query)
+            if req.POST.get('source') == 'rango':
+                # Search the pages saved in Rango itself
+                result_list = local_search.search(query)
+            else:
+                # Run our Bing function to get the results list
+                try:
+                    result_list = run_query(query)
+                except SearchBusy:
+                    # Too many searches waiting on Bing, tell the user to retry
+                    search_busy = True
             
-    context_dict = {'cat_list': cat_list, 'result_list': result_list}
-    return render_to_response('rango/search.html', context_dict, context)
+    context_dict = {'cat_list': cat_list, 'result_list': result_list,
+                    'search_busy': search_busy}
+    response = render_to_response('rango/search.html', context_dict, context)
+    if search_busy:
+        response.status_code = 503
+    return response
 
 def track_url(req):
     
@@ -536,11 +476,12 @@ def track_url(req):
         if 'page_id' in req.GET:
             page_id = req.GET['page_id']
             try:
-                page = Page.objects.get(id=page_id)
-                page.views = page.views + 1
-                page.save()
-                url = page.url
-            except:
+                # Only the url is needed for the redirect
+                url = Page.objects.values_list('url', flat=True).get(id=page_id)
+                # The view is counted by the write-behind buffer, which
+                # flushes in the background so the redirect doesn't wait
+                click_buffer.record_click(int(page_id))
+            except (Page.DoesNotExist, ValueError):
                 pass
     
     return redirect(url)
@@ -561,16 +502,10 @@ def like_category(req):
     
     # If cat_id exists
     if cat_id:
-        # Retrieve category with the id=cat_id
-        category = Category.objects.get(id=int(cat_id))
-        # And if that category object exists
-        if category:
-            # Add one like to category's like
-            likes = category.likes + 1
-            # Update the category.likes
-            category.likes = likes
-            # save the category's new data
-            category.save()
+        # Add one like to one of the category's like shards and get
+        # back the approximate total straight away. Category.likes (and
+        # the cached sidebar) catch up when the shards are rolled up.
+        likes = like_counter.add_like(int(cat_id))
             
     return HttpResponse(likes)
 
@@ -585,8 +520,13 @@ def suggest_category(req):
     if req.method == 'GET':
         starts_with = req.GET['suggestion']
 
-    cat_list = get_cat_list(8, starts_with)
-    return render_to_response('rango/category_list.html', {'cat_list': cat_list}, context)
+    # Served from the in-memory prefix index, no query per keystroke
+    cat_list = suggest_index.suggest(starts_with)
+    # The rendered list is shared through the fragment cache
+    html = fragment_cache.render_fragment(
+        'rango/category_list.html', {'cat_list': cat_list}, fragment_cache.CATEGORY_LIST,
+        [category_cache.get_version(), starts_with.lower()])
+    return HttpResponse(html)
 
 @login_required
 def auto_add_page(req):
@@ -611,18 +551,58 @@ def auto_add_page(req):
         
         # if cat_id exists
         if cat_id:
+            # The url comes straight from the browser, check it as PageForm does
+            try:
+                url = forms.URLField(max_length=200).clean(canonical.with_scheme(url))
+            except forms.ValidationError:
+                return HttpResponseBadRequest("Not a valid url.")
+
             # Get the category with the id = cat_id
             category = Category.objects.get(id=int(cat_id))
            
-            # Either get if the page exist, or create one if it does not.
-            p = Page.objects.get_or_create(category=category, title=title, url=url)
-            pages = Page.objects.filter(category=category).order_by('-views')
-
-            # Adds our results list  to the template context under name pages
-            context_dict['pages'] = pages
+            # Either get the page if the category has its link already, or
+            # create it. The link is found by its canonical url's hash, so
+            # this is one lookup on the (category, url_hash) index.
+            p = Page.objects.get_or_create(category=category,
+                                           url_hash=canonical.url_hash(url),
+                                           defaults={'title': title, 'url': url})
+
+            # Adds the first slice of pages to the template context
+            context_dict['page_slice'] = paging.KeysetPage(Page.objects.filter(category=category))
+            context_dict['category_id'] = category.id
+
+            # Serve the same cached page list the category page shows
+            html = fragment_cache.render_fragment(
+                'rango/page_list.html', context_dict, fragment_cache.PAGE_LIST,
+                [category.id, fragment_cache.page_list_version(category.id)])
+            return HttpResponse(html)
 
     return render_to_response('rango/page_list.html', context_dict, context)
 
+def more_pages(req):
 
-    
-    
+    """Return the next slice of a category's pages for the "Load more" button"""
+
+    context = RequestContext(req)
+    try:
+        category_id = int(req.GET.get('category_id'))
+    except (TypeError, ValueError):
+        raise Http404
+    page_slice = paging.KeysetPage(Page.objects.filter(category_id=category_id),
+                                   after=req.GET.get('after'))
+
+    response = render_to_response('rango/page_list_items.html',
+                                  {'pages': page_slice.pages}, context)
+    # Tell rango-ajax.js where the slice after this one starts
+    if page_slice.next_cursor:
+        response['X-Rango-Next'] = page_slice.next_cursor
+    return response
+
+def metrics_view(req):
+
+    """Per-view request metrics in the Prometheus text format, for a scraper"""
+
+    # Only the monitoring hosts get to see them, unless we're debugging
+    if not settings.DEBUG and req.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
@@ -19,6 +19,20 @@ $(document).ready(function(){
 		    });
 	    });
  
+	// #page is replaced by auto_add_page, so listen on the document
+	$(document).on('click', '#more_pages', function(){
+		var me = $(this);
+		$.get('/rango/more_pages/', { category_id: me.attr("data-catid"), after: me.attr("data-after") }, function(data, status, xhr){
+			$('#page_items').append(data);
+			var next = xhr.getResponseHeader('X-Rango-Next');
+			if (next) {
+			    me.attr("data-after", next);
+			} else {
+			    me.remove();
+			}
+		    });
+	    });
+ 
 	$('#suggestion').keyup(function(){
 		var query;
 		query = $(this).val();
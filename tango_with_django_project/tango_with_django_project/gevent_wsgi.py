@@ -0,0 +1,39 @@
+"""
+Cooperative (gevent) entry point for tango_with_django_project.
+
+wsgi.py gives each request a whole worker for as long as it runs, so a
+page waiting on a slow Bing answer keeps its worker idle the whole time.
+This module exposes the same ``application``, but first lets gevent patch
+the standard library: sockets, httplib and time.sleep then yield to other
+requests while they wait, and thread locals become greenlet locals. One
+process can so hold hundreds of searches in flight while the ORM code of
+the views stays as it is, each greenlet with its own database connection.
+
+Serve it with gevent's own server:
+
+    python -m tango_with_django_project.gevent_wsgi [port]
+
+or point any gevent capable WSGI server at it, for example
+
+    gunicorn -k gevent tango_with_django_project.gevent_wsgi:application
+
+Searches are then limited by RANGO_BING_GEVENT_MAX_IN_FLIGHT rather than
+RANGO_BING_MAX_IN_FLIGHT. Nothing else needs gevent, install it to use
+this. "manage.py search_load_test" compares it with the threaded server.
+"""
+from gevent import monkey
+# Must come before anything imports socket, threading or httplib
+monkey.patch_all()
+
+import os
+import sys
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tango_with_django_project.settings")
+
+from tango_with_django_project.wsgi import application
+
+if __name__ == '__main__':
+    from gevent.pywsgi import WSGIServer
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    print "Serving on port {0}".format(port)
+    WSGIServer(('', port), application).serve_forever()
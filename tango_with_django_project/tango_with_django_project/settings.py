@@ -27,9 +27,19 @@ DATABASES = {
         'PASSWORD': '',
         'HOST': '',                      # Empty for localhost through domain sockets or '127.0.0.1' for localhost through TCP.
         'PORT': '',                      # Set to empty string for default.
-    }
+    },
+    # A read replica to try rango.routers.ReplicaRouter with locally. Add it
+    # to RANGO_READ_REPLICAS below and copy the primary over it with
+    # "manage.py sync_replicas" (run it again whenever it should catch up).
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': os.path.join(PROJECT_PATH, 'rango_replica.db'),
+    # },
 }
 
+# Sends reads of categories, pages and profiles to RANGO_READ_REPLICAS
+DATABASE_ROUTERS = ['rango.routers.ReplicaRouter']
+
 # Hosts/domain names that are valid for this site; required if DEBUG is False
 # See https://docs.djangoproject.com/en/1.5/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = []
@@ -70,7 +80,7 @@ MEDIA_URL = '/media/'
 # Don't put anything in this directory yourself; store your static files
 # in apps' "static/" subdirectories and in STATICFILES_DIRS.
 # Example: "/var/www/example.com/static/"
-# STATIC_ROOT = ''
+STATIC_ROOT = os.path.join(PROJECT_PATH, 'static_root')
 
 STATIC_PATH = os.path.join(PROJECT_PATH, 'static')
 
@@ -94,22 +104,74 @@ STATICFILES_FINDERS = (
 #    'django.contrib.staticfiles.finders.DefaultStorageFinder',
 )
 
+# collectstatic bundles, hashes and gzips the static files (see rango/assets.py)
+STATICFILES_STORAGE = 'rango.assets.AssetStorage'
+
+# The files base.html loads, as one stylesheet and one script. Stylesheet
+# sources must be in their bundle's directory, for their relative url()s.
+RANGO_ASSET_BUNDLES = {
+    'css/rango.css': ['css/bootstrap-fluid-adj.css',
+                      'css/bootstrap.min.css',
+                      'css/bootstrap-responsive.min.css'],
+    'js/rango.js': ['js/jquery-1.11.1.min.js',
+                    'js/bootstrap.min.js',
+                    'js/rango-ajax.js'],
+}
+# Link to the bundles rather than their sources (default: not DEBUG, as
+# runserver serves the sources but not the bundles)
+# RANGO_ASSETS_BUNDLED = True
+
+# Have Django serve STATIC_ROOT itself, hashed files with an immutable
+# Cache-Control header and precompressed when the client takes it. Leave
+# it off behind a web server and have that do the same, for nginx:
+#     location /static/ { alias .../static_root/; gzip_static on; }
+#     location ~ "^/static/.*\.[0-9a-f]{12}\." { ... expires max;
+#         add_header Cache-Control "public, max-age=31536000, immutable"; }
+RANGO_SERVE_STATIC = False
+
+# How media (and RANGO_SERVE_STATIC) files are sent, see rango/file_serving.py:
+# None hands them to the WSGI server's file wrapper, 'x-sendfile' leaves
+# them to Apache/lighttpd, 'x-accel-redirect' to nginx, at the internal
+# locations below.
+RANGO_SENDFILE_BACKEND = None
+RANGO_X_ACCEL_LOCATIONS = ((MEDIA_ROOT, '/_media/'), (STATIC_ROOT, '/_static/'))
+# Seconds the size and modification time of a served file are trusted
+RANGO_FILE_INDEX_TTL = 5
+# Directories under MEDIA_ROOT /media/ doesn't serve: uploaded profile
+# pictures, which still carry their EXIF (location, camera, ...), until
+# rango/profile_images.py has made the variants. Block them in the web
+# server in front of Django as well.
+RANGO_PRIVATE_MEDIA = ('profile_images/staging',)
+
 # Make this unique, and don't share it with anybody.
 SECRET_KEY = 'srdlc&g=%lw&6#0lzjlysz3b8b&!4+unnyb3afa0fp94y4$c15'
 
 # List of callables that know how to import templates from various sources.
+# Wrapped in rango's TimingLoader, which times template rendering for the
+# request metrics (see rango/metrics.py)
 TEMPLATE_LOADERS = (
-    'django.template.loaders.filesystem.Loader',
-    'django.template.loaders.app_directories.Loader',
-#     'django.template.loaders.eggs.Loader',
+    ('rango.metrics.TimingLoader', (
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    #     'django.template.loaders.eggs.Loader',
+    )),
 )
 
 MIDDLEWARE_CLASSES = (
+    # Profiles requests on demand (see rango/profiler.py)
+    'rango.middleware.ProfilerMiddleware',
+    # Per-view request metrics, served at /rango/metrics/ (see rango/metrics.py)
+    'rango.middleware.MetricsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Keeps visitors who just wrote on the primary database, must come
+    # before SessionMiddleware (see rango/routers.py)
+    'rango.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    # Counts visits in a signed cookie, see RANGO_VISIT_WINDOW below
+    'rango.middleware.VisitMiddleware',
     # Uncomment the next line for simple clickjacking protection:
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
@@ -125,6 +187,20 @@ ROOT_URLCONF = 'tango_with_django_project.urls'
 # Python dotted path to the WSGI application used by Django's runserver.
 WSGI_APPLICATION = 'tango_with_django_project.wsgi.application'
 
+TEMPLATE_CONTEXT_PROCESSORS = (
+    'django.contrib.auth.context_processors.auth',
+    'django.core.context_processors.debug',
+    'django.core.context_processors.i18n',
+    'django.core.context_processors.media',
+    'django.core.context_processors.static',
+    'django.core.context_processors.tz',
+    'django.contrib.messages.context_processors.messages',
+    # Versions the cached sidebar and page list fragments vary on
+    'rango.fragment_cache.fragment_versions',
+    # The navbar's profile picture (see rango/profile_images.py)
+    'rango.profile_images.user_thumbnail',
+)
+
 TEMPLATE_DIRS = (
     # Put strings here, like "/home/html/django_templates" or "C:/www/django/templates".
     # Always use forward slashes, even on Windows.
@@ -146,6 +222,115 @@ INSTALLED_APPS = (
     'rango',
 )
 
+# The cache holds the category sidebar snapshot (see rango/category_cache.py)
+# and the cached_db sessions. Point this at memcached in production so that
+# every worker process shares the same entries.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rango',
+    }
+}
+
+# Seconds a category sidebar snapshot may stay in the cache
+RANGO_CATEGORY_LIST_TIMEOUT = 60 * 60
+
+# track_url buffers page clicks in memory (see rango/click_buffer.py).
+# They are written out once MAX_PENDING clicks are waiting or FLUSH_INTERVAL
+# seconds have passed, so MAX_PENDING bounds the clicks lost on a crash.
+RANGO_CLICK_BUFFER_MAX_PENDING = 50
+RANGO_CLICK_BUFFER_FLUSH_INTERVAL = 10
+
+# like_category spreads each category's likes over this many counter rows
+# and refreshes Category.likes from them at most every ROLLUP_INTERVAL seconds
+# (see rango/like_counter.py)
+RANGO_LIKE_SHARDS = 8
+RANGO_LIKE_ROLLUP_INTERVAL = 30
+
+# Bing search results are kept in an in-process LRU cache (rango/bing_search.py)
+# for TTL seconds, then served for up to STALE more seconds while refreshing.
+RANGO_SEARCH_CACHE_SIZE = 256
+RANGO_SEARCH_CACHE_TTL = 60 * 60
+RANGO_SEARCH_CACHE_STALE = 60 * 60 * 24
+
+# The Bing search client keeps up to POOL_SIZE keep-alive connections
+# and gives up on connecting or reading after the given number of seconds.
+RANGO_BING_POOL_SIZE = 4
+RANGO_BING_CONNECT_TIMEOUT = 3
+RANGO_BING_READ_TIMEOUT = 10
+RANGO_BING_ROOT_URL = 'https://api.datamarket.azure.com/Bing/Search/'
+# At most this many Bing searches are waited on at once per process, the
+# rest fail fast so that slow answers can't take up every worker. Served
+# through tango_with_django_project/gevent_wsgi.py, where a waiting search
+# costs a greenlet rather than a worker, the GEVENT limit applies instead:
+# shedding is then only a guard against a real overload.
+RANGO_BING_MAX_IN_FLIGHT = 8
+RANGO_BING_GEVENT_MAX_IN_FLIGHT = 500
+
+# Anonymous index and category pages are cached whole for this many seconds,
+# or until a change to the categories/pages they show purges them
+# (see rango/page_cache.py)
+RANGO_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Seconds the cached sidebar and page list fragments may live
+# (see rango/fragment_cache.py)
+RANGO_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# A new visit is counted when more than this many seconds have passed since
+# the last one (see rango/middleware.py)
+RANGO_VISIT_WINDOW = 10
+
+# Pages shown on a category page, and added by each "Load more" click
+# (see rango/paging.py)
+RANGO_PAGES_PER_LOAD = 20
+
+# The most viewed pages and most liked categories boards keep this many
+# entries and are rebuilt from the database every RECONCILE seconds
+# (see rango/leaderboard.py)
+RANGO_LEADERBOARD_SIZE = 10
+RANGO_LEADERBOARD_RECONCILE = 60 * 5
+
+# "manage.py check_links" checks WORKERS links at once, at most PER_HOST
+# on the same host, waits TIMEOUT seconds on each request and skips pages
+# checked less than MAX_AGE seconds ago (see rango/link_checker.py)
+RANGO_LINK_CHECK_WORKERS = 20
+RANGO_LINK_CHECK_PER_HOST = 2
+RANGO_LINK_CHECK_TIMEOUT = 10
+RANGO_LINK_CHECK_MAX_AGE = 60 * 60 * 24
+
+# Database aliases that reads of categories, pages and profiles may go to,
+# e.g. ['replica'] with the database above. A visitor stays on the primary
+# for STICKY_SECONDS after writing something (see rango/routers.py).
+RANGO_READ_REPLICAS = []
+RANGO_REPLICA_STICKY_SECONDS = 10
+
+# Each process writes its request metrics to the cache at most every
+# FLUSH_INTERVAL seconds. With the LocMemCache above that cache, and so the
+# totals, are per process; use a shared cache to see the whole site's.
+# /rango/metrics/ is open to INTERNAL_IPS only (or to everyone with DEBUG on).
+RANGO_METRICS_FLUSH_INTERVAL = 5
+INTERNAL_IPS = ('127.0.0.1',)
+
+# Requests carrying an X-Rango-Profile header with a token from
+# "manage.py profile_token" are profiled, and so are a SAMPLE_RATE
+# fraction of all requests. MODE is 'sample' (a stack sample every
+# INTERVAL seconds) or 'cprofile' (every call, much slower). The newest
+# KEEP dumps are kept in PROFILE_DIR; "manage.py collapse_profiles" turns
+# them into a flame graph's input.
+RANGO_PROFILE_SAMPLE_RATE = 0
+RANGO_PROFILE_MODE = 'sample'
+RANGO_PROFILE_INTERVAL = 0.005
+RANGO_PROFILE_DIR = os.path.join(PROJECT_PATH, 'profiles')
+RANGO_PROFILE_KEEP = 200
+RANGO_PROFILE_TOKEN_AGE = 60 * 60
+
+# Profile pictures are resized to fit these many pixels (avatar for the
+# profile page, thumbnail for lists) by a background thread, or only by
+# "manage.py process_profile_images" with IN_BACKGROUND False.
+RANGO_PROFILE_IMAGE_SIZES = {'avatar': 256, 'thumbnail': 64}
+RANGO_PROFILE_IMAGE_QUALITY = 80
+RANGO_PROFILE_IMAGES_IN_BACKGROUND = True
+
 SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
@@ -19,8 +19,20 @@ urlpatterns = patterns('',
     url(r'^admin/', include(admin.site.urls)),
 )
 
-if settings.DEBUG:
+# Hashed, precompressed static files without a web server in front, see
+# rango/assets.py
+if getattr(settings, 'RANGO_SERVE_STATIC', False):
     urlpatterns += patterns(
-        'django.views.static',
-        (r'media/(?P<path>.*)', 'serve', {'document_root':settings.MEDIA_ROOT}),
+        '',
+        (r'^{0}(?P<path>.*)$'.format(settings.STATIC_URL.lstrip('/')), 'rango.assets.serve'),
+)
+
+# Uploaded media, sent by the WSGI server or the web server in front of it
+# rather than read through Python, see rango/file_serving.py. The
+# RANGO_PRIVATE_MEDIA directories (uploads as they came) are never served.
+urlpatterns += patterns(
+    'rango.file_serving',
+    (r'^{0}(?P<path>.*)$'.format(settings.MEDIA_URL.lstrip('/')), 'serve',
+     {'document_root': settings.MEDIA_ROOT,
+      'private': getattr(settings, 'RANGO_PRIVATE_MEDIA', ())}),
 )